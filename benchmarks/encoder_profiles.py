@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+エンコードプロファイルの速度・サイズ比較
+
+間違い探しジョブのタイムラインを1回だけ可逆（-qp 0）の中間ファイルに書き出し、
+各プロファイルでその中間ファイルを再エンコードしたときの
+エンコード fps・出力バイト数・PSNR を JSON に記録する（合成コストは含まない）。
+
+  python scripts/generate_dummy_assets.py
+  python benchmarks/encoder_profiles.py --job config/dummy_job.json --assets assets/dummy
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+import render_spot_diff_video as spot  # noqa: E402
+from common_render import (  # noqa: E402
+    ENCODER_PROFILES,
+    MediaRegistry,
+    encoder_cli_args,
+    encoder_settings,
+    probe_media,
+)
+from moviepy.config import FFMPEG_BINARY  # noqa: E402
+
+
+def render_mezzanine(job: dict, assets: Path, path: Path, seconds: float) -> int:
+    """タイムライン先頭 seconds 秒を可逆エンコードで書き出し、フレーム数を返す。"""
+    with MediaRegistry() as media:
+        segments, _ = spot.build_segments(job, assets, media)
+        final = spot.assemble_final(segments)
+        if seconds > 0:
+            final = final.subclipped(0, min(seconds, final.duration))
+        final.write_videofile(
+            str(path),
+            fps=spot.FPS,
+            audio=False,
+            codec="libx264",
+            preset="ultrafast",
+            threads=os.cpu_count(),
+            ffmpeg_params=["-qp", "0"],
+            logger=None,
+        )
+        return int(final.duration * spot.FPS)
+
+
+def measure_psnr(encoded: Path, reference: Path) -> float:
+    cmd = [FFMPEG_BINARY, "-i", str(encoded), "-i", str(reference), "-lavfi", "psnr", "-f", "null", "-"]
+    log = subprocess.run(cmd, capture_output=True, text=True).stderr
+    m = re.search(r"average:([0-9.]+|inf)", log)
+    return float(m.group(1)) if m else float("nan")
+
+
+def encode_profile(name: str, mezzanine: Path, out_dir: Path, frames: int) -> dict:
+    settings = encoder_settings(name, spot.FPS)
+    out_path = out_dir / f"{name}.mp4"
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error", "-i", str(mezzanine), "-an",
+           *encoder_cli_args(settings), "-pix_fmt", "yuv420p", str(out_path)]
+    t0 = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    elapsed = time.perf_counter() - t0
+    size = out_path.stat().st_size
+    duration = probe_media(out_path)["duration"] or frames / spot.FPS
+    return {
+        "preset": settings["preset"],
+        "threads": settings["threads"],
+        "ffmpeg_params": settings["ffmpeg_params"],
+        "seconds": round(elapsed, 3),
+        "encode_fps": round(frames / elapsed, 2),
+        "bytes": size,
+        "kbps": round(size * 8 / duration / 1000, 1),
+        "psnr": round(measure_psnr(out_path, mezzanine), 2),
+    }
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="エンコードプロファイルの速度・サイズ比較")
+    p.add_argument("--job", type=Path, default=Path("config/dummy_job.json"))
+    p.add_argument("--assets", type=Path, default=Path("assets/dummy"))
+    p.add_argument("--seconds", type=float, default=30.0, help="計測に使う先頭の秒数（0で全尺）")
+    p.add_argument("--profiles", nargs="*", default=list(ENCODER_PROFILES), choices=list(ENCODER_PROFILES))
+    p.add_argument("--results", type=Path, default=Path("benchmarks/results/encoder_profiles.json"))
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    job = spot.load_json(args.job)
+
+    with tempfile.TemporaryDirectory(prefix="encbench_") as tmp:
+        tmp_dir = Path(tmp)
+        mezzanine = tmp_dir / "mezzanine.mp4"
+        print(f"[bench] 中間ファイル作成中 ({args.seconds or 'full'}s)...")
+        frames = render_mezzanine(job, args.assets, mezzanine, args.seconds)
+
+        results = {}
+        for name in args.profiles:
+            results[name] = encode_profile(name, mezzanine, tmp_dir, frames)
+            r = results[name]
+            print(f"[bench] {name:<16} {r['encode_fps']:>8.1f} fps {r['bytes'] / 1e6:>8.2f} MB  PSNR {r['psnr']:.2f} dB")
+
+    report = {
+        "job": str(args.job),
+        "frames": frames,
+        "cpu_count": os.cpu_count(),
+        "profiles": results,
+    }
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    args.results.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[bench] 結果: {args.results}")
+
+
+if __name__ == "__main__":
+    main()
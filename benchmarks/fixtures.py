@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク用の合成素材とジョブ
+
+generate_dummy_assets.py と同じ考え方で、問題数・カウントダウン秒数・背景動画の
+解像度と fps を指定して素材一式を作る。動画・音声は ffmpeg の lavfi ソース
+（testsrc2 / color / sine）から直接書き出すので、フォントや ImageMagick に依存せず
+毎回同じ内容になる。既にあるファイルは作り直さない。
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Tuple
+
+from moviepy.config import FFMPEG_BINARY
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lambda_local"))
+
+VIDEO_W = 1920
+VIDEO_H = 1080
+
+KANJI_QUESTIONS = [
+    ("形", ["花", "手", "態", "状"], ["はながた", "てがた", "けいたい", "けいじょう"]),
+    ("車", ["電", "汽", "輪", "掌"], ["でんしゃ", "きしゃ", "しゃりん", "しゃしょう"]),
+    ("気", ["天", "元", "配", "球"], ["てんき", "げんき", "きはい", "ききゅう"]),
+]
+
+
+def ffmpeg(*args: str):
+    subprocess.run([FFMPEG_BINARY, "-y", "-loglevel", "error", *args], check=True)
+
+
+def tone(path: Path, sec: float, freq: float = 440.0):
+    if path.exists():
+        return
+    ffmpeg("-f", "lavfi", "-i", f"sine=frequency={freq}:sample_rate=44100:duration={sec}",
+           "-ac", "2", "-c:a", "libmp3lame" if path.suffix == ".mp3" else "pcm_s16le", str(path))
+
+
+def pattern_video(path: Path, sec: float, size: Tuple[int, int] = (VIDEO_W, VIDEO_H), fps: float = 30,
+                  freq: float = 0.0):
+    """動きのあるテストパターン動画。freq を指定すると同じ長さのトーンを音声に付ける。"""
+    if path.exists():
+        return
+    w, h = size
+    args = ["-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate={fps}:duration={sec}"]
+    if freq:
+        args += ["-f", "lavfi", "-i", f"sine=frequency={freq}:sample_rate=44100:duration={sec}", "-c:a", "aac"]
+    ffmpeg(*args, "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", str(path))
+
+
+def keyed_video(path: Path, sec: float, size: Tuple[int, int], key_color: str, fps: float = 30, freq: float = 0.0):
+    """クロマキー用素材: キー色の地の上をテストパターンの小窓が横切る。"""
+    if path.exists():
+        return
+    w, h = size
+    bw, bh = w // 3, h // 3
+    args = [
+        "-f", "lavfi", "-i", f"color=c={key_color}:size={w}x{h}:rate={fps}:duration={sec}",
+        "-f", "lavfi", "-i", f"testsrc2=size={bw}x{bh}:rate={fps}:duration={sec}",
+    ]
+    if freq:
+        args += ["-f", "lavfi", "-i", f"sine=frequency={freq}:sample_rate=44100:duration={sec}", "-c:a", "aac"]
+    ffmpeg(*args, "-filter_complex", f"[0:v][1:v]overlay=x='mod(t*{w // 4},{w - bw})':y={h // 3}",
+           "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", str(path))
+
+
+def panel(path: Path, size: Tuple[int, int], title: str, seed: int):
+    if path.exists():
+        return
+    w, h = size
+    img = Image.new("RGB", size, (240, 240, 240))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, w - 1, h - 1), outline=(30, 30, 30), width=4)
+    draw.text((30, 20), title, fill=(20, 20, 20))
+    for k in range(12):
+        x = (seed * 97 + k * 211) % (w - 120) + 60
+        y = (seed * 53 + k * 173) % (h - 120) + 60
+        draw.ellipse((x - 40, y - 40, x + 40, y + 40), fill=((k * 70) % 256, (k * 40) % 256, (seed * 90) % 256))
+    img.save(path)
+
+
+def frame_png(path: Path, size: Tuple[int, int]):
+    """type画像の代わり: 白地に黒枠の RGBA。"""
+    if path.exists():
+        return
+    w, h = size
+    img = Image.new("RGBA", size, (255, 255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((8, 8, w - 9, h - 9), outline=(0, 0, 0, 255), width=12)
+    draw.line((w // 2, 8, w // 2, h - 9), fill=(0, 0, 0, 255), width=8)
+    draw.line((8, h // 2, w - 9, h // 2), fill=(0, 0, 0, 255), width=8)
+    img.save(path)
+
+
+def fixture_dir(root: Path, kind: str, questions: int, countdown: float, bg_size: Tuple[int, int], bg_fps: float) -> Path:
+    w, h = bg_size
+    return root / f"{kind}_q{questions}_c{countdown:g}_{w}x{h}_{bg_fps:g}fps"
+
+
+def common_assets(out: Path, questions: int, bg_size: Tuple[int, int], bg_fps: float):
+    pattern_video(out / "opening.mp4", 3, freq=330)
+    pattern_video(out / "ending.mp4", 3, freq=350)
+    for i in range(1, questions + 2):
+        pattern_video(out / f"S{i}.mp4", 6, bg_size, bg_fps)
+    keyed_video(out / "alarm.mp4", 2, (VIDEO_W, VIDEO_H), "0x00ff00", freq=880)
+    tone(out / "main_bgm.mp3", 60, 220)
+    tone(out / "answer.mp3", 2, 440)
+    tone(out / "cheer.mp3", 2, 660)
+
+
+def spot_diff_fixture(root: Path, questions: int, countdown: float, bg_size: Tuple[int, int], bg_fps: float):
+    """間違い探し用の素材とジョブを作り、(ジョブ, 素材ディレクトリ) を返す。"""
+    out = fixture_dir(root, "spot_diff", questions, countdown, bg_size, bg_fps)
+    out.mkdir(parents=True, exist_ok=True)
+    common_assets(out, questions, bg_size, bg_fps)
+    keyed_video(out / "count10.mp4", 10, (300, 220), "0x0000ff", freq=600)
+    for name, sec, freq in (("description", 3, 520), ("60s", 1, 740), ("30s", 1, 900),
+                            ("answer1", 1.5, 500), ("answer2", 1.5, 600), ("answer3", 1.5, 700)):
+        tone(out / f"{name}.mp3", sec, freq)
+
+    job_questions = []
+    for i in range(1, questions + 1):
+        pattern_video(out / f"question{i}.mp4", 3, freq=300 + i * 10)
+        panel(out / f"Q{i}_Left.png", (896, 1200), f"Q{i} LEFT", i)
+        panel(out / f"Q{i}_Right.png", (896, 1200), f"Q{i} RIGHT", i + 1)
+        job_questions.append({
+            "left_image": f"Q{i}_Left.png",
+            "right_image": f"Q{i}_Right.png",
+            "diff_points": [
+                {"left_x": 200 + k * 200, "left_y": 300 + k * 250, "right_x": 200 + k * 200, "right_y": 300 + k * 250}
+                for k in range(3)
+            ],
+        })
+    job = {
+        "title": "benchmark",
+        "random_seed": 42,
+        "timing": {"countdown_seconds": countdown},
+        "questions": job_questions,
+    }
+    (out / "job.json").write_text(json.dumps(job, ensure_ascii=False, indent=2), encoding="utf-8")
+    return job, out
+
+
+def kanji_fixture(root: Path, questions: int, countdown: float, bg_size: Tuple[int, int], bg_fps: float):
+    """
+    漢字クロスワード用の素材とジョブを作り、(ジョブ, 素材ディレクトリ) を返す。VOICEVOX は使わない
+    （読み上げ音声はエンジンに繋がらないときに使われるキャッシュとして置いておく）。
+    """
+    import render_kanji_video as kanji
+    from voicevox import VOICEVOX_SPEAKER, text_key
+
+    out = fixture_dir(root, "kanji", questions, countdown, bg_size, bg_fps)
+    out.mkdir(parents=True, exist_ok=True)
+    common_assets(out, questions, bg_size, bg_fps)
+    keyed_video(out / "s30.mp4", countdown, (360, 240), "0x0000ff")
+    tone(out / "explanation1.mp3", 2, 520)
+    tone(out / "explanation2.mp3", 2, 560)
+    for layout in ("type1", "type2", "type3"):
+        frame_png(out / f"{layout}.png", kanji.get_type_config(layout)[0])
+    frame_png(out / "main_question.png", (1536, 1024))
+
+    voice_dir = out / "voice_cache"
+    voice_dir.mkdir(exist_ok=True)
+    job_questions = []
+    for n in range(1, questions + 1):
+        pattern_video(out / f"q{n}s.mp4", 3, freq=300 + n * 10)
+        frame_png(out / f"{n}t.png", (296, 300))
+        answer, cells, readings = KANJI_QUESTIONS[(n - 1) % len(KANJI_QUESTIONS)]
+        q = {
+            "question_no": n,
+            "type_cells": dict(zip(("top_left", "top_right", "bottom_left", "bottom_right"), cells)),
+            "answer": answer,
+            "words": [
+                {"word": (c + answer) if k < 2 else (answer + c), "reading": r}
+                for k, (c, r) in enumerate(zip(cells, readings))
+            ],
+        }
+        tone(voice_dir / f"{text_key(kanji.voice_text(q), VOICEVOX_SPEAKER)}_fixture.wav", 4, 400 + n * 20)
+        job_questions.append(q)
+    job = {
+        "layout_mode": "type1_type2",
+        "type1_questions": (questions + 1) // 2,
+        "random_seed": 42,
+        "questions": job_questions,
+    }
+    (out / "job.json").write_text(json.dumps(job, ensure_ascii=False, indent=2), encoding="utf-8")
+    return job, out
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+レンダラーのスループット計測（合成ジョブ）
+
+benchmarks/fixtures.py で指定サイズの素材・ジョブを作り、
+render_spot_diff_video.build_video と render_kanji_video.build_video を
+それぞれ新しいプロセスで端から端まで実行する。全体とフェーズごとの時間、
+フレーム/秒、ピーク RSS（レンダラーのプロセス）、出力サイズを JSON に記録する。
+
+  python benchmarks/render_suite.py --questions 2 --countdown 10
+  python benchmarks/render_suite.py --renderers spot_diff --bg-size 1280x720 --bg-fps 24 --draft
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "scripts"))
+sys.path.insert(0, str(ROOT / "lambda_local"))
+
+RENDERERS = ("spot_diff", "kanji")
+
+# build_video の中で時間を分けて測る関数（モジュール属性を差し替えて計測する）
+PHASES = {
+    "spot_diff": ("build_segments", "render_mix"),
+    "kanji": ("start_voice_synthesis", "build_question_scene"),
+}
+
+
+def timed(fn, phases: dict, name: str):
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - t0
+
+    return wrapper
+
+
+def peak_rss_mb() -> float:
+    # Linux の ru_maxrss は KB。RUSAGE_CHILDREN は fork 直後の親のメモリも数えてしまうので
+    # ffmpeg 子プロセスは含めず、レンダラー本体のプロセスだけを測る
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_child(renderer: str, job_path: Path, assets: Path, output: Path, result: Path,
+              draft: bool, encoder_profile: str, countdown: float):
+    """1レンダラー分を計測してresultに書く（新しいプロセスで呼ばれる）。"""
+    t0 = time.perf_counter()
+    from moviepy import VideoClip
+    from common_render import probe_media
+
+    if renderer == "spot_diff":
+        import render_spot_diff_video as module
+    else:
+        import render_kanji_video as module
+
+        module.COUNTDOWN_SECONDS = int(countdown)
+    phases = {"import": time.perf_counter() - t0}
+
+    for name in PHASES[renderer]:
+        setattr(module, name, timed(getattr(module, name), phases, name))
+    VideoClip.write_videofile = timed(VideoClip.write_videofile, phases, "encode")
+
+    if draft:
+        module.configure_draft()
+    job = json.loads(job_path.read_text(encoding="utf-8"))
+    t1 = time.perf_counter()
+    module.build_video(job, assets, output, encoder_profile=encoder_profile or None)
+    seconds = time.perf_counter() - t1
+
+    phases["other"] = seconds - sum(v for k, v in phases.items() if k != "import")
+    duration = probe_media(output)["duration"]
+    frames = int(round(duration * module.FPS))
+    result.write_text(json.dumps({
+        "seconds": round(seconds, 3),
+        "phases": {k: round(v, 3) for k, v in phases.items()},
+        "duration": duration,
+        "frames": frames,
+        "fps": round(frames / seconds, 2),
+        "realtime_factor": round(duration / seconds, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "output_bytes": output.stat().st_size,
+    }), encoding="utf-8")
+
+
+def parse_size(text: str):
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="レンダラーのスループット計測（合成ジョブ）")
+    p.add_argument("--renderers", nargs="*", default=list(RENDERERS), choices=list(RENDERERS))
+    p.add_argument("--questions", type=int, default=2)
+    p.add_argument("--countdown", type=float, default=10.0, help="カウントダウン秒数")
+    p.add_argument("--bg-size", type=parse_size, default=(1920, 1080), help="背景動画の解像度 (WxH)")
+    p.add_argument("--bg-fps", type=float, default=30.0, help="背景動画の fps")
+    p.add_argument("--draft", action="store_true", help="--draft レンダーを計測する")
+    p.add_argument("--encoder-profile", default="", help="省略時はジョブ既定（upload-balanced）")
+    p.add_argument("--fixtures", type=Path, default=Path("benchmarks/fixtures"), help="合成素材の置き場所")
+    p.add_argument("--results", type=Path, default=Path("benchmarks/results/render_suite.json"))
+    p.add_argument("--child", choices=list(RENDERERS), help=argparse.SUPPRESS)
+    p.add_argument("--job", type=Path, help=argparse.SUPPRESS)
+    p.add_argument("--assets", type=Path, help=argparse.SUPPRESS)
+    p.add_argument("--output", type=Path, help=argparse.SUPPRESS)
+    p.add_argument("--result", type=Path, help=argparse.SUPPRESS)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        run_child(args.child, args.job, args.assets, args.output, args.result,
+                  args.draft, args.encoder_profile, args.countdown)
+        return
+
+    import fixtures
+
+    builders = {"spot_diff": fixtures.spot_diff_fixture, "kanji": fixtures.kanji_fixture}
+    results = {}
+    for renderer in args.renderers:
+        print(f"[bench] {renderer}: 素材準備中...")
+        _, assets = builders[renderer](args.fixtures, args.questions, args.countdown, args.bg_size, args.bg_fps)
+        out_dir = args.fixtures / "out"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        output = out_dir / f"{assets.name}{'_draft' if args.draft else ''}.mp4"
+        result = out_dir / f"{assets.name}.result.json"
+        cmd = [
+            sys.executable, __file__, "--child", renderer,
+            "--job", str(assets / "job.json"), "--assets", str(assets),
+            "--output", str(output), "--result", str(result),
+            "--countdown", str(args.countdown), "--encoder-profile", args.encoder_profile,
+        ]
+        if args.draft:
+            cmd.append("--draft")
+        print(f"[bench] {renderer}: レンダリング中...")
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stdout[-4000:] + proc.stderr[-4000:])
+            raise SystemExit(f"[bench] {renderer} のレンダリングに失敗しました")
+        r = json.loads(result.read_text(encoding="utf-8"))
+        results[renderer] = r
+        phases = " ".join(f"{k}={v:.1f}s" for k, v in r["phases"].items())
+        print(f"[bench] {renderer:<10} {r['seconds']:>8.1f}s {r['fps']:>7.2f} fps "
+              f"RSS {r['peak_rss_mb']:.0f}MB "
+              f"{r['output_bytes'] / 1e6:.1f}MB  [{phases}]")
+
+    report = {
+        "config": {
+            "questions": args.questions,
+            "countdown": args.countdown,
+            "bg_size": list(args.bg_size),
+            "bg_fps": args.bg_fps,
+            "draft": args.draft,
+            "encoder_profile": args.encoder_profile or None,
+        },
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "renderers": results,
+    }
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    args.results.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[bench] 結果: {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ video_render.json フォーマット:
 {
   "layout": "type1" | "type2" | "type3",   // type1/2: 斜め4隅, type3: 上下左右
   "random_seed": 42,
+  "encoder_profile": "upload-balanced",    // 任意: draft / ci-fast / upload-balanced / archive
   "timing": {
     "countdown_seconds": 30,
     "answer_gap_after_seconds": 1.0
@@ -28,12 +29,17 @@ video_render.json フォーマット:
 }
 """
 import argparse
+import hashlib
 import json
 import os
 import random
 import subprocess
-import urllib.request
+import sys
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
 from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
@@ -43,15 +49,27 @@ from moviepy import (
     AudioFileClip,
     ColorClip,
     CompositeAudioClip,
-    CompositeVideoClip,
     ImageClip,
     VideoClip,
     VideoFileClip,
     concatenate_audioclips,
-    concatenate_videoclips,
 )
 from moviepy.audio.AudioClip import AudioClip
-from moviepy.video.fx.MaskColor import MaskColor
+
+# 間違い探しレンダラーと共有するヘルパー（scripts/common_render.py）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from common_render import (  # noqa: E402
+    ENCODER_PROFILES,
+    MediaRegistry,
+    file_digest,
+    job_encoder_settings,
+    prekeyed_overlay,
+)
+from compositor import PlateCompositeClip, SequenceClip, mark_static  # noqa: E402
+import layer_profiler  # noqa: E402
+from layer_profiler import profile_layer  # noqa: E402
+from s3_sink import encoder_output, fragmented_settings, make_client  # noqa: E402
+from voicevox import VOICEVOX_SPEAKER, VoiceCache, VoicevoxClient  # noqa: E402
 
 # ── 動画制御定数（JSON非依存） ────────────────────────────────────────────
 COUNTDOWN_SECONDS = 30        # 本番用。テスト時はここを10に変更
@@ -124,6 +142,41 @@ CAPTION_Y = 900
 S30_X = VIDEO_W - 420
 S30_Y = VIDEO_H - 280
 
+# ── ドラフト（--draft） ──────────────────────────────────────────────────
+# 同じタイムラインを縮小キャンバス・低fpsでレンダリングする確認用モード
+DRAFT_SCALE = 0.5
+DRAFT_FPS = 15
+SCALE = 1.0   # レイアウト用のピクセル値はすべて px() を通す
+
+
+def px(v: float) -> int:
+    return int(round(v * SCALE))
+
+
+def configure_draft(scale: float = DRAFT_SCALE, fps: int = DRAFT_FPS):
+    """キャンバス・fps・レイアウト定数をドラフト用に切り替える。シーン構築より前に1回だけ呼ぶ。"""
+    global SCALE, VIDEO_W, VIDEO_H, FPS, TYPE_IMG_TARGET_H, TYPE_IMG_X
+    global ANS_PANEL_X, ANS_PANEL_Y, ANS_PANEL_W, ANS_PANEL_H, ANS_PANEL_RADIUS
+    global MQ_X, MQ_Y, NT_HEIGHT, CAPTION_X, CAPTION_Y, S30_X, S30_Y
+    if SCALE != 1.0:
+        return
+    SCALE = scale
+    VIDEO_W, VIDEO_H = px(VIDEO_W), px(VIDEO_H)
+    FPS = fps
+    TYPE_IMG_TARGET_H, TYPE_IMG_X = px(TYPE_IMG_TARGET_H), px(TYPE_IMG_X)
+    ANS_PANEL_X, ANS_PANEL_Y = px(ANS_PANEL_X), px(ANS_PANEL_Y)
+    ANS_PANEL_W, ANS_PANEL_H = px(ANS_PANEL_W), px(ANS_PANEL_H)
+    ANS_PANEL_RADIUS = px(ANS_PANEL_RADIUS)
+    MQ_X, MQ_Y, NT_HEIGHT = px(MQ_X), px(MQ_Y), px(NT_HEIGHT)
+    CAPTION_X, CAPTION_Y = px(CAPTION_X), px(CAPTION_Y)
+    S30_X, S30_Y = px(S30_X), px(S30_Y)
+    print(f"[draft] canvas={VIDEO_W}x{VIDEO_H} fps={FPS}")
+
+
+def decode_size() -> Optional[Tuple[int, int]]:
+    """ドラフト時は全画面素材を ffmpeg 側でキャンバスサイズに縮小してデコードさせる。"""
+    return (VIDEO_W, VIDEO_H) if SCALE != 1.0 else None
+
 # Noto Sans JP Bold フォントパス（GitHub Actions環境）
 FONT_PATHS = [
     # macOS
@@ -138,8 +191,6 @@ FONT_PATHS = [
     "/tmp/NotoSansJP-Bold.ttf",
 ]
 
-VOICEVOX_URL = os.environ.get("VOICEVOX_URL", "http://localhost:50021")
-VOICEVOX_SPEAKER = int(os.environ.get("VOICEVOX_SPEAKER", "1"))
 
 
 def debug_type2_cells(assets: Path):
@@ -195,14 +246,26 @@ def resolve_layout_per_question(job: dict) -> List[str]:
 
 # ── ユーティリティ ───────────────────────────────────────────────────────
 
-def get_font(size: int) -> ImageFont.FreeTypeFont:
+@lru_cache(maxsize=1)
+def font_path() -> Optional[str]:
+    """FONT_PATHS のうち最初に読み込めるフォント（プロセス内で1回だけ探す）。"""
     for path in FONT_PATHS:
         if Path(path).exists():
             try:
-                return ImageFont.truetype(path, size)
+                ImageFont.truetype(path, 12)
+                return path
             except Exception:
                 continue
-    return ImageFont.load_default()
+    return None
+
+
+@lru_cache(maxsize=64)
+def get_font(size: int) -> ImageFont.FreeTypeFont:
+    """サイズごとの FreeTypeFont（プロセス内で共有する）。"""
+    path = font_path()
+    if path is None:
+        return ImageFont.load_default()
+    return ImageFont.truetype(path, size)
 
 
 def load_json(path: Path) -> dict:
@@ -210,26 +273,86 @@ def load_json(path: Path) -> dict:
         return json.load(f)
 
 
-def safe_video(path: Path, duration: float = 2.0, color=(20, 20, 20)):
+# ── 静止画素材のメモ化 ──
+# PNG素材はプロセス内で内容（サイズ・mtime）が変わらない限り1回だけ開き、
+# 配置用のトリミング・リサイズも1回だけ行う（バッチレンダーでは問・ジョブをまたいで共有）。
+
+def load_rgba(path: Path) -> Image.Image:
+    """PNG素材を RGBA で返す。共有されるので、描き込む側は copy() してから使う。"""
+    st = path.stat()
+    return _load_rgba(str(path.resolve()), st.st_size, st.st_mtime_ns)
+
+
+@lru_cache(maxsize=32)
+def _load_rgba(path: str, size: int, mtime_ns: int) -> Image.Image:
+    return Image.open(path).convert("RGBA")
+
+
+def prepared_overlay(
+    path: Path, width: Optional[int] = None, height: Optional[int] = None, trim: bool = False
+) -> np.ndarray:
+    """
+    透明余白のトリミング（trim）と、幅 width か高さ height に合わせた LANCZOS リサイズを
+    済ませた RGBA 配列。読み取り専用で共有する。
+    """
+    st = path.stat()
+    return _prepared_overlay(str(path.resolve()), st.st_size, st.st_mtime_ns, width, height, trim)
+
+
+@lru_cache(maxsize=32)
+def _prepared_overlay(
+    path: str, size: int, mtime_ns: int, width: Optional[int], height: Optional[int], trim: bool
+) -> np.ndarray:
+    img = _load_rgba(path, size, mtime_ns)
+    if trim:
+        rows, cols = np.where(np.array(img)[:, :, 3] > 0)
+        if len(rows) > 0:
+            img = img.crop((cols.min(), rows.min(), cols.max() + 1, rows.max() + 1))
+    orig_w, orig_h = img.size
+    if width is not None:
+        target = (width, int(orig_h * (width / orig_w)))
+    else:
+        target = (int(orig_w * (height / orig_h)), height)
+    arr = np.array(img.resize(target, Image.LANCZOS))
+    arr.setflags(write=False)
+    return arr
+
+
+def resize_to_height(arr: np.ndarray, height: int) -> np.ndarray:
+    """clip.resized(height=...) と同じ計算（LANCZOS・幅は切り捨て）で静止画を1回だけリサイズする。"""
+    h, w = arr.shape[:2]
+    return np.array(Image.fromarray(arr).resize((int(w * height / h), height), Image.LANCZOS))
+
+
+def safe_video(
+    path: Path,
+    duration: float = 2.0,
+    color=(20, 20, 20),
+    media: Optional[MediaRegistry] = None,
+    full_frame: bool = True,
+):
     if path.exists():
-        return VideoFileClip(str(path))
+        size = decode_size() if full_frame else None
+        if media is not None:
+            return media.video(path, size=size)
+        return VideoFileClip(str(path), target_resolution=size)
     return ColorClip(size=(VIDEO_W, VIDEO_H), color=color, duration=duration)
 
 
-def safe_audio(path: Path, duration: float = 1.0, volume: float = 1.0):
+def safe_audio(path: Path, duration: float = 1.0, volume: float = 1.0, media: Optional[MediaRegistry] = None):
     if path.exists():
-        return AudioFileClip(str(path)).with_volume_scaled(volume)
+        clip = media.audio(path) if media is not None else AudioFileClip(str(path))
+        return clip.with_volume_scaled(volume)
     def make_frame(_t):
         return 0.0
     return AudioClip(make_frame, duration=duration, fps=44100)
 
 
-def loop_background(bg_clip: VideoFileClip, duration: float):
-    base = bg_clip.resized((VIDEO_W, VIDEO_H)).without_audio()
-    if base.duration >= duration:
-        return base.subclipped(0, duration)
-    loops = int(duration // base.duration) + 1
-    return concatenate_videoclips([base] * loops, method="compose").subclipped(0, duration)
+def loop_background(bg_path: Optional[Path], duration: float, media: MediaRegistry, color=(40, 40, 40)):
+    """背景動画を duration までループさせる。素材は ffmpeg 側でキャンバスサイズにデコードする。"""
+    if bg_path is not None and bg_path.exists():
+        return media.looping_video(bg_path, duration, (VIDEO_W, VIDEO_H))
+    return ColorClip(size=(VIDEO_W, VIDEO_H), color=color, duration=duration)
 
 
 def loop_audio(audio_clip, duration: float):
@@ -239,90 +362,95 @@ def loop_audio(audio_clip, duration: float):
     return concatenate_audioclips([audio_clip] * loops).subclipped(0, duration)
 
 
-def apply_chroma_key(clip, key_color, threshold=90, stiffness=6):
-    return clip.with_effects(
-        [MaskColor(color=key_color, threshold=threshold, stiffness=stiffness)]
-    )
+def sequence_clips(clips: List[VideoClip]) -> VideoClip:
+    """
+    不透明なクリップを順に並べる（concatenate_videoclips(method="compose") の置き換え）。
+
+    映像は SequenceClip で再生中のクリップのフレームをそのまま返し、
+    音声は concatenate_videoclips と同じく各クリップの開始位置に重ねる。
+    """
+    video = SequenceClip(clips, size=(VIDEO_W, VIDEO_H))
+    audios = []
+    for clip, start in zip(clips, video.starts):
+        if clip.audio is not None:
+            audios.append(clip.audio.with_start(start))
+    if audios:
+        video = video.with_audio(CompositeAudioClip(audios))
+    return video
 
 
 # ── VOICEVOX 音声生成 ────────────────────────────────────────────────────
 
-def generate_voice(text: str, output_path: Path, speaker: int = VOICEVOX_SPEAKER) -> bool:
-    """VOICEVOXで音声生成。失敗時はFalseを返す。"""
-    try:
-        # 音声クエリ生成
-        query_url = f"{VOICEVOX_URL}/audio_query?text={urllib.request.quote(text)}&speaker={speaker}"
-        req = urllib.request.Request(query_url, method="POST")
-        with urllib.request.urlopen(req, timeout=10) as r:
-            query_data = r.read()
-
-        # 音声合成
-        synth_url = f"{VOICEVOX_URL}/synthesis?speaker={speaker}"
-        req2 = urllib.request.Request(
-            synth_url,
-            data=query_data,
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
-        with urllib.request.urlopen(req2, timeout=30) as r:
-            output_path.write_bytes(r.read())
-        return True
-    except Exception as e:
-        print(f"[VOICEVOX] 失敗: {e}")
-        return False
-
-
-def prepare_voice_files(questions: list, assets: Path) -> Dict[int, Path]:
-    """全問の音声ファイルを事前生成して返す。"""
-    voice_dir = assets / "voice_cache"
-    voice_dir.mkdir(exist_ok=True)
-    result = {}
-    for q in questions:
-        n = q["question_no"]
-        words = q.get("words", [])
-        # 読み上げテキスト: 「正解は○○です。熟語1、熟語2、熟語3、熟語4」
-        readings = "、".join(w.get("reading", w["word"]) for w in words)
-        text = f"正解は{q['answer']}です。{readings}"
-        out = voice_dir / f"voice_q{n}.wav"
-        if not out.exists():
-            ok = generate_voice(text, out)
-            if not ok:
-                print(f"[voice] Q{n}: VOICEVOXなし、サイレント使用")
-        result[n] = out
-    return result
+def voice_text(q: dict) -> str:
+    """読み上げテキスト: 「正解は○○です。熟語1、熟語2、熟語3、熟語4」"""
+    readings = "、".join(w.get("reading", w["word"]) for w in q.get("words", []))
+    return f"正解は{q['answer']}です。{readings}"
+
+
+def start_voice_synthesis(
+    questions: list, assets: Path, client: Optional[VoicevoxClient] = None
+) -> Tuple[VoiceCache, Dict[int, "Future[Optional[Path]]"]]:
+    """
+    全問の読み上げ音声の用意を始め、(キャッシュ, 問番号 -> Future) を返す。
+    <assets>/voice_cache を読み上げ文・話者・エンジンのバージョンで引き、ないものは
+    バックグラウンドで並列に合成する。使い終わったら cache.close() する。
+    """
+    cache = VoiceCache(assets / "voice_cache", client=client, speaker=VOICEVOX_SPEAKER)
+    return cache, {q["question_no"]: cache.submit(voice_text(q)) for q in questions}
+
+
+def resolve_voice(n: int, voice) -> Path:
+    """voice_files の値（パスか合成中の Future）を待って音声パスにする。用意できなければサイレント用のパス。"""
+    if isinstance(voice, Future):
+        voice = voice.result()
+    if voice is None:
+        print(f"[voice] Q{n}: VOICEVOXなし、サイレント使用")
+        return Path("__none__")
+    return voice
 
 
 # ── セル描画（共通ヘルパー） ──
-def draw_centered(draw, cx, cy, text, font, fill):
+@lru_cache(maxsize=4096)
+def _ink_offset(font, size: int, text: str) -> Optional[Tuple[float, float]]:
     """
-    cx, cy を中心にテキストを描画。
-    一旦オフスクリーンに描いて実ピクセル範囲を計測する完全中央揃え。
+    text を font で描いたときの、描画原点から実ピクセル範囲の中心へのオフセットの逆向き。
+    インクがなければ None。(font, size, text) ごとに1回だけオフスクリーンに描いて実測する。
     """
     # フォントサイズより少し大きいキャンバスに描画してピクセル範囲を実測
-    tmp_size = font.size * 3
+    tmp_size = size * 3
     tmp = Image.new("RGBA", (tmp_size, tmp_size), (0, 0, 0, 0))
     tmp_draw = ImageDraw.Draw(tmp)
     tmp_draw.text((tmp_size // 2, tmp_size // 2), text, fill=(255, 255, 255, 255), font=font)
-    
+
     arr = np.array(tmp)
     # 実際に描画されたピクセルの範囲を検出（アルファ > 0）
     rows = np.where(arr[:, :, 3] > 0)[0]
     cols = np.where(arr[:, :, 3] > 0)[1]
-    
+
     if len(rows) == 0 or len(cols) == 0:
-        # フォールバック
-        draw.text((cx, cy), text, fill=fill, font=font)
-        return
-    
+        return None
+
     # 実ピクセル中心からのオフセットを計算
     pixel_cx = (cols.min() + cols.max()) / 2
     pixel_cy = (rows.min() + rows.max()) / 2
-    offset_x = tmp_size // 2 - pixel_cx
-    offset_y = tmp_size // 2 - pixel_cy
-    
+    return tmp_size // 2 - pixel_cx, tmp_size // 2 - pixel_cy
+
+
+def draw_centered(draw, cx, cy, text, font, fill):
+    """
+    cx, cy を中心にテキストを描画。
+    実ピクセル範囲を実測した完全中央揃え（実測は _ink_offset で文字列・サイズごとに1回）。
+    """
+    offset = _ink_offset(font, font.size, text)
+    if offset is None:
+        # フォールバック
+        draw.text((cx, cy), text, fill=fill, font=font)
+        return
+    offset_x, offset_y = offset
+
     # 視覚的補正：漢字は少し下にずれる傾向があるため微調整
     visual_adjust_y = font.size * 0.05  # フォントサイズの5%下に調整
-    
+
     # 本描画: 実ピクセル重心が cx, cy に来るよう補正
     draw.text((cx + offset_x, cy + offset_y + visual_adjust_y), text, fill=fill, font=font)
 
@@ -348,7 +476,7 @@ def render_type_image(
     type画像に漢字を描き込んだ画像をndarrayで返す。
     show_answer=True のとき中央に答えを表示。
     """
-    img = Image.open(str(type_img_path)).convert("RGBA")
+    img = load_rgba(type_img_path).copy()
     draw = ImageDraw.Draw(img)
 
     type_cells_data = q_data.get("type_cells", {})
@@ -421,48 +549,52 @@ def render_type_image(
 
 # ── 答えパネル描画 ────────────────────────────────────────────────────────
 
-def make_answer_panel(q_data: dict, duration: float) -> VideoClip:
-    """画面右側の答えパネル（正解 + 4熟語）をVideoClipで返す。"""
+def render_answer_panel(q_data: dict) -> np.ndarray:
+    """画面右側の答えパネル（正解 + 4熟語）の RGBA 画像。"""
     panel_w = ANS_PANEL_W
     panel_h = ANS_PANEL_H
 
-    def make_frame(_t):
-        img = Image.new("RGBA", (panel_w, panel_h), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        # 赤枠パネル
-        draw.rounded_rectangle(
-            (0, 0, panel_w - 1, panel_h - 1),
-            radius=ANS_PANEL_RADIUS,
-            fill=(255, 255, 255, 230),
-            outline=(220, 30, 30, 255),
-            width=6,
-        )
-        # 「正解」ヘッダ
-        header_font = get_font(52)
-        header_text = "正解"
-        draw_centered(draw, panel_w // 2, 46, header_text, header_font, fill=(220, 30, 30, 255))
-
-        # 4熟語
-        words = q_data.get("words", [])
-        item_h = (panel_h - 100) // max(len(words), 1)
-        for i, w in enumerate(words):
-            word = w.get("word", "")
-            reading = w.get("reading", "")
-            y_base = 95 + i * item_h
-
-            # 読みがな（小さめ）
-            reading_font = get_font(28)
-            draw_centered(draw, panel_w // 2, y_base + 14, reading, reading_font, fill=(80, 80, 80, 255))
-            
-            # 熟語（大きめ・太字）
-            word_font = get_font(72)
-            draw_centered(draw, panel_w // 2, y_base + 34 + 36, word, word_font, fill=(0, 0, 0, 255))
-
-        return np.array(img)
-
-    return (
-        VideoClip(frame_function=make_frame, duration=duration)
-        .with_fps(FPS)
+    img = Image.new("RGBA", (panel_w, panel_h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    # 赤枠パネル
+    draw.rounded_rectangle(
+        (0, 0, panel_w - 1, panel_h - 1),
+        radius=ANS_PANEL_RADIUS,
+        fill=(255, 255, 255, 230),
+        outline=(220, 30, 30, 255),
+        width=px(6),
+    )
+    # 「正解」ヘッダ
+    header_font = get_font(px(52))
+    header_text = "正解"
+    draw_centered(draw, panel_w // 2, px(46), header_text, header_font, fill=(220, 30, 30, 255))
+
+    # 4熟語
+    words = q_data.get("words", [])
+    item_h = (panel_h - px(100)) // max(len(words), 1)
+    for i, w in enumerate(words):
+        word = w.get("word", "")
+        reading = w.get("reading", "")
+        y_base = px(95) + i * item_h
+
+        # 読みがな（小さめ）
+        reading_font = get_font(px(28))
+        draw_centered(draw, panel_w // 2, y_base + px(14), reading, reading_font, fill=(80, 80, 80, 255))
+
+        # 熟語（大きめ・太字）
+        word_font = get_font(px(72))
+        draw_centered(draw, panel_w // 2, y_base + px(34 + 36), word, word_font, fill=(0, 0, 0, 255))
+
+    return np.array(img)
+
+
+def make_answer_panel(q_data: dict, duration: float, image: Optional[np.ndarray] = None) -> VideoClip:
+    """答えパネルの静止クリップ。image（カードキャッシュの画像）がなければここで描く。"""
+    if image is None:
+        image = render_answer_panel(q_data)
+    return mark_static(
+        ImageClip(image, transparent=False)
+        .with_duration(duration)
         .with_position((ANS_PANEL_X, ANS_PANEL_Y))
     )
 
@@ -470,27 +602,112 @@ def make_answer_panel(q_data: dict, duration: float) -> VideoClip:
 # ── カウントダウン字幕 ────────────────────────────────────────────────────
 
 def make_caption_clip(text: str, duration: float, color=(220, 30, 30)) -> VideoClip:
-    """赤文字字幕クリップ。"""
-    font = get_font(44)
+    """赤文字字幕クリップ（静止）。"""
+    font = get_font(px(44))
     dummy = Image.new("RGBA", (1, 1))
     bbox = ImageDraw.Draw(dummy).textbbox((0, 0), text, font=font)
-    tw = bbox[2] - bbox[0] + 20
-    th = bbox[3] - bbox[1] + 12
+    tw = bbox[2] - bbox[0] + px(20)
+    th = bbox[3] - bbox[1] + px(12)
 
-    def make_frame(_t):
-        img = Image.new("RGBA", (tw, th), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        draw.rounded_rectangle((0, 0, tw-1, th-1), radius=8, fill=(255, 255, 255, 180))
-        draw.text((10, 6), text, fill=(*color, 255), font=font)
-        return np.array(img)
-
-    return (
-        VideoClip(frame_function=make_frame, duration=duration)
-        .with_fps(FPS)
+    img = Image.new("RGBA", (tw, th), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.rounded_rectangle((0, 0, tw-1, th-1), radius=px(8), fill=(255, 255, 255, 180))
+    draw.text((px(10), px(6)), text, fill=(*color, 255), font=font)
+
+    return mark_static(
+        ImageClip(np.array(img), transparent=False)
+        .with_duration(duration)
         .with_position((CAPTION_X, CAPTION_Y))
     )
 
 
+# ── 問題カードのキャッシュ ──────────────────────────────────────────────
+# 問題時・答え時の type 画像（表示サイズにリサイズ済み）と答えパネルを、
+# 内容のハッシュをキーに <assets>/card_cache へ .npy で保存する。
+# 同じ問題が別の週の動画に出てきたときは描画せずに読み込むだけで済む。
+
+# カードの描き方を変えたら上げる（古いカードは自然に使われなくなる）
+CARD_CACHE_VERSION = 1
+CARD_PARTS = ("question", "answer", "panel")
+
+
+@dataclass
+class QuestionCard:
+    question: np.ndarray  # 問題時の type 画像（RGBA・表示サイズ）
+    answer: np.ndarray    # 答え時の type 画像（RGBA・表示サイズ）
+    panel: np.ndarray     # 答えパネル（RGBA）
+
+
+def type_target_height(mq_h: int) -> int:
+    """main_question の高さ mq_h の下に置く type 画像の表示高さ。"""
+    type_top_y = mq_h + px(5)                      # 余白を10→5に
+    return min(TYPE_IMG_TARGET_H, VIDEO_H - type_top_y)
+
+
+def card_cache_key(q_data: dict, layout: str, type_img_path: Path, type_h: int) -> str:
+    font = font_path()
+    inputs = {
+        "version": CARD_CACHE_VERSION,
+        "layout": layout,
+        "template": file_digest(type_img_path),
+        "cells": q_data.get("type_cells", {}),
+        "answer": q_data.get("answer", ""),
+        "words": q_data.get("words", []),
+        "font": file_digest(Path(font)) if font else "default",
+        "type_height": type_h,
+        "panel": [ANS_PANEL_W, ANS_PANEL_H, SCALE],
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:24]
+
+
+def render_question_card(q_data: dict, layout: str, type_img_path: Path, type_h: int) -> QuestionCard:
+    return QuestionCard(
+        question=resize_to_height(render_type_image(type_img_path, q_data, layout, show_answer=False), type_h),
+        answer=resize_to_height(render_type_image(type_img_path, q_data, layout, show_answer=True), type_h),
+        panel=render_answer_panel(q_data),
+    )
+
+
+def question_card(
+    q_data: dict, layout: str, type_img_path: Path, type_h: int, cache_dir: Optional[Path]
+) -> QuestionCard:
+    """カードをキャッシュから読み込む。なければ描いて保存する（cache_dir=None なら描くだけ）。"""
+    if cache_dir is None:
+        return render_question_card(q_data, layout, type_img_path, type_h)
+    key = card_cache_key(q_data, layout, type_img_path, type_h)
+    # ファイル名に問番号は入れない（別の動画で別の番号として出てきても同じカードを使う）
+    paths = {part: cache_dir / f"{layout}_{key}.{part}.npy" for part in CARD_PARTS}
+    if all(path.exists() for path in paths.values()):
+        print(f"[card_cache] 第{q_data.get('question_no')}問 hit -> {key}")
+        return QuestionCard(**{part: np.load(path) for part, path in paths.items()})
+
+    card = render_question_card(q_data, layout, type_img_path, type_h)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for part, path in paths.items():
+        # 書き終えてから置き換える（並列レンダーや中断で壊れたカードを残さない）
+        tmp_path = path.with_name(path.name[: -len(".npy")] + f".{os.getpid()}.tmp.npy")
+        np.save(tmp_path, getattr(card, part))
+        os.replace(tmp_path, path)
+    print(f"[card_cache] 第{q_data.get('question_no')}問 作成 -> {key}")
+    return card
+
+
+def main_question_height(assets: Path) -> int:
+    mq_img_path = assets / "main_question.png"
+    if not mq_img_path.exists():
+        return 0
+    return prepared_overlay(mq_img_path, width=px(1100), trim=True).shape[0]
+
+
+def prewarm_cards(job: dict, assets: Path) -> int:
+    """ジョブの全問のカードをレンダリング前にキャッシュへ作っておく。作成・確認した枚数を返す。"""
+    type_h = type_target_height(main_question_height(assets))
+    cache_dir = assets / "card_cache"
+    for q, layout in zip(job["questions"], resolve_layout_per_question(job)):
+        question_card(q, layout, assets / f"{layout}.png", type_h, cache_dir)
+    return len(job["questions"])
+
+
 # ── 1問パート構築 ─────────────────────────────────────────────────────────
 
 def build_question_scene(
@@ -499,43 +716,74 @@ def build_question_scene(
     assets: Path,
     used_backgrounds: set,
     timing: dict,
-    voice_files: Dict[int, Path],
+    voice_files: Dict[int, "Path | Future[Optional[Path]]"],
     is_first_question: bool,
+    media: MediaRegistry,
 ) -> Tuple[VideoClip, float]:
     """
     1問分のVideoClipと所要秒数を返す。
     チャプタータイムスタンプ計算用に所要秒数も返す。
+    voice_files の値は合成中の Future でもよい。尺に依存しない素材・画像の準備を
+    済ませてから待つので、読み上げ音声の合成はその裏で進む。
     """
     n = q_data["question_no"]
     countdown_seconds = float(timing.get("countdown_seconds", 30))
     answer_gap = float(timing.get("answer_gap_after_seconds", 1.0))
 
     # ── アセット読み込み ──
-    qs_clip = safe_video(assets / f"q{n}s.mp4", duration=3.0)
+    qs_clip = safe_video(assets / f"q{n}s.mp4", duration=3.0, media=media)
 
     all_bgs = sorted(assets.glob("S*.mp4"))
     candidates = [p for p in all_bgs if p.name not in used_backgrounds] or list(all_bgs)
     bg_path = random.choice(candidates) if candidates else None
     if bg_path:
         used_backgrounds.add(bg_path.name)
-        bg_base = VideoFileClip(str(bg_path))
-    else:
-        bg_base = ColorClip(size=(VIDEO_W, VIDEO_H), color=(40, 40, 40), duration=10.0)
 
     type_img_path = assets / f"{layout}.png"
     mq_img_path = assets / "main_question.png"
     nt_img_path = assets / f"{n}t.png"
-    alarm_clip = safe_video(assets / "alarm.mp4", duration=2.0)
-    s30_clip = safe_video(assets / "s30.mp4", duration=countdown_seconds)
-
-    explanation1 = safe_audio(assets / "explanation1.mp3", duration=2.0)
-    explanation2 = safe_audio(assets / "explanation2.mp3", duration=2.0)
-    answer_sfx = safe_audio(assets / "answer.mp3", duration=1.5)
-    cheer = safe_audio(assets / "cheer.mp3", duration=2.0)
+    alarm_clip = safe_video(assets / "alarm.mp4", duration=2.0, media=media)
+    s30_clip = safe_video(assets / "s30.mp4", duration=countdown_seconds, media=media, full_frame=False)
+
+    explanation1 = safe_audio(assets / "explanation1.mp3", duration=2.0, media=media)
+    explanation2 = safe_audio(assets / "explanation2.mp3", duration=2.0, media=media)
+    answer_sfx = safe_audio(assets / "answer.mp3", duration=1.5, media=media)
+    cheer = safe_audio(assets / "cheer.mp3", duration=2.0, media=media)
+
+    # ── 尺に依存しない準備（読み上げ音声の合成を待つ前に済ませる） ──
+    # main_question.png: 透明余白をトリミングし、PILで先にリサイズしてから配置（posの干渉を回避）
+    mq_arr = prepared_overlay(mq_img_path, width=px(1100), trim=True) if mq_img_path.exists() else None
+    mq_h = mq_arr.shape[0] if mq_arr is not None else 0
+    # Nt.png: main_questionの左に小さく配置（PILで先にリサイズ）
+    nt_arr = prepared_overlay(nt_img_path, height=NT_HEIGHT) if mq_arr is not None and nt_img_path.exists() else None
+
+    # 問題時・答え時の type 画像と答えパネルは問の中で変化しないので、カードキャッシュから読む（なければ1回だけ描く）
+    type_target_h = type_target_height(mq_h)
+    card = question_card(q_data, layout, type_img_path, type_target_h, assets / "card_cache")
+
+    chroma_cache = assets / "chroma_cache"
+    s30_chroma = prekeyed_overlay(
+        s30_clip,
+        assets / "s30.mp4",
+        chroma_cache,
+        key_color=(0, 0, 255),
+        threshold=150,
+        stiffness=4,
+        height=px(240),
+    )
+    alarm_chroma = prekeyed_overlay(
+        alarm_clip,
+        assets / "alarm.mp4",
+        chroma_cache,
+        key_color=(0, 255, 0),
+        threshold=150,
+        stiffness=4,
+        size=(VIDEO_W, VIDEO_H),
+    )
 
-    # VOICEVOX音声
-    voice_path = voice_files.get(n, Path("__none__"))
-    voice_audio = safe_audio(voice_path, duration=3.0)
+    # VOICEVOX音声（尺が決まるのでここで初めて合成を待つ）
+    voice_path = resolve_voice(n, voice_files.get(n))
+    voice_audio = safe_audio(voice_path, duration=3.0, media=media)
 
     # ── タイミング計算 ──
     # [問題パート]
@@ -560,136 +808,95 @@ def build_question_scene(
     scene_duration = max(answer_show_start + answer_display_duration, min_scene_end)
 
     # ── 背景ループ ──
-    bg_loop = loop_background(bg_base, scene_duration)
-
-    # ── type画像クリップ（問題時・答え時） ──
-    def make_type_frame_question(_t):
-        arr = render_type_image(type_img_path, q_data, layout, show_answer=False)
-        return arr
-
-    def make_type_frame_answer(_t):
-        arr = render_type_image(type_img_path, q_data, layout, show_answer=True)
-        return arr
+    bg_loop = loop_background(bg_path, scene_duration, media)
 
+    scene = f"Q{n}"
     layers = []
     # 1. 白背景（最下層）
     white_bg = ColorClip(size=(VIDEO_W, VIDEO_H), color=(255, 255, 255), duration=scene_duration)
-    layers.append(white_bg)
+    layers.append(profile_layer(white_bg, scene, "white_bg"))
     # 2. 背景動画（白背景の上）
-    layers.append(bg_loop)
-
-    mq_h = 0
-    if mq_img_path.exists():
-        # main_question.png: PILで先にリサイズしてから配置（posの干渉を回避）
-        mq_target_w = 1100
-        mq_pil_raw = Image.open(str(mq_img_path)).convert("RGBA")
-        print(f"[DEBUG] main_question.png 実サイズ: {mq_pil_raw.size}")
-        arr_check = np.array(mq_pil_raw)
-        non_transparent_rows = np.where(arr_check[:, :, 3] > 0)[0]
-        if len(non_transparent_rows) > 0:
-            print(f"[DEBUG] 最初の非透明行: y={non_transparent_rows.min()}, 最後: y={non_transparent_rows.max()}")
-
-        # 透明余白をトリミング
-        rows = np.where(arr_check[:, :, 3] > 0)[0]
-        cols = np.where(arr_check[:, :, 3] > 0)[1]
-        if len(rows) > 0:
-            mq_pil = mq_pil_raw.crop((cols.min(), rows.min(), cols.max() + 1, rows.max() + 1))
-        else:
-            mq_pil = mq_pil_raw
-        orig_w, orig_h = mq_pil.size
-        scale = mq_target_w / orig_w
-        mq_target_h = int(orig_h * scale)
-        mq_pil = mq_pil.resize((mq_target_w, mq_target_h), Image.LANCZOS)
-        mq_arr = np.array(mq_pil)
-        mq_h = mq_target_h
+    layers.append(profile_layer(bg_loop, scene, "background"))
+
+    if mq_arr is not None:
+        mq_target_w = mq_arr.shape[1]
 
         mq_x = (VIDEO_W - mq_target_w) // 2
         mq_y = 0
-        mq_resized = (
+        mq_resized = mark_static(
             ImageClip(mq_arr)
             .with_duration(scene_duration)
             .with_position((mq_x, mq_y))
         )
-        layers.append(mq_resized)
-
-        # Nt.png: main_questionの左に小さく配置（PILで先にリサイズ）
-        if nt_img_path.exists():
-            nt_pil = Image.open(str(nt_img_path)).convert("RGBA")
-            nt_w_orig, nt_h_orig = nt_pil.size
-            nt_scale = NT_HEIGHT / nt_h_orig
-            nt_w = int(nt_w_orig * nt_scale)
-            nt_pil = nt_pil.resize((nt_w, NT_HEIGHT), Image.LANCZOS)
-            nt_arr = np.array(nt_pil)
-
-            nt_x = mq_x - nt_w - 8
+        layers.append(profile_layer(mq_resized, scene, "main_question"))
+
+        if nt_arr is not None:
+            nt_w = nt_arr.shape[1]
+
+            nt_x = mq_x - nt_w - px(8)
             nt_y = mq_y + max(0, (mq_h - NT_HEIGHT) // 2)
-            nt_resized = (
+            nt_resized = mark_static(
                 ImageClip(nt_arr)
                 .with_duration(scene_duration)
                 .with_position((nt_x, nt_y))
             )
-            layers.append(nt_resized)
+            layers.append(profile_layer(nt_resized, scene, "nt"))
 
     # ── type画像（main_questionの下に配置） ──
     # type画像のリサイズ後サイズを計算
     type_size, _, _, _ = get_type_config(layout)
 
-    type_top_y = mq_h + 5                          # 余白を10→5に
-    type_avail_h = VIDEO_H - type_top_y
-    type_target_h = min(TYPE_IMG_TARGET_H, type_avail_h)
-    type_center_y = type_top_y                     # 上詰め（中央寄せをやめる）
+    type_center_y = mq_h + px(5)                   # 上詰め（中央寄せをやめる）
 
     scale = type_target_h / type_size[1]
     type_display_w = int(type_size[0] * scale)
 
-    type_q_clip = (
-        VideoClip(frame_function=make_type_frame_question, duration=answer_show_start)
-        .with_fps(FPS)
-        .resized(height=type_target_h)
+    # アルファはマスクに分けず RGBA のまま持つ（合成時にそのまま8bitアルファとして使う）
+    type_q_clip = mark_static(
+        ImageClip(card.question, transparent=False)
+        .with_duration(answer_show_start)
         .with_position((TYPE_IMG_X, type_center_y))
     )
-    type_a_clip = (
-        VideoClip(frame_function=make_type_frame_answer, duration=scene_duration - answer_show_start)
-        .with_fps(FPS)
-        .resized(height=type_target_h)
+    type_a_clip = mark_static(
+        ImageClip(card.answer, transparent=False)
+        .with_duration(scene_duration - answer_show_start)
         .with_position((TYPE_IMG_X, type_center_y))
         .with_start(answer_show_start)
     )
 
-    layers.append(type_q_clip)
-    layers.append(type_a_clip)
+    layers.append(profile_layer(type_q_clip, scene, "type_question"))
+    layers.append(profile_layer(type_a_clip, scene, "type_answer"))
 
     # ── s30タイマー（クロマキー・問題時のみ） ──
-    s30_video = s30_clip.resized(height=240)
-    s30_chroma = apply_chroma_key(s30_video, key_color=(0, 0, 255), threshold=150, stiffness=4)
     s30_placed = (
         s30_chroma
         .with_start(s30_start)
         .with_end(s30_end)
         .with_position((S30_X, S30_Y))
     )
-    layers.append(s30_placed)
+    layers.append(profile_layer(s30_placed, scene, "s30"))
 
     # ── alarm（クロマキー） ──
-    alarm_resized = alarm_clip.resized((VIDEO_W, VIDEO_H))
-    alarm_chroma = apply_chroma_key(alarm_resized, key_color=(0, 255, 0), threshold=150, stiffness=4)
     alarm_placed = alarm_chroma.with_start(alarm_start)
-    layers.append(alarm_placed)
+    layers.append(profile_layer(alarm_placed, scene, "alarm"))
 
     # ── 字幕（答え表示で消える） ──
     caption_x = ANS_PANEL_X
-    caption_y = ANS_PANEL_Y - 60
+    caption_y = ANS_PANEL_Y - px(60)
     caption = make_caption_clip("矢印の向きにご注意ください", duration=answer_show_start)
     caption = caption.with_position((caption_x, caption_y))
-    layers.append(caption)
+    layers.append(profile_layer(caption, scene, "caption"))
 
     # ── 答えパネル（answer_show_start以降） ──
-    ans_panel = make_answer_panel(q_data, duration=scene_duration - answer_show_start)
+    ans_panel = make_answer_panel(q_data, duration=scene_duration - answer_show_start, image=card.panel)
     ans_panel = ans_panel.with_start(answer_show_start)
-    layers.append(ans_panel)
+    layers.append(profile_layer(ans_panel, scene, "answer_panel"))
 
     # ── 合成 ──
-    scene_video = CompositeVideoClip(layers, size=(VIDEO_W, VIDEO_H)).with_duration(scene_duration)
+    # 白背景が不透明なので、整数演算でレイヤーの矩形だけをブレンドする合成を使う
+    scene_video = PlateCompositeClip(layers, size=(VIDEO_W, VIDEO_H)).with_duration(scene_duration)
+    # 子レイヤーを除いた残り＝ブレンドの時間
+    scene_video = profile_layer(scene_video, scene, "blend")
 
     # ── 音声 ──
     audio_layers = [
@@ -707,7 +914,8 @@ def build_question_scene(
     scene_video = scene_video.with_audio(scene_audio)
 
     # qs_clipと問題シーンを結合
-    full_scene = concatenate_videoclips([qs_clip, scene_video], method="compose")
+    qs_clip = profile_layer(qs_clip, scene, "question_video")
+    full_scene = profile_layer(sequence_clips([qs_clip, scene_video]), scene, "concat")
     total_duration = qs_clip.duration + scene_duration
 
     return full_scene, total_duration
@@ -715,7 +923,17 @@ def build_question_scene(
 
 # ── メイン動画構築 ────────────────────────────────────────────────────────
 
-def build_video(job: dict, assets: Path, output_path: Path, test_mode: bool = False):
+def build_video(
+    job: dict,
+    assets: Path,
+    output_path: Path,
+    test_mode: bool = False,
+    encoder_profile: Optional[str] = None,
+    media: Optional[MediaRegistry] = None,
+    s3_output: Optional[str] = None,
+    s3_client=None,
+):
+    started = time.perf_counter()
     random.seed()              # ← シード指定なし→完全ランダム
     questions = job["questions"]
 
@@ -730,79 +948,97 @@ def build_video(job: dict, assets: Path, output_path: Path, test_mode: bool = Fa
         "answer_gap_after_seconds": ANSWER_GAP_SECONDS,
     }
 
-    # VOICEVOX音声を事前生成
-    print("[build_video] VOICEVOX音声生成中...")
-    voice_files = prepare_voice_files(questions, assets)
-
-    # チャプタータイムスタンプ計算用
-    chapters = []
-    opening = safe_video(assets / "opening.mp4", duration=3.0)
-    ending = safe_video(assets / "ending.mp4", duration=3.0)
-    main_bgm = safe_audio(assets / "main_bgm.mp3", duration=600.0, volume=0.3)
-
-    current_time = opening.duration
-    used_backgrounds = set()
-    question_clips = []
-
-    for i, q in enumerate(questions):
-        n = q["question_no"]
-        layout = layouts[i]   # ← 問ごとに切り替え
-        chapters.append({"no": n, "start": current_time, "label": f"第{n}問"})
-        print(f"[build_video] 第{n}問シーン構築中... (layout={layout})")
-
-        clip, duration = build_question_scene(
-            q_data=q,
-            layout=layout,      # ← 動的に渡す
-            assets=assets,
-            used_backgrounds=used_backgrounds,
-            timing=timing,
-            voice_files=voice_files,
-            is_first_question=(i == 0),
-        )
-        question_clips.append(clip)
-        current_time += duration
-
-    # チャプターリスト出力
-    chapters_text = "\n=== YouTubeチャプター ===\n"
-    chapters_text += "0:00 オープニング\n"
-    for c in chapters:
-        m, s = divmod(int(c["start"]), 60)
-        chapters_text += f"{m}:{s:02d} {c['label']}\n"
-    m, s = divmod(int(current_time), 60)
-    chapters_text += f"{m}:{s:02d} エンディング\n"
-    chapters_text += "========================\n"
-    print(chapters_text)
+    # VOICEVOX音声の合成を始めておき、各問のシーン構築で尺が必要になった時点で待つ
+    print("[build_video] VOICEVOX音声の合成を開始...")
+    voice_cache, voice_files = start_voice_synthesis(questions, assets)
+
+    # 素材のリーダーは全問で共有し、書き出し後にまとめて閉じる
+    # （media を渡された場合はバッチレンダーの共有レジストリなので閉じない）
+    with nullcontext(media) if media is not None else MediaRegistry() as media:
+        # チャプタータイムスタンプ計算用
+        chapters = []
+        opening = safe_video(assets / "opening.mp4", duration=3.0, media=media)
+        ending = safe_video(assets / "ending.mp4", duration=3.0, media=media)
+        main_bgm = safe_audio(assets / "main_bgm.mp3", duration=600.0, volume=0.3, media=media)
+
+        current_time = opening.duration
+        used_backgrounds = set()
+        question_clips = []
+
+        try:
+            for i, q in enumerate(questions):
+                n = q["question_no"]
+                layout = layouts[i]   # ← 問ごとに切り替え
+                chapters.append({"no": n, "start": current_time, "label": f"第{n}問"})
+                print(f"[build_video] 第{n}問シーン構築中... (layout={layout})")
+
+                clip, duration = build_question_scene(
+                    q_data=q,
+                    layout=layout,      # ← 動的に渡す
+                    assets=assets,
+                    used_backgrounds=used_backgrounds,
+                    timing=timing,
+                    voice_files=voice_files,
+                    is_first_question=(i == 0),
+                    media=media,
+                )
+                question_clips.append(clip)
+                current_time += duration
+        finally:
+            # 全問の音声は解決済み（合成用のスレッドと接続を片付ける）
+            voice_cache.close()
+
+        # チャプターリスト出力
+        chapters_text = "\n=== YouTubeチャプター ===\n"
+        chapters_text += "0:00 オープニング\n"
+        for c in chapters:
+            m, s = divmod(int(c["start"]), 60)
+            chapters_text += f"{m}:{s:02d} {c['label']}\n"
+        m, s = divmod(int(current_time), 60)
+        chapters_text += f"{m}:{s:02d} エンディング\n"
+        chapters_text += "========================\n"
+        print(chapters_text)
     
-    # チャプター情報をログファイルに保存
-    try:
-        log_file = output_path.with_suffix('.log')
-        with log_file.open('w', encoding='utf-8') as f:
-            f.write(chapters_text)
-        print(f"チャプター情報を保存: {log_file}")
-    except Exception as e:
-        print(f"チャプターログ保存失敗: {e}")
-
-    # 動画結合
-    main_part = concatenate_videoclips(question_clips, method="compose")
-    bgm_loop = loop_audio(main_bgm, main_part.duration)
-
-    if main_part.audio is not None:
-        main_audio = CompositeAudioClip([main_part.audio, bgm_loop])
-    else:
-        main_audio = bgm_loop
-    main_part = main_part.with_audio(main_audio)
-
-    final = concatenate_videoclips([opening, main_part, ending], method="compose")
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    final.write_videofile(
-        str(output_path),
-        fps=FPS,
-        codec="libx264",
-        audio_codec="aac",
-        preset="medium",
-        threads=4,
-    )
+        # チャプター情報をログファイルに保存
+        try:
+            log_file = output_path.with_suffix('.log')
+            with log_file.open('w', encoding='utf-8') as f:
+                f.write(chapters_text)
+            print(f"チャプター情報を保存: {log_file}")
+        except Exception as e:
+            print(f"チャプターログ保存失敗: {e}")
+
+        # 動画結合
+        main_part = sequence_clips(question_clips)
+        bgm_loop = loop_audio(main_bgm, main_part.duration)
+
+        if main_part.audio is not None:
+            main_audio = CompositeAudioClip([main_part.audio, bgm_loop])
+        else:
+            main_audio = bgm_loop
+        main_part = main_part.with_audio(main_audio)
+
+        opening = profile_layer(opening, "opening", "video")
+        ending = profile_layer(ending, "ending", "video")
+        final = sequence_clips([opening, main_part, ending])
+        final = profile_layer(final, "timeline", "concat")
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        encoder = job_encoder_settings(job, FPS, encoder_profile)
+        # s3_output があればエンコード中の出力を output_path に書きつつ S3 へも送る
+        with encoder_output(output_path, s3_output, s3_client) as target:
+            final.write_videofile(
+                str(target),
+                fps=FPS,
+                audio_codec="aac",
+                **(fragmented_settings(encoder) if s3_output else encoder),
+            )
+    if layer_profiler.enabled():
+        layer_profiler.write_report(
+            output_path.with_suffix(".layers.json"),
+            frames=int(final.duration * FPS),
+            wall_seconds=time.perf_counter() - started,
+        )
     print(f"[完了] {output_path}")
 
 
@@ -814,13 +1050,39 @@ def parse_args():
     p.add_argument("--assets", type=Path, required=True, help="アセットディレクトリ")
     p.add_argument("--output", type=Path, default=Path("out/kanji_quiz.mp4"))
     p.add_argument("--test",   action="store_true", help="テストモード: 1問のみ・10秒カウントダウン")
+    p.add_argument("--draft",  action="store_true",
+                   help=f"確認用に {DRAFT_SCALE:g} 倍のキャンバス・{DRAFT_FPS}fps でレンダリング（既定のエンコードは draft）")
+    p.add_argument("--encoder-profile", choices=list(ENCODER_PROFILES), default=None,
+                   help="エンコードプロファイル（省略時はJSONの encoder_profile、なければ upload-balanced）")
+    p.add_argument("--profile-layers", action="store_true",
+                   help="レイヤーごとのフレーム時間を計測し、<output>.layers.json と表を出力する")
+    p.add_argument("--prewarm-cards", action="store_true",
+                   help="レンダリングせず、全問の問題カード（type画像・答えパネル）を <assets>/card_cache に作成する")
+    p.add_argument("--s3-output", default=None,
+                   help="s3://bucket/key: エンコード中の出力（fragmented MP4）を S3 へマルチパートで送る（--output にも書く）")
+    p.add_argument("--s3-endpoint-url", default=None,
+                   help="S3 互換ストレージ（MinIO など）のエンドポイント（省略時は環境変数 S3_ENDPOINT_URL）")
     return p.parse_args()
 
 
 def main():
     args = parse_args()
     job = load_json(args.job)
-    build_video(job, args.assets, args.output, test_mode=args.test)
+    encoder_profile = args.encoder_profile
+    if args.profile_layers:
+        layer_profiler.enable()
+    if args.draft:
+        configure_draft()
+        encoder_profile = encoder_profile or "draft"
+    if args.prewarm_cards:
+        n = prewarm_cards(job, args.assets)
+        print(f"[card_cache] {n} 問のカードを用意しました: {args.assets / 'card_cache'}")
+        return
+    build_video(
+        job, args.assets, args.output, test_mode=args.test, encoder_profile=encoder_profile,
+        s3_output=args.s3_output,
+        s3_client=make_client(args.s3_endpoint_url) if args.s3_output else None,
+    )
 
 
 if __name__ == "__main__":
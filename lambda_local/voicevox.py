@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+VOICEVOX 音声合成クライアントと、内容ハッシュで引く音声キャッシュ
+
+キャッシュのファイル名は <hash(text, speaker)>_<hash(engine version)>.wav。
+同じ読み上げ文はジョブ・問番号が違っても同じファイルを使い、文が変われば別の
+ファイルになる。エンジンのバージョンが上がったら作り直す。エンジンに繋がらない
+ときは、バージョンに関係なく同じ文の最新のファイルを使う。
+
+足りない音声はスレッドプールで並列に合成する。HTTP 接続はスレッドごとに
+1本張って使い回す（keep-alive）。VOICEVOX_URL を差し替えれば偽サーバー
+（tests/fake_voicevox.py）でも試せる。
+"""
+import hashlib
+import http.client
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import quote, urlsplit
+
+VOICEVOX_URL = os.environ.get("VOICEVOX_URL", "http://localhost:50021")
+VOICEVOX_SPEAKER = int(os.environ.get("VOICEVOX_SPEAKER", "1"))
+VOICEVOX_WORKERS = int(os.environ.get("VOICEVOX_WORKERS", "4"))
+# 起動時のバージョン確認は短く切る（応答しないホストでレンダー開始を待たせない）
+VERSION_TIMEOUT = 3.0
+
+# 切れた keep-alive 接続で失敗したときは1回だけ張り直して送り直す
+_RETRYABLE = (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError)
+# 合成できなかったとして無音にする例外（IncompleteRead など OSError でない HTTP の異常も含む）
+_FAILURES = (OSError, http.client.HTTPException)
+
+
+class VoicevoxError(RuntimeError):
+    pass
+
+
+class VoicevoxClient:
+    """VOICEVOX エンジンの HTTP API。接続はスレッドごとに張って使い回す。"""
+
+    def __init__(self, base_url: str = VOICEVOX_URL, timeout: float = 30.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.https = parts.scheme == "https"
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conns: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _connection(self, fresh: bool = False) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and fresh:
+            conn.close()
+            conn = None
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = cls(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _request(self, method: str, path: str, body: Optional[bytes] = None,
+                 headers: Optional[dict] = None, timeout: Optional[float] = None) -> bytes:
+        for attempt in range(2):
+            conn = self._connection(fresh=attempt > 0)
+            conn.timeout = timeout or self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                data = resp.read()
+            except _RETRYABLE:
+                if attempt:
+                    raise
+                continue
+            if resp.status != 200:
+                raise VoicevoxError(f"{method} {path}: HTTP {resp.status} {data[:200]!r}")
+            return data
+        raise AssertionError("unreachable")
+
+    def version(self) -> Optional[str]:
+        """エンジンのバージョン。繋がらなければ None。"""
+        try:
+            return json.loads(self._request("GET", "/version", timeout=VERSION_TIMEOUT))
+        except (*_FAILURES, VoicevoxError, ValueError) as e:
+            print(f"[VOICEVOX] エンジンに接続できません: {e}")
+            return None
+
+    def synthesize(self, text: str, speaker: int = VOICEVOX_SPEAKER) -> bytes:
+        """audio_query -> synthesis の2回の呼び出しで WAV を返す。"""
+        query = self._request("POST", f"/audio_query?text={quote(text)}&speaker={speaker}")
+        return self._request(
+            "POST", f"/synthesis?speaker={speaker}", body=query, headers={"Content-Type": "application/json"}
+        )
+
+    def close(self):
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def text_key(text: str, speaker: int) -> str:
+    return _digest([text, speaker])[:16]
+
+
+class VoiceCache:
+    """
+    読み上げ文 -> WAV のキャッシュ。submit() は Future[Optional[Path]] を返し、
+    キャッシュにない文はスレッドプールで合成する（同じ文の合成は1回にまとめる）。
+    合成できなかった文は None（呼び出し側でサイレントにする）。
+    """
+
+    def __init__(self, cache_dir: Path, client: Optional[VoicevoxClient] = None,
+                 speaker: int = VOICEVOX_SPEAKER, workers: int = VOICEVOX_WORKERS):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.client = client or VoicevoxClient()
+        self.speaker = speaker
+        self.engine_version = self.client.version()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="voicevox")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, text: str) -> Optional[Path]:
+        """現在のエンジンで合成した場合のキャッシュパス（エンジンに繋がらなければ None）。"""
+        if self.engine_version is None:
+            return None
+        return self.cache_dir / f"{text_key(text, self.speaker)}_{_digest(self.engine_version)[:8]}.wav"
+
+    def lookup(self, text: str) -> Optional[Path]:
+        path = self.path_for(text)
+        if path is not None:
+            return path if path.exists() else None
+        # エンジンなし: どのバージョンで作ったものでもよいので最新を使う
+        found = sorted(self.cache_dir.glob(f"{text_key(text, self.speaker)}_*.wav"), key=lambda p: p.stat().st_mtime)
+        return found[-1] if found else None
+
+    def _synthesize(self, text: str, path: Path) -> Optional[Path]:
+        try:
+            wav = self.client.synthesize(text, self.speaker)
+        except (*_FAILURES, VoicevoxError) as e:
+            print(f"[VOICEVOX] 失敗: {e}")
+            return None
+        tmp_path = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(wav)
+        os.replace(tmp_path, path)
+        return path
+
+    def submit(self, text: str) -> "Future[Optional[Path]]":
+        with self._lock:
+            future = self._pending.get(text)
+            if future is not None:
+                return future
+            cached = self.lookup(text)
+            if cached is not None or self.engine_version is None:
+                future = Future()
+                future.set_result(cached)
+            else:
+                future = self._pool.submit(self._synthesize, text, self.path_for(text))
+            self._pending[text] = future
+            return future
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self.client.close()
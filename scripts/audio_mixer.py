@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+タイムライン全体の音声を NumPy で一括ミックスする
+
+CompositeAudioClip の入れ子（問ごとの合成 → BGM付きの本編 → 最終連結）は、
+書き出し時にチャンクごとに Python のコールバックを辿って評価される。
+ここでは全キューを「素材・開始時刻・音量・長さ」のフラットなスケジュールに解決し、
+素材ごとに1回だけ PCM にデコードして1本のバッファへサンプル単位で足し込む。
+結果は WAV に書き出し、エンコーダーが映像と一緒に mux する。
+"""
+import os
+import subprocess
+import wave
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+from common_render import probe_media
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+# デコード済み PCM を同一プロセス内に残しておく素材数（ステレオ 44.1kHz で1分あたり約 21MB）
+PCM_CACHE_SIZE = int(os.environ.get("PCM_CACHE_SIZE", "32"))
+
+
+@dataclass
+class AudioCue:
+    path: Path
+    start: float                      # 秒（所属する区間の先頭から）
+    volume: float = 1.0
+    duration: Optional[float] = None  # None なら素材の長さ
+    loop: bool = False                # duration まで素材を繰り返す
+
+
+@lru_cache(maxsize=PCM_CACHE_SIZE)
+def _decode_pcm(path: str, size: int, mtime_ns: int) -> np.ndarray:
+    cmd = [
+        FFMPEG_BINARY, "-v", "error", "-i", path, "-vn",
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE), "-",
+    ]
+    raw = subprocess.run(cmd, check=True, capture_output=True).stdout
+    pcm = np.frombuffer(raw, dtype=np.int16).reshape(-1, CHANNELS).astype(np.float32) / 32768.0
+    pcm.setflags(write=False)
+    return pcm
+
+
+def decode_pcm(path: Path) -> np.ndarray:
+    """
+    音声トラックを (サンプル数, 2) の float32 [-1, 1] にデコードする。
+    同一プロセス内ではパス・サイズ・mtime で引いてキャッシュする（差し替えた素材は読み直す）。
+    """
+    st = path.stat()
+    return _decode_pcm(str(path.resolve()), st.st_size, st.st_mtime_ns)
+
+
+def audio_duration(path: Path, fallback: float) -> float:
+    """
+    タイミング計算用の尺（AudioFileClip.duration と同じくコンテナ上の尺）。素材がなければ fallback。
+    mp3 はデコード後のサンプル数の方がエンコーダー遅延の分だけ短いが、キューの配置は従来の尺で行う。
+    """
+    if not path.exists():
+        return fallback
+    return probe_media(path)["duration"]
+
+
+def place_cues(cues: List[AudioCue], offset: float, limit: float) -> List[AudioCue]:
+    """
+    区間内の相対時刻で作ったキューを offset だけずらし、区間の長さ limit で切る。
+    （moviepy で区間クリップに音声を付けたときと同様、区間外にはみ出た分は鳴らさない）
+    """
+    placed = []
+    for cue in cues:
+        room = limit - cue.start
+        if room <= 0:
+            continue
+        duration = room if cue.duration is None else min(cue.duration, room)
+        placed.append(replace(cue, start=cue.start + offset, duration=duration))
+    return placed
+
+
+def mix_cues(cues: List[AudioCue], duration: float) -> np.ndarray:
+    """全キューを (サンプル数, 2) の float32 バッファに足し込む。素材のないキューは無音扱い。"""
+    total = int(round(duration * SAMPLE_RATE))
+    out = np.zeros((total, CHANNELS), dtype=np.float32)
+    for cue in cues:
+        if not cue.path.exists():
+            continue
+        pcm = decode_pcm(cue.path)
+        if len(pcm) == 0:
+            continue
+        start = int(round(cue.start * SAMPLE_RATE))
+        length = len(pcm) if cue.duration is None else int(round(cue.duration * SAMPLE_RATE))
+        if not cue.loop:
+            length = min(length, len(pcm))
+        length = min(length, total - start)
+        if length <= 0:
+            continue
+        # np.resize はデータを先頭から繰り返して埋めるので、そのままループになる
+        src = np.resize(pcm, (length, CHANNELS)) if length > len(pcm) else pcm[:length]
+        if cue.volume == 1.0:
+            out[start:start + length] += src
+        else:
+            out[start:start + length] += src * np.float32(cue.volume)
+    np.clip(out, -1.0, 1.0, out=out)
+    return out
+
+
+def write_wav(samples: np.ndarray, path: Path) -> Path:
+    pcm = np.round(samples * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(CHANNELS)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+    return path
+
+
+def render_mix(cues: List[AudioCue], duration: float, path: Path) -> Path:
+    """cues をミックスして path に 16bit PCM WAV で書き出す。"""
+    return write_wav(mix_cues(cues, duration), path)
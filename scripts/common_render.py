@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+間違い探し / 漢字クイズ両レンダラーで共有するキャッシュ・ヘルパー
+
+render_spot_diff_video.py は同じディレクトリから、
+lambda_local/render_kanji_video.py は scripts/ を sys.path に追加して import する。
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from moviepy import AudioFileClip, VideoClip, VideoFileClip
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from moviepy.video.fx.MaskColor import MaskColor
+
+# キャッシュ形式を変えたら上げる（古いキャッシュは自然に使われなくなる）
+CHROMA_CACHE_VERSION = 1
+
+# 背景ループ用リングをメモリに置く上限（MediaRegistry 全体の合計）。超える背景のリングは
+# 一時ファイルの memmap に置く（どちらでもデコードは1周目の1回だけ）
+BG_RING_MAX_BYTES = int(os.environ.get("BG_RING_MAX_MB", "1024")) * 1024 * 1024
+
+# バッチ / サービスのワーカーでジョブの合間に残しておくリーダー数（種類ごと）
+MEDIA_KEEP_READERS = int(os.environ.get("MEDIA_KEEP_READERS", "16"))
+
+_DIGESTS: Dict[Tuple[str, int, int], str] = {}
+_PROBES: Dict[Tuple[str, int, int], dict] = {}
+_KEYED_FRAMES: Dict[Path, np.ndarray] = {}
+
+
+def file_digest(path: Path) -> str:
+    """ファイル内容のsha256。同一プロセス内ではパス・サイズ・mtimeでメモ化する。"""
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    digest = _DIGESTS.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _DIGESTS[memo_key] = digest
+    return digest
+
+
+def probe_media(path: Path) -> dict:
+    """
+    デコードせずに尺・解像度・fps・音声有無だけを読む。同一プロセス内ではメモ化する。
+
+    映像のある素材の尺は FFMPEG_VideoReader（VideoFileClip.duration）と同じ video_duration を使う。
+    """
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    info = _PROBES.get(memo_key)
+    if info is None:
+        infos = ffmpeg_parse_infos(str(path))
+        duration = infos.get("video_duration") if infos.get("video_found") else infos.get("duration")
+        info = {
+            "duration": float(duration or 0.0),
+            "size": infos.get("video_size") if infos.get("video_found") else None,
+            "fps": infos.get("video_fps") if infos.get("video_found") else None,
+            "has_audio": bool(infos.get("audio_found")),
+        }
+        _PROBES[memo_key] = info
+    return info
+
+
+# ── エンコードプロファイル ────────────────────────────────────────────────
+# 品質は crf（または bitrate）、GOP は秒数で指定する。threads を省略すると
+# RENDER_ENCODER_THREADS（複数ワーカーで並べるときにサービス側が設定する）、なければホストのコア数。
+# 速度・サイズの実測は benchmarks/encoder_profiles.py で取る。
+ENCODER_PROFILES: Dict[str, dict] = {
+    "draft": {"preset": "ultrafast", "crf": 32, "gop_seconds": 10},
+    "ci-fast": {"preset": "veryfast", "crf": 28, "gop_seconds": 10},
+    "upload-balanced": {"preset": "medium", "crf": 23, "gop_seconds": 2},
+    "archive": {"preset": "slow", "crf": 16, "tune": "animation", "gop_seconds": 10},
+}
+DEFAULT_ENCODER_PROFILE = "upload-balanced"
+
+
+def encoder_settings(profile: str, fps: float, overrides: Optional[dict] = None) -> dict:
+    """
+    write_videofile / FFMPEG_VideoWriter にそのまま ** で渡せる libx264 の設定を返す。
+    overrides でプロファイルの項目（tune, crf, bitrate, threads など）を上書きできる。
+    """
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"unknown encoder profile: {profile} (choices: {', '.join(ENCODER_PROFILES)})")
+    spec = {**ENCODER_PROFILES[profile], **(overrides or {})}
+
+    params: List[str] = []
+    if spec.get("bitrate"):
+        params += ["-b:v", str(spec["bitrate"])]
+    elif spec.get("crf") is not None:
+        params += ["-crf", str(spec["crf"])]
+    if spec.get("tune"):
+        params += ["-tune", spec["tune"]]
+    if spec.get("gop_seconds"):
+        params += ["-g", str(max(1, int(round(spec["gop_seconds"] * fps))))]
+    return {
+        "codec": "libx264",
+        "preset": spec["preset"],
+        "threads": int(spec.get("threads") or os.environ.get("RENDER_ENCODER_THREADS") or os.cpu_count() or 4),
+        "ffmpeg_params": params,
+    }
+
+
+def job_encoder_settings(job: dict, fps: float, profile: Optional[str] = None) -> dict:
+    """
+    プロファイルは CLI 指定 > ジョブJSONの "encoder_profile" > 既定 の順で決める。
+    ジョブJSONの "encoder_overrides"（例: {"tune": "stillimage"}）も反映する。
+    """
+    name = profile or job.get("encoder_profile") or DEFAULT_ENCODER_PROFILE
+    settings = encoder_settings(name, fps, job.get("encoder_overrides"))
+    print(f"[encoder] profile={name} preset={settings['preset']} threads={settings['threads']} "
+          f"params={' '.join(settings['ffmpeg_params'])}")
+    return settings
+
+
+def encoder_cli_args(settings: dict) -> List[str]:
+    """encoder_settings の結果を ffmpeg コマンドラインの映像エンコード引数に変換する。"""
+    return [
+        "-c:v", settings["codec"],
+        "-preset", settings["preset"],
+        "-threads", str(settings["threads"]),
+        *settings["ffmpeg_params"],
+    ]
+
+
+# ── メディアリーダーの共有 ────────────────────────────────────────────────
+
+class MediaRegistry:
+    """
+    1回のレンダーで使うメディアファイルのリーダーを共有する。
+
+    問ごとに VideoFileClip / AudioFileClip を作り直すと、そのたびに ffmpeg の
+    起動と probe が走る。ファイルごとに1度だけ開いて保持し、呼び出し側には
+    リーダーを共有する時刻シフト済みのビュー（with_start のコピー）を渡す。
+    リーダーはパス・サイズ・mtime で引くので、同じパスの素材が差し替われば別のリーダーになる。
+    close()（または with ブロックの終了）で全リーダーをまとめて閉じる。
+    ジョブをまたいで使う場合は、ジョブの合間に trim() で古いリーダーを閉じる。
+    """
+
+    def __init__(self):
+        self._videos: "OrderedDict[tuple, VideoFileClip]" = OrderedDict()
+        self._audios: "OrderedDict[tuple, AudioFileClip]" = OrderedDict()
+        # 背景ループのリング（video のキーごと）と、メモリに置いたリングの合計バイト数
+        self._rings: Dict[tuple, "FrameRing"] = {}
+        self._ring_bytes = 0
+        self._ring_dir: Optional[Path] = None
+        self._ring_seq = 0
+
+    @staticmethod
+    def _file_key(path: Path) -> Tuple[Path, int, int]:
+        st = path.stat()
+        return (path.resolve(), st.st_size, st.st_mtime_ns)
+
+    def video(
+        self, path: Path, start: float = 0.0, size: Optional[Tuple[int, int]] = None
+    ) -> Optional[VideoFileClip]:
+        """
+        path がなければ None。size を渡すと ffmpeg 側でその解像度に縮小してデコードする
+        （サイズごとに別のリーダーになる）。
+        """
+        if not path.exists():
+            return None
+        key = (*self._file_key(path), size)
+        clip = self._videos.get(key)
+        if clip is None:
+            clip = VideoFileClip(str(path), target_resolution=size)
+            self._videos[key] = clip
+        self._videos.move_to_end(key)
+        return clip.with_start(start)
+
+    def looping_video(self, path: Path, duration: float, size: Tuple[int, int]):
+        """
+        path を ffmpeg 側で size に縮小してデコードし、duration までループさせる（looping_clip）。
+        リングはリーダーごとに1つで、同じ背景を使う問・ジョブの間で共有する。
+        メモリ上のリングの合計が BG_RING_MAX_BYTES を超える背景は、一時ファイルの memmap に置く。
+        """
+        clip = self.video(path, size=size)
+        key = (*self._file_key(path), size)
+        ring = self._rings.get(key)
+        if ring is None and clip.fps and clip.duration < duration:
+            shape = (loop_frame_count(clip), size[1], size[0])
+            if self._ring_bytes + FrameRing.nbytes_for(*shape) <= BG_RING_MAX_BYTES:
+                ring = FrameRing(*shape)
+                self._ring_bytes += ring.nbytes
+            else:
+                if self._ring_dir is None:
+                    self._ring_dir = Path(tempfile.mkdtemp(prefix="bg_ring_"))
+                self._ring_seq += 1
+                ring = FrameRing(*shape, spill=self._ring_dir / f"{path.stem}_{self._ring_seq}.npy")
+                print(f"[bg_ring] {path.name}: {ring.nbytes / 1e6:.0f} MB のリングを一時ファイルに置きます")
+            self._rings[key] = ring
+        return looping_clip(clip, duration, size, ring=ring)
+
+    def audio(self, path: Path, start: float = 0.0) -> Optional[AudioFileClip]:
+        """path がなければ None。"""
+        if not path.exists():
+            return None
+        key = self._file_key(path)
+        clip = self._audios.get(key)
+        if clip is None:
+            clip = AudioFileClip(str(path))
+            self._audios[key] = clip
+        self._audios.move_to_end(key)
+        return clip.with_start(start)
+
+    def _evict(self, key: tuple, readers: "OrderedDict[tuple, object]"):
+        readers.pop(key).close()
+        ring = self._rings.pop(key, None)
+        if ring is not None:
+            if ring.spill is None:
+                self._ring_bytes -= ring.nbytes
+            ring.release()
+
+    def trim(self, keep: int = MEDIA_KEEP_READERS):
+        """
+        ジョブの合間に呼ぶ。差し替え・削除された素材のリーダーと、最近使っていない順に
+        keep 個を超えた分のリーダーを閉じる（ジョブの途中で呼ぶと使用中のリーダーも閉じうる）。
+        """
+        for readers in (self._videos, self._audios):
+            for key in list(readers):
+                path, size, mtime_ns = key[:3]
+                try:
+                    stale = self._file_key(path)[1:] != (size, mtime_ns)
+                except FileNotFoundError:
+                    stale = True
+                if stale:
+                    self._evict(key, readers)
+            while len(readers) > keep:
+                self._evict(next(iter(readers)), readers)
+
+    def close(self):
+        for clip in [*self._videos.values(), *self._audios.values()]:
+            clip.close()
+        self._videos.clear()
+        self._audios.clear()
+        for ring in self._rings.values():
+            ring.release()
+        self._rings.clear()
+        self._ring_bytes = 0
+        if self._ring_dir is not None:
+            shutil.rmtree(self._ring_dir, ignore_errors=True)
+            self._ring_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def apply_chroma_key(clip, key_color, threshold: float = 90, stiffness: float = 6):
+    return clip.with_effects(
+        [MaskColor(color=key_color, threshold=threshold, stiffness=stiffness)]
+    )
+
+
+# ── クロマキー済みオーバーレイのキャッシュ ────────────────────────────────
+
+def _resize_overlay(clip, size: Optional[Tuple[int, int]], height: Optional[int]):
+    if size is not None:
+        return clip.resized(size)
+    if height is not None:
+        return clip.resized(height=height)
+    return clip
+
+
+def _build_keyed_frames(keyed, n_frames: int, fps: float, out_path: Path):
+    """MaskColor適用済みクリップを1回だけ走査し、RGBA uint8 の .npy に書き出す。"""
+    w, h = keyed.size
+    tmp_path = out_path.with_name(out_path.stem + f".{os.getpid()}.tmp.npy")
+    frames = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(n_frames, h, w, 4))
+    for i in range(n_frames):
+        t = i / fps
+        frames[i, :, :, :3] = keyed.get_frame(t)
+        frames[i, :, :, 3] = (keyed.mask.get_frame(t) * 255).astype("uint8")
+    frames.flush()
+    del frames
+    os.replace(tmp_path, out_path)
+
+
+def prekeyed_overlay(
+    clip,
+    source: Path,
+    cache_dir: Path,
+    key_color: Tuple[int, int, int],
+    threshold: float = 90,
+    stiffness: float = 6,
+    size: Optional[Tuple[int, int]] = None,
+    height: Optional[int] = None,
+):
+    """
+    リサイズ + クロマキーを事前計算済みのオーバーレイクリップを返す。
+
+    キャッシュは素材ハッシュ・キー色・threshold・stiffness・出力サイズで識別し、
+    cache_dir に RGBA フレーム列 (.npy) として保存する。2回目以降はmemmapで
+    読み出すだけなので、フレームごとのリサイズや MaskColor 計算は発生しない。
+    素材がない場合（ColorClipのフォールバック）は従来通り実行時にキーイングする。
+    """
+    resized = _resize_overlay(clip, size, height)
+    if not source.exists() or not getattr(clip, "fps", None):
+        return apply_chroma_key(resized, key_color, threshold=threshold, stiffness=stiffness)
+
+    fps = float(clip.fps)
+    duration = float(clip.duration)
+    n_frames = max(1, int(round(duration * fps)))
+    w, h = resized.size
+    key = hashlib.sha256(
+        json.dumps(
+            {
+                "version": CHROMA_CACHE_VERSION,
+                "asset": file_digest(source),
+                "key_color": list(key_color),
+                "threshold": float(threshold),
+                "stiffness": float(stiffness),
+                "size": [w, h],
+                "fps": fps,
+                "frames": n_frames,
+            },
+            sort_keys=True,
+        ).encode("utf-8")
+    ).hexdigest()[:24]
+    cache_path = cache_dir / f"{source.stem}_{w}x{h}_{key}.npy"
+
+    frames = _KEYED_FRAMES.get(cache_path)
+    if frames is None:
+        if not cache_path.exists():
+            print(f"[chroma_cache] {source.name}: キーイング結果を作成 -> {cache_path}")
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            keyed = apply_chroma_key(resized, key_color, threshold=threshold, stiffness=stiffness)
+            _build_keyed_frames(keyed, n_frames, fps, cache_path)
+        frames = np.load(cache_path, mmap_mode="r")
+        _KEYED_FRAMES[cache_path] = frames
+
+    last = len(frames) - 1
+
+    def index(t: float) -> int:
+        return min(max(0, int(t * fps + 1e-6)), last)
+
+    def make_frame(t: float):
+        return frames[index(t), :, :, :3]
+
+    def make_mask(t: float):
+        return frames[index(t), :, :, 3] / 255.0
+
+    # 合成（compositor.blend_clip）はキャッシュの 8bit アルファ面をそのまま使う
+    make_mask.alpha8 = lambda t: frames[index(t), :, :, 3]
+
+    mask = VideoClip(frame_function=make_mask, is_mask=True, duration=duration).with_fps(fps)
+    return VideoClip(frame_function=make_frame, duration=duration).with_fps(fps).with_mask(mask)
+
+
+# ── 背景動画ループ ────────────────────────────────────────────────────────
+
+def loop_frame_count(clip) -> int:
+    """looping_clip がループ1周に使うフレーム数（リングの長さ）。"""
+    return max(1, int(clip.duration * clip.fps))
+
+
+class FrameRing:
+    """
+    ループ1周分の RGB フレーム（n_frames, h, w, 3）。get() で初めて要求されたフレームだけ
+    デコードして保持する。spill を渡すとメモリではなくそのパスの memmap に置く。
+    """
+
+    def __init__(self, n_frames: int, h: int, w: int, spill: Optional[Path] = None):
+        shape = (n_frames, h, w, 3)
+        self.spill = spill
+        if spill is None:
+            self.frames = np.empty(shape, dtype=np.uint8)
+        else:
+            self.frames = np.lib.format.open_memmap(spill, mode="w+", dtype=np.uint8, shape=shape)
+        self.filled = np.zeros(n_frames, dtype=bool)
+        self.nbytes = self.nbytes_for(n_frames, h, w)
+
+    @staticmethod
+    def nbytes_for(n_frames: int, h: int, w: int) -> int:
+        return n_frames * h * w * 3
+
+    def __len__(self) -> int:
+        return len(self.filled)
+
+    def get(self, i: int, decode) -> np.ndarray:
+        if not self.filled[i]:
+            self.frames[i] = decode(i)
+            self.filled[i] = True
+        frame = self.frames[i]
+        frame.flags.writeable = False
+        return frame
+
+    def release(self):
+        self.frames = None
+        if self.spill is not None:
+            self.spill.unlink(missing_ok=True)
+
+
+def looping_clip(clip, duration: float, size: Tuple[int, int], ring: Optional[FrameRing] = None):
+    """
+    clip を size にして、t mod 元尺 で duration までループさせる。
+
+    concatenate_videoclips でループを連結するとループ境界ごとにリーダーが
+    先頭へシークし直すため、1本のデコーダーだけを使う。clip が既に size で
+    デコードされていれば（MediaRegistry.video(size=...)）Python 側ではリサイズしない。
+    ring（loop_frame_count 枚の FrameRing）を渡すと1周目のフレームをそこに保持し、
+    2周目以降は再デコードしない（MediaRegistry.looping_video が割り当てる）。
+    """
+    clip = clip.without_audio()
+    resized = clip if tuple(clip.size) == tuple(size) else clip.resized(size)
+    fps = getattr(clip, "fps", None)
+    src_duration = resized.duration
+    if not fps or not src_duration:
+        # ColorClip等の静止フォールバック
+        return resized.with_duration(duration)
+    if src_duration >= duration:
+        return resized.subclipped(0, duration)
+
+    n_frames = loop_frame_count(resized)
+    if ring is not None and len(ring) != n_frames:
+        raise ValueError(f"ring must have {n_frames} slots, got {len(ring)}")
+
+    def decode(i: int):
+        return resized.get_frame(i / fps)
+
+    def make_frame(t: float):
+        i = min(int((t % src_duration) * fps + 1e-6), n_frames - 1)
+        if ring is None:
+            return decode(i)
+        return ring.get(i, decode)
+
+    return VideoClip(frame_function=make_frame, duration=duration).with_fps(fps)
+
+
+# ── セグメント結合 ────────────────────────────────────────────────────────
+
+def concat_segments(
+    segment_paths: List[Path],
+    output_path: Path,
+    audio_path: Optional[Path] = None,
+    audio_codec: str = "aac",
+    movflags: str = "+faststart",
+):
+    """
+    同一エンコード設定のセグメントを ffmpeg の concat demuxer で再エンコードなしに結合する。
+    audio_path を渡すと全尺の音声トラックとしてmuxする。
+    シークできない出力先（S3 へ流す FIFO）には movflags に fragmented MP4 の指定を渡す。
+    """
+    list_path = output_path.with_name(output_path.stem + ".concat.txt")
+    list_path.write_text(
+        "".join(f"file '{p.resolve().as_posix()}'\n" for p in segment_paths), encoding="utf-8"
+    )
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", str(list_path)]
+    if audio_path is not None:
+        cmd += ["-i", str(audio_path), "-map", "0:v:0", "-map", "1:a:0", "-c:a", audio_codec]
+    cmd += ["-c:v", "copy", "-movflags", movflags, str(output_path)]
+    try:
+        subprocess.run(cmd, check=True)
+    finally:
+        list_path.unlink(missing_ok=True)
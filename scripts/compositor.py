@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+シーン合成用の CompositeVideoClip 置き換え
+
+問題シーンの大半は「背景動画 + 静止した左右画像・タイトル」で、毎フレーム変化する
+のは背景とカウントダウン系だけ。静止しているレイヤーの連続区間を1枚の
+premultiplied な「プレート」に平坦化しておき、フレームごとには
+プレートを1回ブレンドするだけにする。
+
+ブレンドはすべて uint8 / uint16 の整数演算で、各レイヤーが画面に重なる矩形の中だけを
+プロセスごとに1枚確保した出力フレームへ直接書き込む。作業用バッファも使い回すので、
+フレームごと・レイヤーごとに画面サイズの配列を確保しない。
+"""
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from moviepy import CompositeVideoClip, ImageClip, VideoClip
+from moviepy.tools import compute_position
+from PIL import Image
+
+# (用途, 幅, 高さ) -> 出力フレーム。プロセス（ワーカー）ごとに1枚ずつ
+_OUTPUT_FRAMES: Dict[Tuple[str, int, int], np.ndarray] = {}
+# (用途, dtype) -> 作業用のフラットなバッファ。必要になった最大サイズまで伸ばして使い回す
+_SCRATCH: Dict[Tuple[str, str], np.ndarray] = {}
+
+
+def output_frame(size: Tuple[int, int], slot: str = "scene") -> np.ndarray:
+    """size (w, h) の出力フレーム。返した配列は次のフレームの合成で上書きされる。"""
+    w, h = size
+    key = (slot, w, h)
+    frame = _OUTPUT_FRAMES.get(key)
+    if frame is None:
+        frame = np.zeros((h, w, 3), dtype=np.uint8)
+        _OUTPUT_FRAMES[key] = frame
+    return frame
+
+
+def _scratch(name: str, shape: Tuple[int, ...], dtype) -> np.ndarray:
+    n = int(np.prod(shape))
+    key = (name, np.dtype(dtype).str)
+    buf = _SCRATCH.get(key)
+    if buf is None or buf.size < n:
+        buf = np.empty(n, dtype=dtype)
+        _SCRATCH[key] = buf
+    return buf[:n].reshape(shape)
+
+
+def _overlap(x: int, y: int, w: int, h: int, frame: np.ndarray):
+    """(x, y) に置いた w x h の矩形と frame の重なり。(画面側スライス, 素材側スライス) か None。"""
+    fh, fw = frame.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, fw), min(y + h, fh)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (slice(y0, y1), slice(x0, x1)), (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+
+
+def paste(frame: np.ndarray, rgb: np.ndarray, x: int, y: int):
+    """不透明な rgb を frame の (x, y) にコピーする。"""
+    hit = _overlap(x, y, rgb.shape[1], rgb.shape[0], frame)
+    if hit is not None:
+        dst, src = hit
+        frame[dst] = rgb[src][:, :, :3]
+
+
+def blend_alpha(frame: np.ndarray, rgb: np.ndarray, alpha: np.ndarray, x: int, y: int):
+    """
+    straight alpha の rgb を frame の (x, y) に重ねる。
+    out = (bg * (255 - a) + rgb * a + 127) // 255 を重なり矩形の中だけ uint16 で計算する。
+    """
+    hit = _overlap(x, y, rgb.shape[1], rgb.shape[0], frame)
+    if hit is None:
+        return
+    dst, src = hit
+    region = frame[dst]
+    h, w = region.shape[:2]
+    a = _scratch("alpha", (h, w, 1), np.uint16)
+    acc = _scratch("acc", (h, w, 3), np.uint16)
+    tmp = _scratch("tmp", (h, w, 3), np.uint16)
+    a[:, :, 0] = alpha[src]
+    np.multiply(rgb[src][:, :, :3], a, out=acc)
+    np.subtract(255, a, out=a)
+    np.multiply(region, a, out=tmp)
+    acc += tmp
+    acc += 127
+    acc //= 255
+    np.copyto(region, acc, casting="unsafe")
+
+
+def mark_static(clip, after: float = 0.0):
+    """clip の開始 after 秒以降はフレームも位置も変化しないことを宣言する。"""
+    clip.static_after = after
+    return clip
+
+
+def is_static_at(clip, t: float) -> bool:
+    after = getattr(clip, "static_after", None)
+    return after is not None and t - clip.start >= after
+
+
+class Plate:
+    """静止画を premultiplied で保持する（不透明部分の外接矩形のみ）。"""
+
+    def __init__(self, rgba: np.ndarray):
+        alpha = rgba[:, :, 3]
+        rows = np.flatnonzero(alpha.any(axis=1))
+        cols = np.flatnonzero(alpha.any(axis=0))
+        if len(rows) == 0:
+            self.box = None
+            return
+        y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        self.box = (y0, y1, x0, x1)
+        a = alpha[y0:y1, x0:x1].astype(np.uint16)[:, :, None]
+        # out = (bg * (255 - a) + rgb * a + 127) // 255 を uint16 に収まる形で前計算しておく
+        self.premul = rgba[y0:y1, x0:x1, :3].astype(np.uint16) * a + 127
+        self.inv_alpha = 255 - a
+
+    def blend_onto(self, frame: np.ndarray, x: int = 0, y: int = 0):
+        """frame (H, W, 3, uint8, 書き込み可) の (x, y) にプレートを上書き合成する。"""
+        if self.box is None:
+            return
+        y0, y1, x0, x1 = self.box
+        hit = _overlap(x + x0, y + y0, x1 - x0, y1 - y0, frame)
+        if hit is None:
+            return
+        dst, src = hit
+        region = frame[dst]
+        acc = _scratch("acc", region.shape, np.uint16)
+        np.multiply(region, self.inv_alpha[src], out=acc)
+        acc += self.premul[src]
+        acc //= 255
+        np.copyto(region, acc, casting="unsafe")
+
+
+def _static_plate(clip, rgb: np.ndarray, mask: Optional[np.ndarray]) -> Plate:
+    """ImageClip のフレーム・マスクは不変なので、premultiplied にした結果をクリップに覚えておく。"""
+    cached = clip.__dict__.get("_plate")
+    if cached is not None and cached[0] is rgb and cached[1] is mask:
+        return cached[2]
+    alpha = (mask * 255).astype(np.uint8) if mask is not None else rgb[:, :, 3]
+    plate = Plate(np.dstack([rgb[:, :, :3], alpha]))
+    clip._plate = (rgb, mask, plate)
+    return plate
+
+
+def _mask_alpha8(clip):
+    """
+    マスクの frame_function に添えられた 8bit アルファ面の関数（なければ None）。
+    時間変換などで frame_function が差し替わると外れ、通常のマスク経路に戻る。
+    """
+    if clip.mask is None:
+        return None
+    return getattr(clip.mask.frame_function, "alpha8", None)
+
+
+def blend_clip(frame: np.ndarray, clip, t: float):
+    """clip の時刻 t のフレームを frame に重ねる（VideoClip.compose_on の整数演算版）。"""
+    ct = t - clip.start
+    rgb = clip.get_frame(ct)
+    alpha8 = _mask_alpha8(clip)
+    alpha = alpha8(ct) if alpha8 is not None else None
+    mask = clip.mask.get_frame(ct) if clip.mask is not None and alpha is None else None
+    h, w = rgb.shape[:2]
+    x, y = compute_position((w, h), (frame.shape[1], frame.shape[0]), clip.pos(ct), clip.relative_pos)
+
+    if alpha is not None:
+        blend_alpha(frame, rgb, alpha, x, y)
+        return
+    if mask is None and rgb.shape[2] == 3:
+        paste(frame, rgb, x, y)
+        return
+    if isinstance(clip, ImageClip) and (mask is None or mask.shape == (h, w)):
+        _static_plate(clip, rgb, mask).blend_onto(frame, x, y)
+        return
+    if mask is None:
+        alpha = rgb[:, :, 3]
+    else:
+        # compose_on と同じく mask * 255 を切り捨てで 8bit にし、サイズ違いは左上基準で切り詰め/0埋め
+        alpha = _scratch("mask8", (h, w), np.uint8)
+        alpha.fill(0)
+        mh, mw = min(h, mask.shape[0]), min(w, mask.shape[1])
+        m = _scratch("maskf", (mh, mw), np.float64)
+        np.multiply(mask[:mh, :mw], 255, out=m)
+        np.copyto(alpha[:mh, :mw], m, casting="unsafe")
+    blend_alpha(frame, rgb, alpha, x, y)
+
+
+class PlateCompositeClip(CompositeVideoClip):
+    """
+    clips[0] を不透明な背景として、その上のレイヤーを合成する CompositeVideoClip。
+
+    mark_static で静止宣言されたレイヤーが2枚以上連続して再生中の区間では、
+    それらを Plate にまとめて1回のブレンドで済ませる。プレートは構成レイヤーの
+    組み合わせが変わったとき（スライドイン完了・丸の表示・タイトル終了など）にだけ作り直す。
+    背景が不透明なのでマスクは作らない（上位の合成でマスク全レイヤー走査が発生しない）。
+    返すフレームはプロセス共有の出力フレームで、次の get_frame で上書きされる。
+    """
+
+    def __init__(self, clips, size=None):
+        super().__init__(clips, size=size, use_bgclip=True)
+        self._plates: Dict[Tuple[int, ...], Plate] = {}
+
+    def _plate_for(self, run: List, t: float) -> Plate:
+        key = tuple(id(clip) for clip in run)
+        plate = self._plates.get(key)
+        if plate is None:
+            canvas = Image.new("RGBA", self.size, (0, 0, 0, 0))
+            for clip in run:
+                canvas = clip.compose_on(canvas, t)
+            plate = Plate(np.array(canvas))
+            # 区間が切り替わったら古いプレートは二度と使わない
+            self._plates = {key: plate}
+        return plate
+
+    def frame_function(self, t):
+        frame = output_frame(self.size)
+        bg = self.bg.get_frame(t - self.bg.start)
+        if bg.shape[:2] == frame.shape[:2]:
+            frame[...] = bg[:, :, :3]
+        else:
+            frame.fill(0)
+            paste(frame, bg, 0, 0)
+
+        playing = self.playing_clips(t)
+        i = 0
+        while i < len(playing):
+            j = i
+            while j < len(playing) and is_static_at(playing[j], t):
+                j += 1
+            if j - i >= 2:
+                self._plate_for(playing[i:j], t).blend_onto(frame)
+                i = j
+                continue
+            blend_clip(frame, playing[i], t)
+            i += 1
+        return frame
+
+
+class SequenceClip(VideoClip):
+    """
+    不透明なクリップを順に並べる concatenate_videoclips(method="compose") の置き換え。
+
+    再生中のクリップのフレームをそのまま返す（キャンバスと同じサイズなら複製もしない）。
+    サイズが違うクリップだけ、compose と同じく黒地の中央に置く。
+    """
+
+    def __init__(self, clips: List[VideoClip], size: Optional[Tuple[int, int]] = None):
+        self.clips = clips
+        tt = np.cumsum([0] + [clip.duration for clip in clips])
+        self.starts = list(tt[:-1])
+        self.ends = list(tt[1:])
+        super().__init__(duration=float(tt[-1]))
+        self.size = size or (max(c.w for c in clips), max(c.h for c in clips))
+        fpss = [c.fps for c in clips if getattr(c, "fps", None) is not None]
+        self.fps = max(fpss) if fpss else None
+
+    def frame_function(self, t):
+        i = min(bisect_right(self.ends, t), len(self.clips) - 1)
+        rgb = self.clips[i].get_frame(t - self.starts[i])
+        w, h = self.size
+        if rgb.shape[0] == h and rgb.shape[1] == w and rgb.shape[2] == 3:
+            return rgb
+        frame = output_frame(self.size, "sequence")
+        frame.fill(0)
+        paste(frame, rgb, (w - rgb.shape[1]) // 2, (h - rgb.shape[0]) // 2)
+        return frame
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+レイヤー単位のフレーム時間プロファイラ（--profile-layers）
+
+有効にすると profile_layer() を通したクリップ（とそのマスク）の frame_function を
+計測付きに差し替え、シーン×レイヤーごとに呼び出し回数・時間・返したフレームの
+バイト数（frame_bytes。レイヤー内部で確保した一時配列は含まない）を集計する。合成クリップ自体も登録すると、子レイヤーの時間を差し引いた
+「ブレンドだけの時間」が残る。無効時は何も差し替えないので通常レンダーへの影響はない。
+"""
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_ENABLED = False
+# (scene, layer) -> [calls, seconds（子レイヤーを除く）, 返したフレームの nbytes の合計]
+_STATS: Dict[Tuple[str, str], list] = {}
+# 実行中の計測区間ごとに、その内側で計測済みの子レイヤーの時間を積む
+_STACK: List[float] = []
+
+
+def enable():
+    global _ENABLED
+    _ENABLED = True
+    _STATS.clear()
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def _timed(frame_function, scene: str, layer: str):
+    stats = _STATS.setdefault((scene, layer), [0, 0.0, 0])
+
+    def timed(t):
+        _STACK.append(0.0)
+        t0 = time.perf_counter()
+        try:
+            frame = frame_function(t)
+        finally:
+            elapsed = time.perf_counter() - t0
+            child = _STACK.pop()
+            if _STACK:
+                _STACK[-1] += elapsed
+        stats[0] += 1
+        stats[1] += elapsed - child
+        stats[2] += getattr(frame, "nbytes", 0)
+        return frame
+
+    return timed
+
+
+def profile_layer(clip, scene: str, layer: str):
+    """プロファイル有効時だけ clip の frame_function（マスクがあればそれも）を計測付きにする。"""
+    if not _ENABLED:
+        return clip
+    clip.frame_function = _timed(clip.frame_function, scene, layer)
+    if clip.mask is not None:
+        # with_* のコピー間でマスクは共有されているので、複製してから差し替える
+        mask = clip.mask.copy()
+        mask.frame_function = _timed(mask.frame_function, scene, f"{layer}.mask")
+        clip.mask = mask
+    return clip
+
+
+def report(frames: Optional[int] = None, wall_seconds: Optional[float] = None) -> dict:
+    layers = []
+    scenes: Dict[str, float] = {}
+    for (scene, layer), (calls, seconds, frame_bytes) in _STATS.items():
+        if calls == 0:
+            continue
+        layers.append({
+            "scene": scene,
+            "layer": layer,
+            "calls": calls,
+            "seconds": round(seconds, 4),
+            "ms_per_call": round(seconds * 1000 / calls, 3),
+            "frame_bytes": frame_bytes,
+        })
+        scenes[scene] = scenes.get(scene, 0.0) + seconds
+    layers.sort(key=lambda r: r["seconds"], reverse=True)
+    return {
+        "frames": frames,
+        "wall_seconds": None if wall_seconds is None else round(wall_seconds, 3),
+        "profiled_seconds": round(sum(scenes.values()), 3),
+        "scenes": {k: round(v, 4) for k, v in scenes.items()},
+        "layers": layers,
+    }
+
+
+def write_report(path: Path, frames: Optional[int] = None, wall_seconds: Optional[float] = None, top: int = 15) -> dict:
+    """JSON レポートを path に書き、時間の長い順に上位 top 件を表で表示する。"""
+    data = report(frames, wall_seconds)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    total = data["profiled_seconds"] or 1.0
+    print(f"[profile] {'scene':<10} {'layer':<22} {'calls':>7} {'sec':>8} {'ms/call':>8} {'share':>6} {'frame MB':>9}")
+    for r in data["layers"][:top]:
+        print(
+            f"[profile] {r['scene']:<10} {r['layer']:<22} {r['calls']:>7} {r['seconds']:>8.2f}"
+            f" {r['ms_per_call']:>8.2f} {r['seconds'] / total:>6.1%} {r['frame_bytes'] / 1e6:>9.1f}"
+        )
+    if data["wall_seconds"] is not None:
+        print(f"[profile] 計測レイヤー合計 {data['profiled_seconds']:.2f}s / 全体 {data['wall_seconds']:.2f}s")
+    print(f"[profile] レポート: {path}")
+    return data
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+複数ジョブの一括レンダリング
+
+間違い探し・漢字クロスワードのジョブJSONをまとめて受け取り、1つの長寿命プロセス
+（--workers で小さなプロセスプール）で順に書き出す。moviepy の import は1回だけで、
+素材のリーダー（MediaRegistry）・デコード済み音声・クロマキー済みフレーム・
+素材ハッシュなどのプロセス内キャッシュはジョブ間で共有される。
+
+  python scripts/render_batch.py --assets assets/input --output-dir out/batch jobs/a.json jobs/b.json
+  python scripts/render_batch.py --manifest batch.json --workers 2
+
+manifest は [{"job": "...", "assets": "...", "output": "...", "kind": "spot_diff|kanji"}, ...]
+（assets / output / kind は省略可）。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lambda_local"))
+
+from common_render import ENCODER_PROFILES, MediaRegistry, probe_media  # noqa: E402
+
+KINDS = ("spot_diff", "kanji")
+
+# プロセス内で全ジョブが共有するリーダー（ワーカープロセスではワーカーごとに1つ）
+_MEDIA: Optional[MediaRegistry] = None
+
+
+def job_kind(job: dict) -> str:
+    """漢字ジョブは layout_mode / question_no / type_cells を持つ。"""
+    questions = job.get("questions") or [{}]
+    if "layout_mode" in job or "layout" in job or "question_no" in questions[0] or "type_cells" in questions[0]:
+        return "kanji"
+    return "spot_diff"
+
+
+def init_worker(draft: bool):
+    global _MEDIA
+    import render_kanji_video as kanji
+    import render_spot_diff_video as spot
+
+    if draft:
+        spot.configure_draft()
+        kanji.configure_draft()
+    _MEDIA = MediaRegistry()
+
+
+def render_one(entry: dict, encoder_profile: Optional[str], test_mode: bool) -> dict:
+    """1ジョブを書き出して所要時間・スループットを返す。失敗してもバッチは止めない。"""
+    import render_kanji_video as kanji
+    import render_spot_diff_video as spot
+
+    job_path, assets, output = Path(entry["job"]), Path(entry["assets"]), Path(entry["output"])
+    result = {"job": str(job_path), "kind": entry["kind"], "output": str(output), "pid": os.getpid()}
+    t0 = time.perf_counter()
+    try:
+        job = spot.load_json(job_path)
+        if entry["kind"] == "kanji":
+            kanji.build_video(job, assets, output, test_mode=test_mode,
+                              encoder_profile=encoder_profile, media=_MEDIA)
+            fps = kanji.FPS
+        else:
+            spot.build_video(job, assets, output, encoder_profile=encoder_profile, media=_MEDIA)
+            fps = spot.FPS
+    except Exception as e:
+        traceback.print_exc()
+        result.update(status="failed", error=f"{type(e).__name__}: {e}",
+                      seconds=round(time.perf_counter() - t0, 3))
+        return result
+    finally:
+        # 次のジョブで使わない・差し替えられた素材のリーダーを閉じる
+        if _MEDIA is not None:
+            _MEDIA.trim()
+
+    seconds = time.perf_counter() - t0
+    duration = probe_media(output)["duration"]
+    frames = int(round(duration * fps))
+    result.update(
+        status="ok",
+        seconds=round(seconds, 3),
+        duration=duration,
+        frames=frames,
+        fps=round(frames / seconds, 2),
+        bytes=output.stat().st_size,
+    )
+    return result
+
+
+def resolve_entries(args) -> List[dict]:
+    if args.manifest:
+        raw = json.loads(args.manifest.read_text(encoding="utf-8"))
+    else:
+        raw = [{"job": str(p)} for p in args.jobs]
+    if not raw:
+        raise SystemExit("ジョブがありません（ジョブJSONか --manifest を指定してください）")
+
+    entries = []
+    used_outputs = set()
+    for item in raw:
+        job_path = Path(item["job"])
+        kind = item.get("kind") or job_kind(json.loads(job_path.read_text(encoding="utf-8")))
+        if kind not in KINDS:
+            raise SystemExit(f"{job_path}: 不明な kind {kind!r}")
+        assets = item.get("assets") or args.assets
+        if assets is None:
+            raise SystemExit(f"{job_path}: assets が指定されていません（--assets か manifest の assets）")
+        output = Path(item.get("output") or args.output_dir / f"{job_path.stem}.mp4")
+        if output in used_outputs:
+            raise SystemExit(f"出力先が重複しています: {output}")
+        used_outputs.add(output)
+        entries.append({"job": str(job_path), "kind": kind, "assets": str(assets), "output": str(output)})
+    return entries
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="複数ジョブの一括レンダリング（素材・キャッシュをジョブ間で共有）")
+    p.add_argument("jobs", nargs="*", type=Path, help="ジョブJSON（種類は内容から判定）")
+    p.add_argument("--manifest", type=Path, default=None, help="ジョブ一覧のJSON")
+    p.add_argument("--assets", type=Path, default=None, help="既定の素材ディレクトリ")
+    p.add_argument("--output-dir", type=Path, default=Path("out/batch"))
+    p.add_argument("--workers", type=int, default=1, help="ワーカープロセス数（1なら現在のプロセスで順に実行）")
+    p.add_argument("--encoder-profile", choices=list(ENCODER_PROFILES), default=None)
+    p.add_argument("--draft", action="store_true", help="全ジョブを --draft 相当で書き出す")
+    p.add_argument("--test", action="store_true", help="漢字ジョブをテストモード（1問・10秒）で書き出す")
+    p.add_argument("--report", type=Path, default=None, help="結果JSON（既定: <output-dir>/batch_report.json）")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    entries = resolve_entries(args)
+    encoder_profile = args.encoder_profile or ("draft" if args.draft else None)
+    for entry in entries:
+        Path(entry["output"]).parent.mkdir(parents=True, exist_ok=True)
+
+    started = time.perf_counter()
+    if args.workers <= 1:
+        init_worker(args.draft)
+        try:
+            results = [render_one(entry, encoder_profile, args.test) for entry in entries]
+        finally:
+            _MEDIA.close()
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.draft,)) as pool:
+            futures = [pool.submit(render_one, entry, encoder_profile, args.test) for entry in entries]
+            results = [f.result() for f in futures]
+    wall = time.perf_counter() - started
+
+    print(f"[batch] {'job':<32} {'kind':<9} {'sec':>8} {'fps':>7} {'MB':>7}")
+    for r in results:
+        if r["status"] == "ok":
+            print(f"[batch] {Path(r['job']).name:<32} {r['kind']:<9} {r['seconds']:>8.1f} {r['fps']:>7.2f} {r['bytes'] / 1e6:>7.1f}")
+        else:
+            print(f"[batch] {Path(r['job']).name:<32} {r['kind']:<9} FAILED {r['error']}")
+    ok = [r for r in results if r["status"] == "ok"]
+    total_frames = sum(r["frames"] for r in ok)
+    print(f"[batch] {len(ok)}/{len(results)} 本 {wall:.1f}s（全体 {total_frames / wall:.2f} fps）")
+
+    report_path = args.report or args.output_dir / "batch_report.json"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps({
+        "workers": args.workers,
+        "wall_seconds": round(wall, 3),
+        "frames": total_frames,
+        "fps": round(total_frames / wall, 2),
+        "jobs": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[batch] レポート: {report_path}")
+    if len(ok) != len(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
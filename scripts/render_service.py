@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+スプールディレクトリ監視のローカルレンダーサービス
+
+<spool>/incoming/ に置かれたジョブマニフェストを、moviepy を読み込み済みの
+ワーカープロセス（render_batch と同じく素材・キャッシュを共有）で優先度順に書き出す。
+
+  python scripts/render_service.py serve --spool spool --workers 2
+  python scripts/render_service.py submit --spool spool --job assets/input/video_render.json \\
+      --assets assets/input --output out/today.mp4 --priority upload
+
+マニフェスト: {"job": "...", "assets": "...", "output": "...",
+               "kind": "spot_diff|kanji", "priority": "upload|default|backfill" または数値,
+               "draft": false, "encoder_profile": null, "test": false}
+priority は小さいほど先（同じなら投入順）。
+
+スプールの構成:
+  incoming/  投入されたマニフェスト（ここだけを監視する）
+  running/   実行中（起動時に残っていれば incoming/ に戻す）
+  done/ failed/  終了したマニフェスト
+  status/<name>.json  状態（queued/running/ok/failed）と待ち時間・所要時間・fps
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List
+
+import render_batch
+
+PRIORITIES = {"upload": 0, "default": 50, "backfill": 100}
+SPOOL_DIRS = ("incoming", "running", "done", "failed", "status")
+
+
+def priority_value(value) -> int:
+    if isinstance(value, (int, float)):
+        return int(value)
+    if value not in PRIORITIES:
+        raise ValueError(f"unknown priority: {value} (choices: {', '.join(PRIORITIES)} or a number)")
+    return PRIORITIES[value]
+
+
+def write_json_atomic(path: Path, payload: dict):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+class Spool:
+    def __init__(self, root: Path):
+        self.root = root
+        for name in SPOOL_DIRS:
+            (root / name).mkdir(parents=True, exist_ok=True)
+
+    def dir(self, name: str) -> Path:
+        return self.root / name
+
+    def status_path(self, name: str) -> Path:
+        return self.dir("status") / f"{Path(name).stem}.json"
+
+    def recover(self):
+        """前回のプロセスが実行中のまま落ちたマニフェストを待ち行列に戻す。"""
+        for path in self.dir("running").glob("*.json"):
+            print(f"[service] 再投入: {path.name}")
+            os.replace(path, self.dir("incoming") / path.name)
+
+    def pending(self) -> List[dict]:
+        """incoming/ のマニフェストを (priority, 投入時刻) 順に返す。壊れたものは failed/ へ。"""
+        items = []
+        for path in self.dir("incoming").glob("*.json"):
+            try:
+                manifest = json.loads(path.read_text(encoding="utf-8"))
+                priority = priority_value(manifest.get("priority", "default"))
+                queued_at = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError) as e:
+                self.finish(path.name, "incoming", "failed", {"status": "failed", "error": f"invalid manifest: {e}"})
+                continue
+            items.append({"name": path.name, "manifest": manifest, "priority": priority, "queued_at": queued_at})
+        items.sort(key=lambda item: (item["priority"], item["queued_at"], item["name"]))
+        return items
+
+    def claim(self, name: str) -> bool:
+        """incoming/ から running/ へ移す。別のサービスが先に取っていれば False。"""
+        try:
+            os.replace(self.dir("incoming") / name, self.dir("running") / name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def requeue(self, name: str, status: dict):
+        """running/ から incoming/ へ戻す（mtime は変わらないので順番も元のまま）。"""
+        self.finish(name, "running", "incoming", {**status, "status": "queued"})
+
+    def finish(self, name: str, src: str, dst: str, status: dict):
+        try:
+            os.replace(self.dir(src) / name, self.dir(dst) / name)
+        except FileNotFoundError:
+            pass
+        write_json_atomic(self.status_path(name), status)
+
+
+def cpu_budget(workers: int) -> int:
+    """ワーカー1つあたりのエンコードスレッド数（全体でコア数を超えないようにする）。"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def init_service_worker(draft: bool, threads: int):
+    os.environ["RENDER_ENCODER_THREADS"] = str(threads)
+    render_batch.init_worker(draft)
+
+
+def to_entry(manifest: dict) -> dict:
+    job_path = Path(manifest["job"])
+    kind = manifest.get("kind") or render_batch.job_kind(json.loads(job_path.read_text(encoding="utf-8")))
+    output = manifest.get("output") or f"out/{job_path.stem}.mp4"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    return {"job": str(job_path), "kind": kind, "assets": manifest["assets"], "output": output}
+
+
+def serve(spool: Spool, workers: int, max_load: float, poll: float, once: bool):
+    spool.recover()
+    threads = cpu_budget(workers)
+    print(f"[service] workers={workers} threads/job={threads} max_load={max_load:g} spool={spool.root}")
+
+    # configure_draft はプロセス全体の設定なので、ドラフトのジョブは別プールで書き出す
+    pools: Dict[bool, ProcessPoolExecutor] = {}
+    running: Dict = {}
+    stopping = False
+
+    def request_stop(signum, _frame):
+        nonlocal stopping
+        print(f"[service] signal {signum}: 実行中のジョブが終わったら停止します")
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    def pool_for(draft: bool) -> ProcessPoolExecutor:
+        if draft not in pools:
+            pools[draft] = ProcessPoolExecutor(
+                max_workers=workers, initializer=init_service_worker, initargs=(draft, threads)
+            )
+        return pools[draft]
+
+    def drop_pool(draft: bool, pool: ProcessPoolExecutor):
+        # ワーカーが落ちた（OOM kill など）プールは二度と使えないので捨て、次の投入で作り直す
+        if pools.get(draft) is pool:
+            del pools[draft]
+            print(f"[service] ワーカープールを作り直します (draft={draft})")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def load_ok() -> bool:
+        # 実行中のジョブがなければ負荷に関係なく1本は流す
+        return not running or os.getloadavg()[0] < max_load
+
+    try:
+        while True:
+            if not stopping:
+                for item in spool.pending():
+                    if len(running) >= workers or not load_ok():
+                        break
+                    name, manifest = item["name"], item["manifest"]
+                    if not spool.claim(name):
+                        continue
+                    status = {
+                        "status": "running",
+                        "manifest": manifest,
+                        "priority": item["priority"],
+                        "queued_at": item["queued_at"],
+                        "started_at": time.time(),
+                    }
+                    status["wait_seconds"] = round(status["started_at"] - item["queued_at"], 3)
+                    try:
+                        entry = to_entry(manifest)
+                    except (OSError, KeyError, ValueError) as e:
+                        spool.finish(name, "running", "failed", {**status, "status": "failed", "error": str(e)})
+                        continue
+                    write_json_atomic(spool.status_path(name), status)
+                    draft = bool(manifest.get("draft"))
+                    profile = manifest.get("encoder_profile") or ("draft" if draft else None)
+                    pool = pool_for(draft)
+                    try:
+                        future = pool.submit(render_batch.render_one, entry, profile, bool(manifest.get("test")))
+                    except BrokenProcessPool:
+                        # このジョブのせいではないので待ち行列に戻し、新しいプールで流し直す
+                        drop_pool(draft, pool)
+                        spool.requeue(name, status)
+                        break
+                    running[future] = (name, status, draft, pool)
+                    print(f"[service] start {name} (priority={item['priority']}, waited {status['wait_seconds']:.1f}s)")
+
+            if not running:
+                if stopping or (once and not spool.pending()):
+                    break
+                time.sleep(poll)
+                continue
+
+            done, _ = wait(list(running), timeout=poll, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, status, draft, pool = running.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    # ワーカープロセスごと落ちた。どのジョブが原因か分からないので、同じプールの
+                    # ジョブはすべて失敗扱いにする（再投入すると落ち続ける可能性がある）
+                    drop_pool(draft, pool)
+                    result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+                except Exception as e:
+                    result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+                status.update(result, finished_at=time.time())
+                status["total_seconds"] = round(status["finished_at"] - status["queued_at"], 3)
+                ok = result.get("status") == "ok"
+                spool.finish(name, "running", "done" if ok else "failed", status)
+                if ok:
+                    print(f"[service] done  {name} {result['seconds']:.1f}s {result['fps']:.2f} fps")
+                else:
+                    print(f"[service] FAILED {name}: {result.get('error')}")
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+
+def submit(spool: Spool, args) -> Path:
+    manifest = {
+        "job": str(args.job),
+        "assets": str(args.assets),
+        "output": str(args.output) if args.output else None,
+        "kind": args.kind,
+        "priority": args.priority if not args.priority.lstrip("-").isdigit() else int(args.priority),
+        "draft": args.draft,
+        "encoder_profile": args.encoder_profile,
+        "test": args.test,
+    }
+    priority_value(manifest["priority"])
+    name = args.name or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{args.job.stem}.json"
+    path = spool.dir("incoming") / name
+    # incoming/ には書き終えたファイルだけが現れるようにする
+    write_json_atomic(path, manifest)
+    write_json_atomic(spool.status_path(name), {"status": "queued", "manifest": manifest, "queued_at": time.time()})
+    print(f"[service] queued {path}")
+    return path
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="スプールディレクトリ監視のローカルレンダーサービス")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    s = sub.add_parser("serve", help="spool/incoming を監視してレンダリングする")
+    s.add_argument("--spool", type=Path, default=Path("spool"))
+    s.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="同時に書き出すジョブ数")
+    s.add_argument("--max-load", type=float, default=float(os.cpu_count() or 1),
+                   help="1分平均のロードアベレージがこれ以上なら新しいジョブを始めない")
+    s.add_argument("--poll", type=float, default=2.0, help="incoming/ の確認間隔（秒）")
+    s.add_argument("--once", action="store_true", help="待ち行列が空になったら終了する")
+
+    q = sub.add_parser("submit", help="マニフェストを incoming/ に投入する")
+    q.add_argument("--spool", type=Path, default=Path("spool"))
+    q.add_argument("--job", type=Path, required=True)
+    q.add_argument("--assets", type=Path, required=True)
+    q.add_argument("--output", type=Path, default=None)
+    q.add_argument("--kind", choices=list(render_batch.KINDS), default=None)
+    q.add_argument("--priority", default="default", help="upload / default / backfill または数値（小さいほど先）")
+    q.add_argument("--draft", action="store_true")
+    q.add_argument("--encoder-profile", choices=list(render_batch.ENCODER_PROFILES), default=None)
+    q.add_argument("--test", action="store_true")
+    q.add_argument("--name", default=None, help="マニフェストのファイル名")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    spool = Spool(args.spool)
+    if args.command == "submit":
+        try:
+            submit(spool, args)
+        except ValueError as e:
+            sys.exit(str(e))
+    else:
+        serve(spool, max(1, args.workers), args.max_load, args.poll, args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,125 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
 import json
-import random
-from dataclasses import dataclass
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+import timeline_planner
+
+
+def dry_run_main(argv: List[str]) -> Optional[int]:
+    """
+    --dry-run ならタイムラインを計画して終了コードを返す（それ以外は None）。
+    メタデータだけで完結するので、moviepy などの重い import より前に呼ぶ（他の引数は見ない）。
+    """
+    if "--dry-run" not in argv:
+        return None
+    p = argparse.ArgumentParser(add_help=False)
+    p.add_argument("--job", type=Path, required=True)
+    p.add_argument("--assets", type=Path, required=True)
+    p.add_argument("--plan", type=Path, default=None)
+    args, _ = p.parse_known_args(argv)
+    with args.job.open("r", encoding="utf-8") as f:
+        job = json.load(f)
+    return timeline_planner.dry_run(job, args.assets, args.plan)
+
+
+if __name__ == "__main__":
+    _status = dry_run_main(sys.argv[1:])
+    if _status is not None:
+        raise SystemExit(_status)
 
 from moviepy import (
-    AudioFileClip,
     ColorClip,
-    CompositeAudioClip,
-    CompositeVideoClip,
     ImageClip,
     VideoClip,
     VideoFileClip,
-    concatenate_audioclips,
-    concatenate_videoclips,
 )
-from moviepy.audio.AudioClip import AudioClip
-from moviepy.video.fx.MaskColor import MaskColor
+from moviepy.config import FFMPEG_BINARY
+from moviepy.tools import compute_position
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
 import numpy as np
 from PIL import Image, ImageDraw
 
-VIDEO_W = 1920
-VIDEO_H = 1080
-FPS = 30
+from audio_mixer import AudioCue, audio_duration, place_cues, render_mix
+from common_render import (
+    ENCODER_PROFILES,
+    MediaRegistry,
+    concat_segments,
+    encoder_cli_args,
+    file_digest,
+    job_encoder_settings,
+    prekeyed_overlay,
+    probe_media,
+)
+from compositor import PlateCompositeClip, SequenceClip, mark_static
+import layer_profiler
+from layer_profiler import profile_layer
+from s3_sink import FRAGMENTED_MOVFLAGS, encoder_output, fragmented_settings, make_client
+# レイアウト定数の初期値（configure_draft でこのモジュール内だけ書き換える）
+from timeline_planner import (
+    COUNT10_HEIGHT,
+    COUNT10_RIGHT,
+    COUNT10_Y,
+    FPS,
+    IMAGE_DISPLAY_H,
+    IMAGE_TARGET_Y,
+    LEFT_TARGET_X,
+    MARKER_COLORS,
+    MARKER_RADIUS,
+    RIGHT_TARGET_X,
+    SLIDE_IN_SECONDS,
+    VIDEO_H,
+    VIDEO_W,
+    DiffPoint,
+    diff_points_on_screen,
+    dry_run,
+    plan_backgrounds,
+    question_timing,
+)
+
+# 描画結果が変わる修正を入れたら上げる（セグメントキャッシュを無効化する）
+RENDERER_VERSION = 2
+
+# --draft: 同じタイムラインを縮小キャンバス・低fpsでレンダリングする
+DRAFT_SCALE = 0.5
+DRAFT_FPS = 15
+# レイアウト用のピクセル値はすべて px() を通す（通常レンダーでは 1.0）
+SCALE = 1.0
+
+
+def px(v: float) -> int:
+    return int(round(v * SCALE))
+
 
-# 画像配置用の定数
-IMAGE_DISPLAY_H = 968
-IMAGE_TARGET_Y = 92
-LEFT_TARGET_X = 30
-RIGHT_TARGET_X = 776
+def configure_draft(scale: float = DRAFT_SCALE, fps: int = DRAFT_FPS):
+    """キャンバス・fps・レイアウト定数をドラフト用に切り替える。シーン構築より前に1回だけ呼ぶ。"""
+    global SCALE, VIDEO_W, VIDEO_H, FPS, IMAGE_DISPLAY_H, IMAGE_TARGET_Y, LEFT_TARGET_X, RIGHT_TARGET_X
+    if SCALE != 1.0:
+        return
+    SCALE = scale
+    VIDEO_W, VIDEO_H = px(VIDEO_W), px(VIDEO_H)
+    FPS = fps
+    IMAGE_DISPLAY_H = px(IMAGE_DISPLAY_H)
+    IMAGE_TARGET_Y = px(IMAGE_TARGET_Y)
+    LEFT_TARGET_X = px(LEFT_TARGET_X)
+    RIGHT_TARGET_X = px(RIGHT_TARGET_X)
+    print(f"[draft] canvas={VIDEO_W}x{VIDEO_H} fps={FPS}")
 
 
-@dataclass
-class DiffPoint:
-    left_x: int
-    left_y: int
-    right_x: int
-    right_y: int
-    radius: int = 36
+def decode_size() -> Optional[Tuple[int, int]]:
+    """ドラフト時は全画面素材を ffmpeg 側でキャンバスサイズに縮小してデコードさせる。"""
+    return (VIDEO_W, VIDEO_H) if SCALE != 1.0 else None
 
 
 def load_json(path: Path) -> dict:
@@ -47,78 +127,52 @@ def load_json(path: Path) -> dict:
         return json.load(f)
 
 
-def safe_video(path: Path, duration: float = 2.0, color=(20, 20, 20)):
+def safe_video(
+    path: Path,
+    duration: float = 2.0,
+    color=(20, 20, 20),
+    media: Optional[MediaRegistry] = None,
+    full_frame: bool = True,
+):
     if path.exists():
-        return VideoFileClip(str(path))
+        size = decode_size() if full_frame else None
+        if media is not None:
+            return media.video(path, size=size)
+        return VideoFileClip(str(path), target_resolution=size)
     return ColorClip(size=(VIDEO_W, VIDEO_H), color=color, duration=duration)
 
 
-def safe_audio(path: Path, duration: float = 1.0, volume: float = 1.0):
-    if path.exists():
-        return AudioFileClip(str(path)).with_volume_scaled(volume)
-
-    def make_frame(_t: float):
-        return 0.0
-
-    return AudioClip(make_frame, duration=duration, fps=44100)
+def loop_background(bg_path: Optional[Path], duration: float, media: MediaRegistry, color=(30, 30, 30)):
+    """背景動画を duration までループさせる。素材は ffmpeg 側でキャンバスサイズにデコードする。"""
+    if bg_path is not None and bg_path.exists():
+        return media.looping_video(bg_path, duration, (VIDEO_W, VIDEO_H))
+    return ColorClip(size=(VIDEO_W, VIDEO_H), color=color, duration=duration)
 
 
-def loop_background(bg_clip: VideoFileClip, duration: float):
-    base = bg_clip.resized((VIDEO_W, VIDEO_H)).without_audio()
-    if base.duration >= duration:
-        return base.subclipped(0, duration)
-    loops = int(duration // base.duration) + 1
-    return concatenate_videoclips([base] * loops, method="compose").subclipped(0, duration)
+@lru_cache(maxsize=None)
+def render_title_text_image() -> np.ndarray:
+    # 時間不変レイヤーなので1回だけラスタライズして使い回す
+    img = Image.new("RGBA", (px(1180), px(92)), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.rounded_rectangle((0, 0, px(1180), px(92)), radius=px(18), fill=(0, 0, 0, 155))
+    draw.text((px(265), px(28)), "3つの間違いを探してください", fill=(255, 255, 255, 255))
+    arr = np.array(img)
+    arr.setflags(write=False)
+    return arr
 
 
-def loop_audio(audio_clip: AudioClip, duration: float):
-    if audio_clip.duration >= duration:
-        return audio_clip.subclipped(0, duration)
-    loops = int(duration // audio_clip.duration) + 1
-    return concatenate_audioclips([audio_clip] * loops).subclipped(0, duration)
-
-
-def apply_chroma_key(
-    clip: VideoFileClip, key_color: Tuple[int, int, int], threshold: float = 90, stiffness: float = 6
-):
-    return clip.with_effects(
-        [MaskColor(color=key_color, threshold=threshold, stiffness=stiffness)]
-    )
+def static_layer_clip(rgba: np.ndarray, duration: float):
+    # RGBA配列をアルファ付きImageClipとして配置（フレームごとの再描画なし）
+    return ImageClip(rgba, transparent=True).with_duration(duration)
 
 
 def make_title_text_clip(duration: float):
-    title_text = "3つの間違いを探してください"
-
-    def make_frame(_t: float):
-        img = Image.new("RGBA", (1180, 92), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        draw.rounded_rectangle((0, 0, 1180, 92), radius=18, fill=(0, 0, 0, 155))
-        draw.text((265, 28), title_text, fill=(255, 255, 255, 255))
-        return np.array(img)
-
-    return VideoClip(frame_function=make_frame, duration=duration).with_fps(FPS)
-
-
-def make_countdown_clip(duration: float, start_seconds: int = 90):
-    # PILでフレーム生成してImageMagick依存を回避
-    def make_frame(t: float):
-        remaining = max(0, start_seconds - int(t))
-        img = Image.new("RGBA", (260, 120), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        draw.rounded_rectangle((0, 0, 260, 120), radius=20, fill=(0, 0, 0, 150))
-        txt = f"{remaining:02d}" if remaining < 100 else str(remaining)
-        draw.text((85, 28), txt, fill=(255, 255, 255, 255))
-        return np.array(img)
-
-    clip = VideoClip(
-        frame_function=lambda t: make_frame(t), duration=duration
-    ).with_fps(FPS)
-    return clip.with_position((VIDEO_W // 2 - 130, 24))
+    return static_layer_clip(render_title_text_image(), duration)
 
 
 def slide_in_image(path: Path, target_x: int, target_y: int, start_t: float, side: str):
     img = ImageClip(str(path)).resized(height=IMAGE_DISPLAY_H)
-    in_duration = 0.8
+    in_duration = SLIDE_IN_SECONDS
     off_x = -img.w - 1 if side == "left" else VIDEO_W + 1
 
     def pos(t: float):
@@ -132,99 +186,112 @@ def slide_in_image(path: Path, target_x: int, target_y: int, start_t: float, sid
         x = off_x + (target_x - off_x) * eased
         return x, target_y
 
-    return img.with_start(start_t).with_position(pos)
+    # スライドイン完了後は静止レイヤーとしてプレートにまとめられる
+    return mark_static(img.with_start(start_t).with_position(pos), after=in_duration)
+
+
+class SpriteClip(ImageClip):
+    """小さな静止RGBAスプライト。合成時はスプライトが覆う矩形だけをブレンドする。
+
+    moviepy標準の compose_on は画面サイズのキャンバスを毎フレーム確保して
+    全面アルファ合成するため、小さな素材ほど無駄が大きい。
+    """
+
+    def __init__(self, rgba: np.ndarray, duration: float = None):
+        super().__init__(rgba, transparent=True, duration=duration)
+        self.sprite = Image.fromarray(np.ascontiguousarray(rgba), "RGBA")
+
+    def compose_on(self, background: Image.Image, t: float) -> Image.Image:
+        ct = t - self.start
+        x, y = compute_position(self.sprite.size, background.size, self.pos(ct), self.relative_pos)
+        x, y = int(x), int(y)
+        src_x0, src_y0 = max(0, -x), max(0, -y)
+        src_x1 = min(self.sprite.width, background.width - x)
+        src_y1 = min(self.sprite.height, background.height - y)
+        if src_x1 <= src_x0 or src_y1 <= src_y0:
+            return background
+        if background.mode != "RGBA":
+            background = background.convert("RGBA")
+        background.alpha_composite(
+            self.sprite, dest=(x + src_x0, y + src_y0), source=(src_x0, src_y0, src_x1, src_y1)
+        )
+        return background
+
+
+@lru_cache(maxsize=None)
+def render_ring_sprite(radius: int, rgba: Tuple[int, int, int, int], width: Optional[int] = None) -> np.ndarray:
+    width = width if width is not None else max(1, px(8))
+    size = radius * 2 + 1
+    img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    ImageDraw.Draw(img).ellipse((0, 0, radius * 2, radius * 2), outline=rgba, width=width)
+    arr = np.array(img)
+    arr.setflags(write=False)
+    return arr
 
 
-def circle_overlay(
+def circle_markers(
     duration: float,
     points: List[Tuple[int, int]],
     radius: int,
     rgba: Tuple[int, int, int, int],
-):
-    def make_frame(_t: float):
-        img = Image.new("RGBA", (VIDEO_W, VIDEO_H), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        for x, y in points:
-            draw.ellipse((x - radius, y - radius, x + radius, y + radius), outline=rgba, width=8)
-        return np.array(img)
-
-    return VideoClip(
-        frame_function=lambda t: make_frame(t), is_mask=False, duration=duration
-    ).with_fps(FPS)
+) -> List[SpriteClip]:
+    # 丸ごとにリングだけを切り出したスプライトをDiffPoint座標へ配置する
+    ring = render_ring_sprite(radius, rgba)
+    return [
+        mark_static(SpriteClip(ring, duration=duration).with_position((x - radius, y - radius)))
+        for x, y in points
+    ]
 
 
 def q_diff_points(q_data: dict) -> List[DiffPoint]:
-    orig_h = q_data.get("image_height", 1200)
-    orig_w = q_data.get("image_width", 896)
-    scale = IMAGE_DISPLAY_H / orig_h
-    img_display_w = int(orig_w * scale)
-    center_offset_x = (VIDEO_W - img_display_w * 2) // 2
-
-    print(f"[q_diff_points] orig={orig_w}x{orig_h} scale={scale:.4f} img_display_w={img_display_w} center_offset_x={center_offset_x}")
-    print(f"[q_diff_points] left_image_x={LEFT_TARGET_X + center_offset_x} right_image_x={RIGHT_TARGET_X + center_offset_x} image_y={IMAGE_TARGET_Y}")
-
-    out = []
-    for i, p in enumerate(q_data.get("diff_points", [])):
-        dp = DiffPoint(
-            left_x  = LEFT_TARGET_X  + center_offset_x + int(p["left_x"]  * scale),
-            left_y  = IMAGE_TARGET_Y + int(p["left_y"]  * scale),
-            right_x = RIGHT_TARGET_X + center_offset_x + int(p["right_x"] * scale),
-            right_y = IMAGE_TARGET_Y + int(p["right_y"] * scale),
-            radius  = 60,
-        )
-        print(f"[q_diff_points] diff[{i+1}] src=({p['left_x']},{p['left_y']}) -> screen_left=({dp.left_x},{dp.left_y}) screen_right=({dp.right_x},{dp.right_y}) r={dp.radius}")
-        out.append(dp)
-    return out
+    return diff_points_on_screen(
+        q_data,
+        video_w=VIDEO_W,
+        image_display_h=IMAGE_DISPLAY_H,
+        image_target_y=IMAGE_TARGET_Y,
+        left_target_x=LEFT_TARGET_X,
+        right_target_x=RIGHT_TARGET_X,
+        radius=px(MARKER_RADIUS),
+    )
 
 
 def build_question_scene(
     q_idx: int,
     q_data: dict,
     assets: Path,
-    used_backgrounds: set,
+    bg_path: Optional[Path],
     timing: dict,
-):
-    question_clip = safe_video(assets / f"question{q_idx}.mp4", duration=3.0)
-
-    all_bgs = sorted(assets.glob("S*.mp4"))
-    candidates = [p for p in all_bgs if p.name not in used_backgrounds] or all_bgs
-    if not candidates:
-        candidates = []
-
-    if candidates:
-        bg_path = random.choice(candidates)
-        used_backgrounds.add(bg_path.name)
-        bg_base = safe_video(bg_path, duration=8.0)
-    else:
-        bg_base = ColorClip(size=(VIDEO_W, VIDEO_H), color=(30, 30, 30), duration=8.0)
-
-    description_audio = safe_audio(assets / "description.mp3", duration=3.0)
-    cue60_audio = safe_audio(assets / "60s.mp3", duration=1.0)
-    cue30_audio = safe_audio(assets / "30s.mp3", duration=1.0)
-    answer_audio = safe_audio(assets / "answer.mp3", duration=2.0)
-    answer1_audio = safe_audio(assets / "answer1.mp3", duration=1.5)
-    answer2_audio = safe_audio(assets / "answer2.mp3", duration=1.5)
-    answer3_audio = safe_audio(assets / "answer3.mp3", duration=1.5)
-    cheer_audio = safe_audio(assets / "cheer.mp3", duration=2.0)
-
-    count10 = safe_video(assets / "count10.mp4", duration=10.0)
-    alarm = safe_video(assets / "alarm.mp4", duration=2.0)
-
-    image_start = float(timing.get("image_start_delay", 0.5))
-    countdown_start = image_start
-    countdown_duration = float(timing.get("countdown_seconds", 90.0))
-    answer_gap_after_seconds = float(timing.get("answer_gap_after_seconds", 4.0))
-
-    after_countdown_t = countdown_start + countdown_duration
-    alarm_start = after_countdown_t
-    answer_start = alarm_start + alarm.duration
-    answer1_start = answer_start + answer_audio.duration
-    answer2_start = answer1_start + answer1_audio.duration + answer_gap_after_seconds
-    answer3_start = answer2_start + answer2_audio.duration + answer_gap_after_seconds
-    cheer_start = answer3_start + answer3_audio.duration + 2.0
-    scene_duration = cheer_start + cheer_audio.duration + 2.0
-
-    bg_loop = loop_background(bg_base, scene_duration)
+    media: MediaRegistry,
+) -> Tuple[VideoClip, List[AudioCue]]:
+    """1問分の映像（questionN.mp4 + 問題シーン）と、その先頭からの相対時刻の音声キューを返す。"""
+    question_clip = safe_video(assets / f"question{q_idx}.mp4", duration=3.0, media=media)
+
+    count10 = safe_video(assets / "count10.mp4", duration=10.0, media=media, full_frame=False)
+    alarm = safe_video(assets / "alarm.mp4", duration=2.0, media=media)
+
+    tl = question_timing(
+        timing,
+        {
+            "alarm": alarm.duration,
+            "answer": audio_duration(assets / "answer.mp3", 2.0),
+            "answer1": audio_duration(assets / "answer1.mp3", 1.5),
+            "answer2": audio_duration(assets / "answer2.mp3", 1.5),
+            "answer3": audio_duration(assets / "answer3.mp3", 1.5),
+            "cheer": audio_duration(assets / "cheer.mp3", 2.0),
+        },
+    )
+    image_start = tl["image_start"]
+    countdown_start = tl["countdown_start"]
+    countdown_duration = tl["countdown_duration"]
+    alarm_start = tl["alarm_start"]
+    answer_start = tl["answer_start"]
+    answer1_start = tl["answer1_start"]
+    answer2_start = tl["answer2_start"]
+    answer3_start = tl["answer3_start"]
+    cheer_start = tl["cheer_start"]
+    scene_duration = tl["scene_duration"]
+
+    bg_loop = loop_background(bg_path, scene_duration, media)
 
     left_img = slide_in_image(
         assets / q_data["left_image"],
@@ -241,105 +308,722 @@ def build_question_scene(
         side="right",
     )
 
-    question_title_clip = (
+    question_title_clip = mark_static(
         make_title_text_clip(duration=countdown_duration)
         .with_start(countdown_start)
         .with_position(("center", 0))
     )
 
-    count10_start = countdown_start + max(0.0, countdown_duration - 10.0)
+    count10_start = tl["count10_start"]
+    chroma_cache = assets / "chroma_cache"
     count10_clip = (
-        apply_chroma_key(
-            count10.resized(height=170),
+        prekeyed_overlay(
+            count10,
+            assets / "count10.mp4",
+            chroma_cache,
             key_color=(0, 0, 255),
             threshold=float(timing.get("count10_chroma_threshold", 140)),
+            height=px(COUNT10_HEIGHT),
         )
         .with_start(count10_start)
-        .with_position((VIDEO_W - 230, 16))
+        .with_position((VIDEO_W - px(COUNT10_RIGHT), px(COUNT10_Y)))
     )
-    alarm_clip = apply_chroma_key(
-        alarm.resized((VIDEO_W, VIDEO_H)),
+    alarm_clip = prekeyed_overlay(
+        alarm,
+        assets / "alarm.mp4",
+        chroma_cache,
         key_color=(0, 255, 0),
         threshold=float(timing.get("alarm_chroma_threshold", 140)),
+        size=(VIDEO_W, VIDEO_H),
     ).with_start(alarm_start)
 
     diffs = q_diff_points(q_data)
-    colors = [
-        (0, 120, 255, 255),
-        (255, 220, 0, 255),
-        (255, 0, 0, 255),
-    ]
+    colors = MARKER_COLORS
     marker_starts = [answer1_start, answer2_start, answer3_start]
 
     marker_clips = []
     for idx, diff in enumerate(diffs[:3]):
-        marker = circle_overlay(
+        markers = circle_markers(
             duration=scene_duration - marker_starts[idx],
             points=[(diff.left_x, diff.left_y), (diff.right_x, diff.right_y)],
             radius=diff.radius,
             rgba=colors[idx],
-        ).with_start(marker_starts[idx])
-        marker_clips.append(marker)
-
-    scene_layers = [bg_loop, left_img, right_img]
-    scene_layers.append(question_title_clip)
-    scene_layers.extend([count10_clip, *marker_clips, alarm_clip])
-    scene_video = CompositeVideoClip(scene_layers, size=(VIDEO_W, VIDEO_H)).with_duration(scene_duration)
-
-    scene_audio_layers = [
-        description_audio.with_start(image_start),
-        cue60_audio.with_start(countdown_start + max(0.0, countdown_duration - 60.0)),
-        cue30_audio.with_start(countdown_start + max(0.0, countdown_duration - 30.0)),
-        answer_audio.with_start(answer_start),
-        answer1_audio.with_start(answer1_start),
-        answer2_audio.with_start(answer2_start),
-        answer3_audio.with_start(answer3_start),
-        cheer_audio.with_start(cheer_start),
+        )
+        marker_clips.extend(m.with_start(marker_starts[idx]) for m in markers)
+
+    scene = f"Q{q_idx}"
+    scene_layers = [
+        profile_layer(bg_loop, scene, "background"),
+        profile_layer(left_img, scene, "left_image"),
+        profile_layer(right_img, scene, "right_image"),
+    ]
+    scene_layers.append(profile_layer(question_title_clip, scene, "title"))
+    scene_layers.append(profile_layer(count10_clip, scene, "count10"))
+    scene_layers.extend(profile_layer(m, scene, "markers") for m in marker_clips)
+    scene_layers.append(profile_layer(alarm_clip, scene, "alarm"))
+    scene_video = PlateCompositeClip(scene_layers, size=(VIDEO_W, VIDEO_H)).with_duration(scene_duration)
+    # 子レイヤーを除いた残り＝プレート作成とブレンドの時間
+    scene_video = profile_layer(scene_video, scene, "blend")
+
+    scene_cues = [
+        AudioCue(assets / "description.mp3", image_start),
+        AudioCue(assets / "60s.mp3", tl["cue60_start"]),
+        AudioCue(assets / "30s.mp3", tl["cue30_start"]),
+        AudioCue(assets / "answer.mp3", answer_start),
+        AudioCue(assets / "answer1.mp3", answer1_start),
+        AudioCue(assets / "answer2.mp3", answer2_start),
+        AudioCue(assets / "answer3.mp3", answer3_start),
+        AudioCue(assets / "cheer.mp3", cheer_start),
     ]
     if count10.audio is not None:
-        scene_audio_layers.append(count10.audio.with_start(count10_start))
+        scene_cues.append(AudioCue(assets / "count10.mp4", count10_start))
     if alarm.audio is not None:
-        scene_audio_layers.append(alarm.audio.with_start(alarm_start))
+        scene_cues.append(AudioCue(assets / "alarm.mp4", alarm_start))
 
-    scene_audio = CompositeAudioClip(scene_audio_layers)
-    scene_video = scene_video.with_audio(scene_audio)
+    cues = []
+    if question_clip.audio is not None:
+        cues.append(AudioCue(assets / f"question{q_idx}.mp4", 0.0, duration=question_clip.duration))
+    cues.extend(place_cues(scene_cues, question_clip.duration, scene_duration))
 
-    return concatenate_videoclips([question_clip, scene_video], method="compose")
+    question_video = profile_layer(question_clip.without_audio(), scene, "question_video")
+    clip = SequenceClip([question_video, scene_video], size=(VIDEO_W, VIDEO_H))
+    return profile_layer(clip, scene, "concat"), cues
 
 
-def build_video(job: dict, assets: Path, output_path: Path):
-    random.seed(job.get("random_seed", 42))
-    timing = job.get("timing", {})
+def build_segment(
+    job: dict,
+    assets: Path,
+    index: int,
+    media: MediaRegistry,
+    bg_paths: Optional[List[Optional[Path]]] = None,
+) -> Tuple[VideoClip, List[AudioCue]]:
+    """
+    セグメント index（0 = opening、1..N = 各問、N+1 = ending）の映像（音声なし）と
+    その先頭からの相対時刻の音声キューを返す。BGMは含まない。
+    """
+    n_questions = len(job["questions"])
+    if index == 0 or index == n_questions + 1:
+        name = "opening" if index == 0 else "ending"
+        clip = safe_video(assets / f"{name}.mp4", duration=2.0, media=media)
+        cues = [AudioCue(assets / f"{name}.mp4", 0.0)] if clip.audio is not None else []
+        return profile_layer(clip.without_audio(), name, "video"), cues
+    if bg_paths is None:
+        bg_paths = plan_backgrounds(job, assets)
+    return build_question_scene(
+        index, job["questions"][index - 1], assets, bg_paths[index - 1], job.get("timing", {}), media
+    )
 
-    opening = safe_video(assets / "opening.mp4", duration=2.0)
-    ending = safe_video(assets / "ending.mp4", duration=2.0)
-    main_bgm = safe_audio(assets / "main_bgm.mp3", duration=300.0, volume=0.35)
 
-    used_backgrounds = set()
-    questions = []
-    for i, q in enumerate(job["questions"], start=1):
-        questions.append(build_question_scene(i, q, assets, used_backgrounds, timing))
+def build_segments(job: dict, assets: Path, media: MediaRegistry) -> Tuple[List[VideoClip], List[List[AudioCue]]]:
+    """
+    opening / 各問シーン / ending の映像（音声なし）と、セグメントごとの相対時刻の
+    音声キューを順に返す。BGMは含まない。
+    """
+    bg_paths = plan_backgrounds(job, assets)
+    built = [build_segment(job, assets, i, media, bg_paths) for i in range(len(job["questions"]) + 2)]
+    return [clip for clip, _ in built], [cues for _, cues in built]
 
-    main_part = concatenate_videoclips(questions, method="compose")
-    bgm_clip = loop_audio(main_bgm, main_part.duration)
 
-    if main_part.audio is not None:
-        main_audio = CompositeAudioClip([main_part.audio, bgm_clip.with_start(0)])
-    else:
-        main_audio = CompositeAudioClip([bgm_clip.with_start(0)])
-    main_part = main_part.with_audio(main_audio)
+def timeline_audio(segments: List[VideoClip], segment_cues: List[List[AudioCue]], assets: Path) -> List[AudioCue]:
+    """セグメントごとのキューを全体の時刻に並べ、問題パート全体にBGMのループを重ねる。"""
+    cues = []
+    t = 0.0
+    for seg, seg_cues in zip(segments, segment_cues):
+        cues.extend(place_cues(seg_cues, t, seg.duration))
+        t += seg.duration
 
-    final = concatenate_videoclips([opening, main_part, ending], method="compose")
+    main_start = segments[0].duration
+    main_duration = t - main_start - segments[-1].duration
+    cues.append(AudioCue(assets / "main_bgm.mp3", main_start, volume=0.35, duration=main_duration, loop=True))
+    return cues
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    final.write_videofile(
-        str(output_path),
+
+def assemble_final(segments: List[VideoClip]):
+    # 最終出力はH.264でアルファを持たないので、全面の合成もマスクも不要。再生中のセグメントのフレームをそのまま渡す
+    final = SequenceClip(segments, size=(VIDEO_W, VIDEO_H))
+    return profile_layer(final, "timeline", "concat")
+
+
+def segment_frame_ranges(segments: List[VideoClip]) -> List[Tuple[int, int]]:
+    """
+    各セグメントが担当する全体フレーム番号の範囲 [first, last) を返す。
+
+    フレーム f (時刻 f / FPS) は、その時刻を含むセグメントに属する。
+    単一レンダーと同じフレーム格子で割り当てるので、連結後のフレーム列は一致する。
+    """
+    starts = []
+    t = 0.0
+    for seg in segments:
+        starts.append(t)
+        t += seg.duration
+    bounds = [math.ceil(start * FPS - 1e-6) for start in starts] + [int(t * FPS)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def render_segment(
+    job: dict,
+    assets: Path,
+    index: int,
+    seg_start: float,
+    frame_range: Tuple[int, int],
+    path: Path,
+    encoder: dict,
+    draft: bool = False,
+):
+    """
+    セグメント index のフレームを映像のみでエンコードする（プロセスプールのワーカー）。
+
+    moviepyのクリップはプロセス間で受け渡せないため、ワーカー側でジョブから
+    担当するセグメントだけを組み直す（他の問の素材は開かない）。背景選択は
+    plan_backgrounds で決定的に再現される。seg_start はセグメントの全体での開始時刻。
+    """
+    if draft:
+        configure_draft()
+    with MediaRegistry() as media:
+        seg, _ = build_segment(job, assets, index, media)
+        first, last = frame_range
+        with FFMPEG_VideoWriter(str(path), (VIDEO_W, VIDEO_H), FPS, **encoder) as writer:
+            for f in range(first, last):
+                frame = seg.get_frame(f / FPS - seg_start)
+                writer.write_frame(frame.astype("uint8"))
+    print(f"[segment] #{index} frames {first}-{last} -> {path.name}")
+    return path
+
+
+def asset_fingerprint(path: Optional[Path]) -> Optional[dict]:
+    if path is None or not path.exists():
+        return None
+    return {"name": path.name, "sha256": file_digest(path)}
+
+
+def segment_cache_key(
+    job: dict,
+    assets: Path,
+    index: int,
+    n_segments: int,
+    phase: float,
+    n_frames: int,
+    encoder: dict,
+) -> str:
+    """
+    セグメント index の映像を決める入力すべてのハッシュ。
+
+    opening / ending は素材のみ、問題シーンは問題データ・タイミング・背景選択・
+    シーンで使う素材（尺がタイミングに効く answer*.mp3 / cheer.mp3 を含む）で決まる。
+    前のセグメントの尺が変わるとフレーム格子とのずれ（phase）も変わるので、それも含める。
+    """
+    if index == 0:
+        inputs = {"kind": "opening", "video": asset_fingerprint(assets / "opening.mp4")}
+    elif index == n_segments - 1:
+        inputs = {"kind": "ending", "video": asset_fingerprint(assets / "ending.mp4")}
+    else:
+        q = job["questions"][index - 1]
+        names = [
+            f"question{index}.mp4", q.get("left_image", ""), q.get("right_image", ""),
+            "count10.mp4", "alarm.mp4",
+            "answer.mp3", "answer1.mp3", "answer2.mp3", "answer3.mp3", "cheer.mp3",
+        ]
+        inputs = {
+            "kind": "question",
+            "index": index,
+            "question": q,
+            "timing": job.get("timing", {}),
+            "background": asset_fingerprint(plan_backgrounds(job, assets)[index - 1]),
+            "assets": {name: asset_fingerprint(assets / name) for name in names if name},
+        }
+    inputs.update(
+        renderer_version=RENDERER_VERSION,
+        canvas=[VIDEO_W, VIDEO_H],
         fps=FPS,
-        codec="libx264",
-        audio_codec="aac",
-        preset="medium",
-        threads=4,
+        phase=round(phase, 6),
+        frames=n_frames,
+        encoder=encoder,
+    )
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:24]
+
+
+def render_segments_parallel(
+    job: dict,
+    assets: Path,
+    segments: List[VideoClip],
+    audio_path: Path,
+    output_path: Path,
+    workers: int,
+    encoder: dict,
+    cache_dir: Optional[Path] = None,
+    target: Optional[Path] = None,
+):
+    """
+    opening / 各問 / ending を別プロセスで並列エンコードし、ffmpeg concat で無再エンコード結合する。
+
+    BGMがセグメントをまたいで途切れないよう、音声はミックス済みの全尺トラック
+    audio_path を結合時にmuxする。
+    cache_dir を渡すとエンコード済みセグメントを入力のハッシュ（segment_cache_key）で
+    保存し、入力が変わっていないセグメントは再レンダリングせずにそのまま結合する。
+    target を渡すと結合結果をそこ（S3 へ流す FIFO）へ fragmented MP4 で書く。
+    """
+    ranges = segment_frame_ranges(segments)
+    starts = [sum(s.duration for s in segments[:i]) for i in range(len(segments))]
+    with tempfile.TemporaryDirectory(prefix="segments_", dir=output_path.parent) as tmp:
+        tmp_dir = Path(tmp)
+        paths = []
+        todo = []
+        for i, (first, last) in enumerate(ranges):
+            if last <= first:
+                continue
+            if cache_dir is None:
+                path = tmp_dir / f"segment_{i:02d}.mp4"
+            else:
+                key = segment_cache_key(job, assets, i, len(segments), first / FPS - starts[i], last - first, encoder)
+                path = cache_dir / f"segment_{i:02d}_{key}.mp4"
+                if path.exists():
+                    print(f"[segment_cache] #{i} hit -> {path.name}")
+                    paths.append(path)
+                    continue
+            paths.append(path)
+            todo.append((i, (first, last), path))
+
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            print(f"[segment_cache] {len(paths) - len(todo)}/{len(paths)} セグメントを再利用")
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(
+                        render_segment,
+                        job,
+                        assets,
+                        i,
+                        starts[i],
+                        frame_range,
+                        # キャッシュへは書き終えてから置き換える（中断時に壊れたセグメントを残さない）
+                        path if cache_dir is None else path.with_name(path.stem + ".partial.mp4"),
+                        encoder,
+                        SCALE != 1.0,
+                    )
+                    for i, frame_range, path in todo
+                ]
+                rendered = [f.result() for f in futures]
+            if cache_dir is not None:
+                for partial, (_, _, path) in zip(rendered, todo):
+                    os.replace(partial, path)
+        if target is None:
+            concat_segments(paths, output_path, audio_path=audio_path, audio_codec="aac")
+        else:
+            concat_segments(paths, target, audio_path=audio_path, audio_codec="aac", movflags=FRAGMENTED_MOVFLAGS)
+
+
+def build_video(
+    job: dict,
+    assets: Path,
+    output_path: Path,
+    segment_workers: int = 0,
+    encoder_profile: Optional[str] = None,
+    segment_cache: Optional[Path] = None,
+    media: Optional[MediaRegistry] = None,
+    s3_output: Optional[str] = None,
+    s3_client=None,
+):
+    """
+    s3_output（s3://bucket/key）を渡すと、output_path に書くのと同時にエンコード中の出力を
+    S3 へマルチパートで送る（s3_client でクライアントを差し替えられる）。
+    """
+    # 単一レンダー・セグメント並列レンダーで共通のエンコード設定
+    encoder = job_encoder_settings(job, FPS, encoder_profile)
+    started = time.perf_counter()
+    if layer_profiler.enabled() and (segment_workers > 0 or segment_cache is not None):
+        # ワーカープロセスの計測は集計できないので、プロファイル時は単一レンダーにする
+        print("[profile] --profile-layers 指定のため単一レンダーで書き出します")
+        segment_workers, segment_cache = 0, None
+    # media を渡された場合はバッチレンダーの共有レジストリなので閉じない
+    with nullcontext(media) if media is not None else MediaRegistry() as media:
+        segments, segment_cues = build_segments(job, assets, media)
+        final = assemble_final(segments)
+        cues = timeline_audio(segments, segment_cues, assets)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="audio_", dir=output_path.parent) as tmp, \
+                encoder_output(output_path, s3_output, s3_client) as target:
+            audio_path = render_mix(cues, final.duration, Path(tmp) / "audio.wav")
+            if segment_workers > 0 or segment_cache is not None:
+                render_segments_parallel(
+                    job,
+                    assets,
+                    segments,
+                    audio_path,
+                    output_path,
+                    max(1, segment_workers),
+                    encoder,
+                    cache_dir=segment_cache,
+                    target=target if s3_output else None,
+                )
+                return
+
+            final.write_videofile(
+                str(target),
+                fps=FPS,
+                audio=str(audio_path),
+                audio_codec="aac",
+                **(fragmented_settings(encoder) if s3_output else encoder),
+            )
+    if layer_profiler.enabled():
+        layer_profiler.write_report(
+            output_path.with_suffix(".layers.json"),
+            frames=int(final.duration * FPS),
+            wall_seconds=time.perf_counter() - started,
+        )
+
+
+# ── ffmpeg filtergraph バックエンド ──────────────────────────────────────
+# タイムライン全体を1回の ffmpeg -filter_complex 呼び出しにコンパイルし、
+# Python側ではフレームを1枚も合成しない。配置・タイミングは moviepy 版と共通の
+# 定数 / question_timing / q_diff_points を使う。
+
+
+def chroma_key_params(threshold: float, stiffness: float) -> Tuple[float, float]:
+    """
+    MaskColor の不透明度 d^s / (thr^s + d^s) を colorkey の線形ランプで近似する。
+
+    不透明度が10%・90%になる距離 thr * 9^(-1/s), thr * 9^(1/s) を
+    similarity, similarity + blend に対応させる。colorkey の距離は
+    RGBユークリッド距離を sqrt(3) * 255 で正規化した値。
+    """
+    norm = math.sqrt(3) * 255
+    lo = threshold * 9 ** (-1 / stiffness) / norm
+    hi = threshold * 9 ** (1 / stiffness) / norm
+    return lo, hi - lo
+
+
+def frame_index(t: float) -> int:
+    """時刻 t 以降で最初に出力されるフレーム番号（segment_frame_ranges と同じ丸め）。"""
+    return math.ceil(t * FPS - 1e-6)
+
+
+def ff_color(color: Tuple[int, int, int]) -> str:
+    return "0x%02x%02x%02x" % tuple(color)
+
+
+class FilterGraph:
+    """ffmpeg の入力引数・filter_complex のチェーン・音声キューを組み立てる。"""
+
+    def __init__(self):
+        self.inputs: List[List[str]] = []
+        self.chains: List[str] = []
+        self.audio: List[str] = []
+        self._n = 0
+
+    def add_input(self, *args) -> int:
+        self.inputs.append([str(a) for a in args])
+        return len(self.inputs) - 1
+
+    def label(self, prefix: str) -> str:
+        self._n += 1
+        return f"[{prefix}{self._n}]"
+
+    def chain(self, text: str):
+        self.chains.append(text)
+
+    def source(
+        self, path: Path, fallback_duration: float, color=(20, 20, 20), loop_to: Optional[float] = None
+    ) -> dict:
+        """
+        safe_video 相当。素材がなければ lavfi の単色映像で代用する。
+        loop_to を渡すとその尺までループ入力にする（入力側で -t を切らないと
+        ffmpeg がループ入力を読み続けてフレームが溜まる）。
+        """
+        if path.exists():
+            info = probe_media(path)
+            args = ["-stream_loop", "-1", "-t", f"{loop_to:.6f}"] if loop_to is not None else []
+            idx = self.add_input(*args, "-i", path)
+            return {
+                "video": f"[{idx}:v]",
+                "audio": f"[{idx}:a]" if info["has_audio"] else None,
+                "size": tuple(info["size"] or (VIDEO_W, VIDEO_H)),
+                "duration": info["duration"],
+            }
+        idx = self.add_input(
+            "-f", "lavfi", "-i",
+            f"color=c={ff_color(color)}:s={VIDEO_W}x{VIDEO_H}:r={FPS}:d={fallback_duration}",
+        )
+        return {"video": f"[{idx}:v]", "audio": None, "size": (VIDEO_W, VIDEO_H), "duration": fallback_duration}
+
+    def still(self, path: Path) -> str:
+        """
+        静止画を1フレームだけの入力にする。overlay は入力の終わった副映像の最後の
+        フレームを出し続ける（eof_action=repeat）ので、-loop 1 で毎フレーム
+        PNG をデコードし直さずに済む。
+        """
+        idx = self.add_input("-i", path)
+        return f"[{idx}:v]"
+
+    def full_frame(self, src: dict, start: float, end: float) -> str:
+        """タイムライン上 [start, end) に置く全画面映像。moviepy と同じ枚数のフレームに揃える。"""
+        n_frames = frame_index(end) - frame_index(start)
+        out = self.label("v")
+        self.chain(
+            f"{src['video']}scale={VIDEO_W}:{VIDEO_H},fps={FPS},setsar=1,format=yuv420p,"
+            f"tpad=stop_mode=clone:stop=-1,trim=end_frame={n_frames},setpts=PTS-STARTPTS{out}"
+        )
+        return out
+
+    def overlay(self, base: str, top: str, x, y, enable: str = None, pass_eof: bool = False) -> str:
+        out = self.label("v")
+        opts = f"x='{x}':y='{y}'"
+        if enable:
+            opts += f":enable='{enable}'"
+        if pass_eof:
+            opts += ":eof_action=pass"
+        self.chain(f"{base}{top}overlay={opts}{out}")
+        return out
+
+    def keyed(self, src: dict, size: Tuple[int, int], key_color, threshold: float, stiffness: float, start: float) -> str:
+        similarity, blend = chroma_key_params(threshold, stiffness)
+        out = self.label("k")
+        self.chain(
+            f"{src['video']}scale={size[0]}:{size[1]}:flags=lanczos,fps={FPS},"
+            f"colorkey={ff_color(key_color)}:{similarity:.5f}:{blend:.5f},"
+            f"setpts=PTS-STARTPTS+{start:.6f}/TB{out}"
+        )
+        return out
+
+    def add_audio(self, stream: str, start: float, volume: float = 1.0, duration: float = None):
+        out = self.label("a")
+        trim = f"atrim=duration={duration:.6f}," if duration is not None else ""
+        delay = int(round(start * 1000))
+        self.chain(
+            f"{stream}{trim}aformat=sample_rates=44100:channel_layouts=stereo,"
+            f"volume={volume},adelay={delay}|{delay}{out}"
+        )
+        self.audio.append(out)
+
+
+def ff_audio_cue(
+    g: FilterGraph,
+    path: Path,
+    fallback_duration: float,
+    start: Optional[float] = None,
+    max_duration: Optional[float] = None,
+) -> float:
+    """
+    素材尺（なければ fallback）を返す。
+    start を渡すとその時刻に配置し、max_duration で切る（シーン尺を超えた分は鳴らさない）。
+    """
+    if not path.exists():
+        return fallback_duration
+    duration = probe_media(path)["duration"]
+    if start is not None:
+        idx = g.add_input("-i", path)
+        g.add_audio(f"[{idx}:a]", start, duration=max_duration)
+    return duration
+
+
+def save_ring_plate(diffs, path: Path) -> Tuple[int, int]:
+    """diffs の丸（左右）を外接矩形の RGBA 画像1枚に描いて path に保存し、左上座標を返す。"""
+    rings = []
+    for idx, diff in enumerate(diffs):
+        sprite = Image.fromarray(render_ring_sprite(diff.radius, MARKER_COLORS[idx]))
+        for x, y in ((diff.left_x, diff.left_y), (diff.right_x, diff.right_y)):
+            rings.append((sprite, x - diff.radius, y - diff.radius))
+    # yuv420p への overlay は座標を偶数に切り下げるので、原点を偶数に揃えて丸の位置をずらさない
+    x0 = min(x for _, x, _ in rings) // 2 * 2
+    y0 = min(y for _, _, y in rings) // 2 * 2
+    x1 = max(x + sprite.width for sprite, x, _ in rings)
+    y1 = max(y + sprite.height for sprite, _, y in rings)
+    plate = Image.new("RGBA", (x1 - x0, y1 - y0), (0, 0, 0, 0))
+    for sprite, x, y in rings:
+        plate.alpha_composite(sprite, dest=(x - x0, y - y0))
+    plate.save(path)
+    return x0, y0
+
+
+def ff_question_scene(
+    g: FilterGraph,
+    tmp_dir: Path,
+    q_idx: int,
+    q_data: dict,
+    assets: Path,
+    bg_path: Optional[Path],
+    timing: dict,
+    t0: float,
+) -> Tuple[str, float]:
+    """build_question_scene の ffmpeg 版。映像ラベルと尺（questionN.mp4 を含む）を返す。"""
+    question = g.source(assets / f"question{q_idx}.mp4", 3.0)
+    question_v = g.full_frame(question, t0, t0 + question["duration"])
+    if question["audio"]:
+        g.add_audio(question["audio"], t0, duration=question["duration"])
+    scene_t0 = t0 + question["duration"]
+
+    count10 = g.source(assets / "count10.mp4", 10.0)
+    alarm = g.source(assets / "alarm.mp4", 2.0)
+    durations = {"alarm": alarm["duration"]}
+    for name, fallback in (("answer", 2.0), ("answer1", 1.5), ("answer2", 1.5), ("answer3", 1.5), ("cheer", 2.0)):
+        durations[name] = ff_audio_cue(g, assets / f"{name}.mp3", fallback)
+    tl = question_timing(timing, durations)
+    scene_duration = tl["scene_duration"]
+
+    for name, start in (
+        ("description", tl["image_start"]),
+        ("60s", tl["cue60_start"]),
+        ("30s", tl["cue30_start"]),
+        ("answer", tl["answer_start"]),
+        ("answer1", tl["answer1_start"]),
+        ("answer2", tl["answer2_start"]),
+        ("answer3", tl["answer3_start"]),
+        ("cheer", tl["cheer_start"]),
+    ):
+        ff_audio_cue(g, assets / f"{name}.mp3", 0.0, start=scene_t0 + start, max_duration=scene_duration - start)
+
+    if bg_path is not None:
+        bg = g.source(bg_path, 8.0, loop_to=scene_duration)
+    else:
+        bg = g.source(Path("__none__"), scene_duration, color=(30, 30, 30))
+    v = g.full_frame(bg, scene_t0, scene_t0 + scene_duration)
+
+    image_start = tl["image_start"]
+    for name, target_x, side in (
+        (q_data["left_image"], LEFT_TARGET_X, "left"),
+        (q_data["right_image"], RIGHT_TARGET_X, "right"),
+    ):
+        path = assets / name
+        # 表示サイズへの縮小は moviepy 版（PIL の LANCZOS）と同じく1回だけ行う
+        with Image.open(path) as im:
+            w, h = im.size
+            disp_w = int(w * IMAGE_DISPLAY_H / h)
+            scaled_png = tmp_dir / f"{path.stem}_{disp_w}x{IMAGE_DISPLAY_H}.png"
+            if not scaled_png.exists():
+                im.convert("RGBA").resize((disp_w, IMAGE_DISPLAY_H), Image.Resampling.LANCZOS).save(scaled_png)
+        off_x = -disp_w - 1 if side == "left" else VIDEO_W + 1
+        img = g.still(scaled_png)
+        # slide_in_image と同じ ease-out
+        x = (
+            f"if(lt(t,{image_start + SLIDE_IN_SECONDS}),"
+            f"{off_x}+({target_x - off_x})*(1-pow(1-(t-{image_start})/{SLIDE_IN_SECONDS},2)),{target_x})"
+        )
+        v = g.overlay(v, img, x, IMAGE_TARGET_Y, enable=f"gte(t,{image_start})")
+
+    title_png = tmp_dir / "title.png"
+    if not title_png.exists():
+        Image.fromarray(render_title_text_image()).save(title_png)
+    title_w = render_title_text_image().shape[1]
+    countdown_end = tl["countdown_start"] + tl["countdown_duration"]
+    v = g.overlay(
+        v, g.still(title_png), (VIDEO_W - title_w) // 2, 0,
+        enable=f"gte(t,{tl['countdown_start']})*lt(t,{countdown_end})",
+    )
+
+    c_w, c_h = count10["size"]
+    count10_v = g.keyed(
+        count10,
+        (int(c_w * px(COUNT10_HEIGHT) / c_h), px(COUNT10_HEIGHT)),
+        (0, 0, 255),
+        float(timing.get("count10_chroma_threshold", 140)),
+        6,
+        tl["count10_start"],
     )
+    v = g.overlay(v, count10_v, VIDEO_W - px(COUNT10_RIGHT), px(COUNT10_Y), pass_eof=True)
+    if count10["audio"]:
+        g.add_audio(
+            count10["audio"], scene_t0 + tl["count10_start"], duration=scene_duration - tl["count10_start"]
+        )
+
+    # 丸は答えごとに増えるだけなので、その時点までの丸を1枚に描いたプレートを
+    # 区間ごとに1枚だけ重ねる（区間外の overlay は素通し）
+    marker_starts = [tl["answer1_start"], tl["answer2_start"], tl["answer3_start"]]
+    diffs = q_diff_points(q_data)[:3]
+    for idx in range(len(diffs)):
+        plate_png = tmp_dir / f"rings_q{q_idx}_{idx + 1}.png"
+        x, y = save_ring_plate(diffs[: idx + 1], plate_png)
+        enable = f"gte(t,{marker_starts[idx]})"
+        if idx + 1 < len(diffs):
+            enable += f"*lt(t,{marker_starts[idx + 1]})"
+        v = g.overlay(v, g.still(plate_png), x, y, enable=enable)
+
+    alarm_v = g.keyed(
+        alarm,
+        (VIDEO_W, VIDEO_H),
+        (0, 255, 0),
+        float(timing.get("alarm_chroma_threshold", 140)),
+        6,
+        tl["alarm_start"],
+    )
+    v = g.overlay(v, alarm_v, 0, 0, pass_eof=True)
+    if alarm["audio"]:
+        g.add_audio(alarm["audio"], scene_t0 + tl["alarm_start"], duration=scene_duration - tl["alarm_start"])
+
+    out = g.label("q")
+    g.chain(f"{question_v}{v}concat=n=2:v=1:a=0{out}")
+    return out, question["duration"] + scene_duration
+
+
+def build_video_ffmpeg(
+    job: dict,
+    assets: Path,
+    output_path: Path,
+    encoder_profile: Optional[str] = None,
+    s3_output: Optional[str] = None,
+    s3_client=None,
+):
+    encoder = job_encoder_settings(job, FPS, encoder_profile)
+    timing = job.get("timing", {})
+    bg_paths = plan_backgrounds(job, assets)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    g = FilterGraph()
+    with tempfile.TemporaryDirectory(prefix="ffgraph_", dir=output_path.parent) as tmp:
+        tmp_dir = Path(tmp)
+        segments = []
+        t = 0.0
+
+        opening = g.source(assets / "opening.mp4", 2.0)
+        segments.append(g.full_frame(opening, t, t + opening["duration"]))
+        if opening["audio"]:
+            g.add_audio(opening["audio"], t, duration=opening["duration"])
+        t += opening["duration"]
+
+        main_start = t
+        for i, q in enumerate(job["questions"], start=1):
+            seg, duration = ff_question_scene(g, tmp_dir, i, q, assets, bg_paths[i - 1], timing, t)
+            segments.append(seg)
+            t += duration
+        main_duration = t - main_start
+
+        bgm_path = assets / "main_bgm.mp3"
+        if bgm_path.exists():
+            idx = g.add_input("-stream_loop", "-1", "-t", f"{main_duration:.6f}", "-i", bgm_path)
+            g.add_audio(f"[{idx}:a]", main_start, volume=0.35, duration=main_duration)
+
+        ending = g.source(assets / "ending.mp4", 2.0)
+        segments.append(g.full_frame(ending, t, t + ending["duration"]))
+        if ending["audio"]:
+            g.add_audio(ending["audio"], t, duration=ending["duration"])
+        t += ending["duration"]
+
+        g.chain("".join(segments) + f"concat=n={len(segments)}:v=1:a=0,format=yuv420p[vout]")
+        if not g.audio:
+            idx = g.add_input("-f", "lavfi", "-t", f"{t:.6f}", "-i", "anullsrc=r=44100:cl=stereo")
+            g.audio.append(f"[{idx}:a]")
+        g.chain("".join(g.audio) + f"amix=inputs={len(g.audio)}:normalize=0:dropout_transition=0,apad[aout]")
+
+        script_path = tmp_dir / "filter_complex.txt"
+        script_path.write_text(";\n".join(g.chains), encoding="utf-8")
+        cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error"]
+        for args in g.inputs:
+            cmd += args
+        cmd += [
+            "-filter_complex_script", str(script_path),
+            "-map", "[vout]", "-map", "[aout]",
+            "-frames:v", str(int(t * FPS)),
+            "-t", f"{t:.3f}",
+            "-r", str(FPS),
+            *encoder_cli_args(encoder),
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac",
+        ]
+        if s3_output:
+            cmd += ["-movflags", FRAGMENTED_MOVFLAGS]
+        print(f"[ffmpeg backend] inputs={len(g.inputs)} filters={len(g.chains)} duration={t:.2f}s")
+        with encoder_output(output_path, s3_output, s3_client) as target:
+            subprocess.run(cmd + [str(target)], check=True)
 
 
 def parse_args():
@@ -347,13 +1031,89 @@ def parse_args():
     p.add_argument("--job", type=Path, required=True, help="Job JSON path")
     p.add_argument("--assets", type=Path, required=True, help="Assets directory path")
     p.add_argument("--output", type=Path, default=Path("out/final.mp4"), help="Output mp4")
+    p.add_argument(
+        "--backend",
+        choices=["moviepy", "ffmpeg"],
+        default="moviepy",
+        help="moviepy: Pythonでフレーム合成 / ffmpeg: filter_complex 1回でレンダリング",
+    )
+    p.add_argument(
+        "--encoder-profile",
+        choices=list(ENCODER_PROFILES),
+        default=None,
+        help="エンコードプロファイル（省略時はジョブJSONの encoder_profile、なければ upload-balanced）",
+    )
+    p.add_argument(
+        "--draft",
+        action="store_true",
+        help=f"確認用に {DRAFT_SCALE:g} 倍のキャンバス・{DRAFT_FPS}fps でレンダリング（既定のエンコードは draft）",
+    )
+    p.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="レンダリングせず、素材メタデータだけでタイムラインを計画して表示する",
+    )
+    p.add_argument("--plan", type=Path, default=None, help="--dry-run のタイムラインJSON出力先")
+    p.add_argument(
+        "--segment-workers",
+        type=int,
+        default=0,
+        help="opening/各問/endingを並列プロセスでエンコードして無再エンコード結合する (0=単一レンダー)",
+    )
+    p.add_argument(
+        "--profile-layers",
+        action="store_true",
+        help="レイヤーごとのフレーム時間を計測し、<output>.layers.json と表を出力する（moviepy バックエンドのみ）",
+    )
+    p.add_argument(
+        "--segment-cache",
+        action="store_true",
+        help="エンコード済みセグメントを <assets>/segment_cache に保存し、入力が変わっていないセグメントを再利用する",
+    )
+    p.add_argument(
+        "--s3-output",
+        default=None,
+        help="s3://bucket/key: エンコード中の出力（fragmented MP4）を S3 へマルチパートで送る（--output にも書く）",
+    )
+    p.add_argument(
+        "--s3-endpoint-url",
+        default=None,
+        help="S3 互換ストレージ（MinIO など）のエンドポイント（省略時は環境変数 S3_ENDPOINT_URL）",
+    )
     return p.parse_args()
 
 
 def main():
     args = parse_args()
     job = load_json(args.job)
-    build_video(job, args.assets, args.output)
+    if args.dry_run:
+        raise SystemExit(dry_run(job, args.assets, args.plan))
+    encoder_profile = args.encoder_profile
+    if args.profile_layers:
+        if args.backend == "ffmpeg":
+            print("[profile] ffmpeg バックエンドは Python 側でレイヤーを合成しないため計測しません")
+        else:
+            layer_profiler.enable()
+    if args.draft:
+        configure_draft()
+        encoder_profile = encoder_profile or "draft"
+    s3_client = make_client(args.s3_endpoint_url) if args.s3_output else None
+    if args.backend == "ffmpeg":
+        build_video_ffmpeg(
+            job, args.assets, args.output, encoder_profile=encoder_profile,
+            s3_output=args.s3_output, s3_client=s3_client,
+        )
+    else:
+        build_video(
+            job,
+            args.assets,
+            args.output,
+            segment_workers=args.segment_workers,
+            encoder_profile=encoder_profile,
+            segment_cache=args.assets / "segment_cache" if args.segment_cache else None,
+            s3_output=args.s3_output,
+            s3_client=s3_client,
+        )
 
 
 if __name__ == "__main__":
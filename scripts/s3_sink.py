@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+エンコード中の出力を S3 マルチパートアップロードへ流し込む出力先
+
+エンコーダ（ffmpeg）には通常のファイルの代わりに名前付きパイプ（FIFO）を渡し、
+fragmented MP4（moov を先頭に置き、キーフレームごとに moof/mdat を書く形式）で
+書かせる。読み出しスレッドがパイプから受け取ったバイト列をパートにまとめ、
+スレッドプールで upload_part しながらエンコードを続けるので、アップロードは
+エンコードと並行して進む。同じバイト列はローカルの出力ファイルにも書く。
+
+  with stream_to_s3("s3://bucket/videos/today.mp4", local_copy=Path("out/today.mp4")) as target:
+      final.write_videofile(str(target), **fragmented_settings(encoder))
+
+S3 クライアントは引数で差し替えられる（moto / MinIO で試すときは client か endpoint_url を渡す。
+endpoint_url を省略すると環境変数 S3_ENDPOINT_URL を使う）。
+"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# S3 のパートは最後以外 5 MiB 以上が必要
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = int(os.environ.get("S3_PART_SIZE_MB", "8")) * 1024 * 1024
+UPLOAD_CONCURRENCY = 4
+READ_CHUNK = 1 << 20
+
+# 出力を先頭から順に書くだけで済む MP4（シーク不要・途中までで再生可能）
+FRAGMENTED_MOVFLAGS = "frag_keyframe+empty_moov+default_base_moof"
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    """s3://bucket/key を (bucket, key) に分ける。"""
+    if not uri.startswith("s3://"):
+        raise ValueError(f"S3 URI must start with s3://: {uri}")
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    if not bucket or not key:
+        raise ValueError(f"S3 URI needs a bucket and a key: {uri}")
+    return bucket, key
+
+
+def make_client(endpoint_url: Optional[str] = None):
+    import boto3
+
+    return boto3.client("s3", endpoint_url=endpoint_url or os.environ.get("S3_ENDPOINT_URL") or None)
+
+
+def fragmented_settings(encoder: dict) -> dict:
+    """encoder_settings の結果に fragmented MP4 の movflags を足したもの。"""
+    return {**encoder, "ffmpeg_params": [*encoder["ffmpeg_params"], "-movflags", FRAGMENTED_MOVFLAGS]}
+
+
+class MultipartUpload:
+    """
+    write() で受け取ったバイト列を part_size ごとに upload_part する。
+    送信中のパートは UPLOAD_CONCURRENCY * 2 個までに抑える（それ以上は write が待つ）。
+    """
+
+    def __init__(self, client, bucket: str, key: str, part_size: int = DEFAULT_PART_SIZE,
+                 content_type: str = "video/mp4"):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be >= {MIN_PART_SIZE} bytes")
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.upload_id = client.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType=content_type
+        )["UploadId"]
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._futures = []
+        self._slots = threading.BoundedSemaphore(UPLOAD_CONCURRENCY * 2)
+        self._pool = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY, thread_name_prefix="s3-part")
+
+    def _upload_part(self, number: int, body: bytes) -> dict:
+        try:
+            etag = self.client.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=body
+            )["ETag"]
+            return {"PartNumber": number, "ETag": etag}
+        finally:
+            self._slots.release()
+
+    def _submit(self, body: bytes):
+        # 失敗したパートがあればそれ以上送らずに止める
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        self._slots.acquire()
+        self._futures.append(self._pool.submit(self._upload_part, len(self._futures) + 1, body))
+
+    def write(self, data: bytes):
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+
+    def complete(self) -> dict:
+        # 最後のパートは 5 MiB 未満でもよい（空の出力でもパートは1つ必要）
+        if self._buffer or not self._futures:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        try:
+            parts = [future.result() for future in self._futures]
+        finally:
+            self._pool.shutdown(wait=True)
+        return self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": parts}
+        )
+
+    def abort(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+def _pump(read_fd: int, upload: MultipartUpload, local_copy: Optional[Path], errors: List[BaseException]):
+    """FIFO を EOF（書き込み側がすべて閉じる）まで読み、アップロードとローカルコピーに流す。"""
+    try:
+        with os.fdopen(read_fd, "rb") as src, (local_copy.open("wb") if local_copy else nullcontext()) as dst:
+            for chunk in iter(lambda: src.read(READ_CHUNK), b""):
+                upload.write(chunk)
+                if dst is not None:
+                    dst.write(chunk)
+    except BaseException as e:  # 読み出し側が閉じるとエンコーダは EPIPE で失敗する
+        errors.append(e)
+
+
+@contextmanager
+def stream_to_s3(
+    uri: str,
+    local_copy: Optional[Path] = None,
+    client=None,
+    endpoint_url: Optional[str] = None,
+    part_size: int = DEFAULT_PART_SIZE,
+):
+    """
+    エンコーダの出力先にする FIFO のパスを返し、書き込まれた内容を uri へマルチパートで送る。
+    ブロックを抜けるとアップロードを完了させ、例外時はアップロードを中止する。
+    エンコーダには fragmented_settings（ffmpeg 直接なら -movflags FRAGMENTED_MOVFLAGS）を渡すこと。
+    """
+    bucket, key = parse_s3_uri(uri)
+    client = client or make_client(endpoint_url)
+    upload = MultipartUpload(client, bucket, key, part_size=part_size)
+    errors: List[BaseException] = []
+    with tempfile.TemporaryDirectory(prefix="s3sink_") as tmp:
+        # 拡張子でエンコーダが MP4 を選ぶように .mp4 にする
+        fifo_path = Path(tmp) / Path(key).with_suffix(".mp4").name
+        os.mkfifo(fifo_path)
+        # 両端をここで開いておく。書き込み側を1つ持っている間は、エンコーダが開く前や
+        # 開き直す間に読み出し側が EOF を受け取らない。エンコーダが開かずに失敗しても
+        # open() で固まらない
+        read_fd = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+        os.set_blocking(read_fd, True)
+        hold_fd = os.open(fifo_path, os.O_WRONLY)
+        reader = threading.Thread(
+            target=_pump, args=(read_fd, upload, local_copy, errors), name="s3-sink", daemon=True
+        )
+        reader.start()
+        try:
+            yield fifo_path
+        except BaseException:
+            os.close(hold_fd)
+            reader.join()
+            upload.abort()
+            raise
+        os.close(hold_fd)
+        reader.join()
+        if errors:
+            upload.abort()
+            raise errors[0]
+        try:
+            upload.complete()
+        except BaseException:
+            upload.abort()
+            raise
+    print(f"[s3] uploaded s3://{bucket}/{key} ({upload.bytes_written / 1e6:.1f} MB, {len(upload._futures)} parts)")
+
+
+@contextmanager
+def encoder_output(output_path: Path, s3_uri: Optional[str] = None, client=None,
+                   endpoint_url: Optional[str] = None):
+    """
+    レンダラー用の出力先。s3_uri がなければ output_path をそのまま返す。
+    ある場合は FIFO を返し、output_path にも同じ内容を書きながら S3 へ送る。
+    """
+    if s3_uri is None:
+        yield output_path
+        return
+    with stream_to_s3(s3_uri, local_copy=output_path, client=client, endpoint_url=endpoint_url) as target:
+        yield target
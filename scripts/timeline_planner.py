@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+間違い探し動画のタイムライン計画（メタデータのみ・moviepy 非依存）
+
+ジョブJSONと素材の尺・解像度だけから、各セグメント・レイヤー・音声キューの
+開始/終了時刻と配置を宣言的な JSON にまとめる。素材の尺は assets/probe_cache.json に
+保存しておき、2回目以降はファイルを開かずに計画できる。
+
+  python scripts/timeline_planner.py --job config/dummy_job.json --assets assets/input
+  python scripts/render_spot_diff_video.py ... --dry-run   # 同じ処理
+
+レイアウト定数・タイミング計算・背景選択はレンダラーもここから import する。
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+VIDEO_W = 1920
+VIDEO_H = 1080
+FPS = 30
+
+# 画像配置用の定数
+IMAGE_DISPLAY_H = 968
+IMAGE_TARGET_Y = 92
+LEFT_TARGET_X = 30
+RIGHT_TARGET_X = 776
+SLIDE_IN_SECONDS = 0.8
+
+# 右上の count10 オーバーレイ（高さ・右端からのX・Y）
+COUNT10_HEIGHT = 170
+COUNT10_RIGHT = 230
+COUNT10_Y = 16
+
+MARKER_RADIUS = 60
+MARKER_COLORS = [
+    (0, 120, 255, 255),
+    (255, 220, 0, 255),
+    (255, 0, 0, 255),
+]
+
+PROBE_CACHE_NAME = "probe_cache.json"
+# 2: 映像素材の尺を VideoFileClip と同じ video_duration にした
+PROBE_CACHE_VERSION = 2
+
+# 素材がない場合にレンダラーが使う代替の尺（safe_video / audio_duration の fallback と同じ値）
+FALLBACK_DURATIONS = {
+    "opening.mp4": 2.0,
+    "ending.mp4": 2.0,
+    "question.mp4": 3.0,
+    "count10.mp4": 10.0,
+    "alarm.mp4": 2.0,
+    "description.mp3": 3.0,
+    "60s.mp3": 1.0,
+    "30s.mp3": 1.0,
+    "answer.mp3": 2.0,
+    "answer1.mp3": 1.5,
+    "answer2.mp3": 1.5,
+    "answer3.mp3": 1.5,
+    "cheer.mp3": 2.0,
+}
+
+
+@dataclass
+class DiffPoint:
+    left_x: int
+    left_y: int
+    right_x: int
+    right_y: int
+    radius: int = 36
+
+
+def diff_points_on_screen(
+    q_data: dict,
+    video_w: int = VIDEO_W,
+    image_display_h: int = IMAGE_DISPLAY_H,
+    image_target_y: int = IMAGE_TARGET_Y,
+    left_target_x: int = LEFT_TARGET_X,
+    right_target_x: int = RIGHT_TARGET_X,
+    radius: int = MARKER_RADIUS,
+    verbose: bool = True,
+) -> List[DiffPoint]:
+    """diff_points（元画像座標）を画面座標に変換する。"""
+    orig_h = q_data.get("image_height", 1200)
+    orig_w = q_data.get("image_width", 896)
+    scale = image_display_h / orig_h
+    img_display_w = int(orig_w * scale)
+    center_offset_x = (video_w - img_display_w * 2) // 2
+
+    if verbose:
+        print(f"[q_diff_points] orig={orig_w}x{orig_h} scale={scale:.4f} img_display_w={img_display_w} center_offset_x={center_offset_x}")
+        print(f"[q_diff_points] left_image_x={left_target_x + center_offset_x} right_image_x={right_target_x + center_offset_x} image_y={image_target_y}")
+
+    out = []
+    for i, p in enumerate(q_data.get("diff_points", [])):
+        dp = DiffPoint(
+            left_x  = left_target_x  + center_offset_x + int(p["left_x"]  * scale),
+            left_y  = image_target_y + int(p["left_y"]  * scale),
+            right_x = right_target_x + center_offset_x + int(p["right_x"] * scale),
+            right_y = image_target_y + int(p["right_y"] * scale),
+            radius  = radius,
+        )
+        if verbose:
+            print(f"[q_diff_points] diff[{i+1}] src=({p['left_x']},{p['left_y']}) -> screen_left=({dp.left_x},{dp.left_y}) screen_right=({dp.right_x},{dp.right_y}) r={dp.radius}")
+        out.append(dp)
+    return out
+
+
+def plan_backgrounds(job: dict, assets: Path) -> List[Optional[Path]]:
+    """random_seed から各問の背景 S*.mp4 を重複なしで決める（並列ワーカーでも同じ結果になる）。"""
+    random.seed(job.get("random_seed", 42))
+    all_bgs = sorted(assets.glob("S*.mp4"))
+    used_backgrounds = set()
+    bg_paths = []
+    for _ in job["questions"]:
+        candidates = [p for p in all_bgs if p.name not in used_backgrounds] or all_bgs
+        if candidates:
+            bg_path = random.choice(candidates)
+            used_backgrounds.add(bg_path.name)
+            bg_paths.append(bg_path)
+        else:
+            bg_paths.append(None)
+    return bg_paths
+
+
+def question_timing(timing: dict, durations: dict) -> dict:
+    """
+    問題シーン内の各イベント時刻（シーン先頭からの秒）を返す。
+
+    durations は alarm / answer / answer1-3 / cheer の素材尺。
+    moviepy・ffmpeg どちらのバックエンドとプランナーもこの計算を共有する。
+    """
+    image_start = float(timing.get("image_start_delay", 0.5))
+    countdown_start = image_start
+    countdown_duration = float(timing.get("countdown_seconds", 90.0))
+    answer_gap_after_seconds = float(timing.get("answer_gap_after_seconds", 4.0))
+
+    after_countdown_t = countdown_start + countdown_duration
+    alarm_start = after_countdown_t
+    answer_start = alarm_start + durations["alarm"]
+    answer1_start = answer_start + durations["answer"]
+    answer2_start = answer1_start + durations["answer1"] + answer_gap_after_seconds
+    answer3_start = answer2_start + durations["answer2"] + answer_gap_after_seconds
+    cheer_start = answer3_start + durations["answer3"] + 2.0
+    scene_duration = cheer_start + durations["cheer"] + 2.0
+
+    return {
+        "image_start": image_start,
+        "countdown_start": countdown_start,
+        "countdown_duration": countdown_duration,
+        "cue60_start": countdown_start + max(0.0, countdown_duration - 60.0),
+        "cue30_start": countdown_start + max(0.0, countdown_duration - 30.0),
+        "count10_start": countdown_start + max(0.0, countdown_duration - 10.0),
+        "alarm_start": alarm_start,
+        "answer_start": answer_start,
+        "answer1_start": answer1_start,
+        "answer2_start": answer2_start,
+        "answer3_start": answer3_start,
+        "cheer_start": cheer_start,
+        "scene_duration": scene_duration,
+    }
+
+
+# ── 素材メタデータの永続キャッシュ ────────────────────────────────────────
+
+class ProbeStore:
+    """
+    assets/probe_cache.json に素材の尺・解像度・fps・音声有無を保存する。
+
+    ファイルサイズと mtime が変わらない限り再 probe しない。probe は
+    common_render.probe_media（レンダラーと同じ解析）で行い、キャッシュが
+    温まっていれば moviepy を import せずに済む。
+    """
+
+    def __init__(self, assets: Path):
+        self.assets = assets
+        self.path = assets / PROBE_CACHE_NAME
+        self.entries: Dict[str, dict] = {}
+        self.dirty = False
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if data.get("version") == PROBE_CACHE_VERSION:
+                    self.entries = data.get("entries", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def _key(self, path: Path) -> str:
+        try:
+            return path.resolve().relative_to(self.assets.resolve()).as_posix()
+        except ValueError:
+            return str(path.resolve())
+
+    def get(self, path: Path) -> Optional[dict]:
+        """path がなければ None。"""
+        if not path.exists():
+            return None
+        st = path.stat()
+        key = self._key(path)
+        entry = self.entries.get(key)
+        if entry is None or entry["bytes"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            from common_render import probe_media
+
+            entry = {"bytes": st.st_size, "mtime_ns": st.st_mtime_ns, **probe_media(path)}
+            self.entries[key] = entry
+            self.dirty = True
+        return entry
+
+    def duration(self, path: Path, fallback: float) -> float:
+        entry = self.get(path)
+        return entry["duration"] if entry is not None else fallback
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"version": PROBE_CACHE_VERSION, "entries": self.entries}, indent=1),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+# ── タイムライン計画 ──────────────────────────────────────────────────────
+
+def _r(t: float) -> float:
+    return round(t, 3)
+
+
+def _image_width(path: Path) -> Optional[int]:
+    from PIL import Image
+
+    with Image.open(path) as im:
+        w, h = im.size
+    return int(w * IMAGE_DISPLAY_H / h)
+
+
+def plan_timeline(job: dict, assets: Path, store: ProbeStore) -> dict:
+    """
+    ジョブ全体のタイムラインを組み立てる。時刻はすべて動画先頭からの秒。
+
+    errors があるジョブはレンダリングできない。warnings は素材欠落などで
+    代替（単色・無音）になる箇所。
+    """
+    timing = job.get("timing", {})
+    errors: List[str] = []
+    warnings: List[str] = []
+    segments: List[dict] = []
+    audio: List[dict] = []
+
+    def duration_of(name: str, path: Path) -> float:
+        entry = store.get(path)
+        if entry is None:
+            fallback = FALLBACK_DURATIONS[name]
+            warnings.append(f"{path.name} がないため {fallback:g} 秒の代替を使用")
+            return fallback
+        return entry["duration"]
+
+    def cue(path: Path, start: float, limit: float, volume: float = 1.0, loop: bool = False, duration=None):
+        entry = store.get(path)
+        if entry is None or (path.suffix == ".mp4" and not entry["has_audio"]):
+            return
+        length = entry["duration"] if duration is None else duration
+        length = min(length, limit - start) if not loop else duration
+        if length <= 0:
+            return
+        audio.append({
+            "source": path.name,
+            "start": _r(start),
+            "duration": _r(length),
+            "volume": volume,
+            "loop": loop,
+        })
+
+    questions = job.get("questions") or []
+    if not questions:
+        errors.append("questions が空です")
+
+    t = 0.0
+    opening = assets / "opening.mp4"
+    d = duration_of("opening.mp4", opening)
+    segments.append({"kind": "opening", "source": opening.name, "start": 0.0, "end": _r(d), "duration": _r(d)})
+    cue(opening, 0.0, d)
+    t += d
+    main_start = t
+
+    bg_paths = plan_backgrounds(job, assets) if questions else []
+    if questions and not any(bg_paths):
+        warnings.append("背景 S*.mp4 がないため単色背景を使用")
+
+    for i, q in enumerate(questions, start=1):
+        q_start = t
+        question = assets / f"question{i}.mp4"
+        q_clip_d = duration_of("question.mp4", question)
+        cue(question, q_start, q_start + q_clip_d)
+
+        count10 = assets / "count10.mp4"
+        alarm = assets / "alarm.mp4"
+        durations = {"alarm": duration_of("alarm.mp4", alarm)}
+        for name in ("answer", "answer1", "answer2", "answer3", "cheer"):
+            durations[name] = duration_of(f"{name}.mp3", assets / f"{name}.mp3")
+        tl = question_timing(timing, durations)
+        s0 = q_start + q_clip_d
+        scene_end = s0 + tl["scene_duration"]
+        duration_of("count10.mp4", count10)
+        for name in ("description", "60s", "30s"):
+            duration_of(f"{name}.mp3", assets / f"{name}.mp3")
+
+        layers = []
+        bg = bg_paths[i - 1]
+        layers.append({"name": "background", "source": bg.name if bg else None, "start": _r(s0),
+                       "end": _r(scene_end), "loop": True})
+
+        image_start = s0 + tl["image_start"]
+        for side, key, target_x in (("left", "left_image", LEFT_TARGET_X), ("right", "right_image", RIGHT_TARGET_X)):
+            name = q.get(key)
+            path = assets / name if name else None
+            if path is None or not path.exists():
+                errors.append(f"Q{i}: {key} {name!r} が見つかりません")
+                continue
+            w = _image_width(path)
+            layers.append({
+                "name": f"{side}_image", "source": name, "start": _r(image_start), "end": _r(scene_end),
+                "from_x": -w - 1 if side == "left" else VIDEO_W + 1, "x": target_x, "y": IMAGE_TARGET_Y,
+                "size": [w, IMAGE_DISPLAY_H], "slide_seconds": SLIDE_IN_SECONDS,
+            })
+
+        countdown_start = s0 + tl["countdown_start"]
+        layers.append({"name": "title", "start": _r(countdown_start),
+                       "end": _r(countdown_start + tl["countdown_duration"]), "y": 0})
+
+        count10_start = s0 + tl["count10_start"]
+        layers.append({"name": "count10", "source": count10.name, "start": _r(count10_start),
+                       "end": _r(min(scene_end, count10_start + store.duration(count10, FALLBACK_DURATIONS["count10.mp4"]))),
+                       "x": VIDEO_W - COUNT10_RIGHT, "y": COUNT10_Y, "height": COUNT10_HEIGHT,
+                       "key_color": [0, 0, 255]})
+
+        diffs = diff_points_on_screen(q, verbose=False)
+        if len(diffs) < 3:
+            warnings.append(f"Q{i}: diff_points が {len(diffs)} 個しかありません（3個必要）")
+        for idx, diff in enumerate(diffs[:3]):
+            layers.append({
+                "name": f"marker{idx + 1}", "start": _r(s0 + tl[f"answer{idx + 1}_start"]), "end": _r(scene_end),
+                "points": [[diff.left_x, diff.left_y], [diff.right_x, diff.right_y]],
+                "radius": diff.radius, "color": list(MARKER_COLORS[idx]),
+            })
+
+        alarm_start = s0 + tl["alarm_start"]
+        layers.append({"name": "alarm", "source": alarm.name, "start": _r(alarm_start),
+                       "end": _r(min(scene_end, alarm_start + durations["alarm"])), "key_color": [0, 255, 0]})
+
+        for name, key in (
+            ("description", "image_start"),
+            ("60s", "cue60_start"),
+            ("30s", "cue30_start"),
+            ("answer", "answer_start"),
+            ("answer1", "answer1_start"),
+            ("answer2", "answer2_start"),
+            ("answer3", "answer3_start"),
+            ("cheer", "cheer_start"),
+        ):
+            cue(assets / f"{name}.mp3", s0 + tl[key], scene_end)
+        cue(count10, count10_start, scene_end)
+        cue(alarm, alarm_start, scene_end)
+
+        segments.append({
+            "kind": "question",
+            "index": i,
+            "start": _r(q_start),
+            "end": _r(scene_end),
+            "duration": _r(scene_end - q_start),
+            "question_clip": {"source": question.name, "start": _r(q_start), "end": _r(s0)},
+            "scene_start": _r(s0),
+            "events": {k: _r(s0 + v) for k, v in tl.items() if k.endswith("_start")},
+            "layers": layers,
+        })
+        t = scene_end
+
+    main_end = t
+    bgm = assets / "main_bgm.mp3"
+    if bgm.exists():
+        cue(bgm, main_start, main_end, volume=0.35, loop=True, duration=main_end - main_start)
+    else:
+        warnings.append("main_bgm.mp3 がないためBGMなし")
+
+    ending = assets / "ending.mp4"
+    d = duration_of("ending.mp4", ending)
+    segments.append({"kind": "ending", "source": ending.name, "start": _r(t), "end": _r(t + d), "duration": _r(d)})
+    cue(ending, t, t + d)
+    t += d
+
+    return {
+        "canvas": [VIDEO_W, VIDEO_H],
+        "fps": FPS,
+        "total_duration": _r(t),
+        "total_frames": int(t * FPS),
+        "segments": segments,
+        "audio": sorted(audio, key=lambda c: c["start"]),
+        "warnings": sorted(set(warnings), key=warnings.index),
+        "errors": errors,
+    }
+
+
+def print_plan(plan: dict):
+    m, s = divmod(plan["total_duration"], 60)
+    print(f"[plan] 合計 {int(m)}:{s:05.2f} ({plan['total_duration']:.2f}s, {plan['total_frames']} frames)")
+    for seg in plan["segments"]:
+        label = seg["kind"] if seg["kind"] != "question" else f"Q{seg['index']}"
+        print(f"[plan]   {label:<8} {seg['start']:>9.2f} - {seg['end']:>9.2f}  ({seg['duration']:.2f}s)")
+        if seg["kind"] == "question":
+            ev = seg["events"]
+            print(f"[plan]            alarm {ev['alarm_start']:.2f} / answer {ev['answer_start']:.2f}"
+                  f" / cheer {ev['cheer_start']:.2f}")
+    print(f"[plan] 音声キュー {len(plan['audio'])} 件")
+    for w in plan["warnings"]:
+        print(f"[plan] WARNING: {w}")
+    for e in plan["errors"]:
+        print(f"[plan] ERROR: {e}")
+
+
+def dry_run(job: dict, assets: Path, plan_path: Optional[Path] = None) -> int:
+    """計画だけを作って表示する。エラーがあれば 1 を返す。"""
+    store = ProbeStore(assets)
+    plan = plan_timeline(job, assets, store)
+    store.save()
+    print_plan(plan)
+    if plan_path is not None:
+        plan_path.parent.mkdir(parents=True, exist_ok=True)
+        plan_path.write_text(json.dumps(plan, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[plan] タイムラインJSON: {plan_path}")
+    return 1 if plan["errors"] else 0
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="間違い探し動画のタイムライン計画（レンダリングなし）")
+    p.add_argument("--job", type=Path, required=True)
+    p.add_argument("--assets", type=Path, required=True)
+    p.add_argument("--plan", type=Path, default=None, help="タイムラインJSONの出力先")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    with args.job.open("r", encoding="utf-8") as f:
+        job = json.load(f)
+    sys.exit(dry_run(job, args.assets, args.plan))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# レンダラーと同じく scripts/ と lambda_local/ のモジュールをトップレベルで import する
+for name in ("scripts", "lambda_local"):
+    sys.path.insert(0, str(ROOT / name))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+VOICEVOX エンジンの偽サーバー
+
+漢字レンダラーの音声キャッシュ・並列合成を、本物のエンジンなしで試すためのもの
+（tests/test_voicevox.py から使う）。/version・/audio_query・/synthesis だけに答え、
+合成結果は文の長さに比例した尺のサイン波 WAV。--latency で1リクエストあたりの待ち時間を入れられる。
+リクエスト数と張られた接続数を数えるので、keep-alive が効いているかも確認できる。
+requests_per_connection を指定すると、その回数だけ応答した接続を予告なしに切る。
+
+  python tests/fake_voicevox.py --port 50021 --latency 0.5
+  VOICEVOX_URL=http://127.0.0.1:50021 python lambda_local/render_kanji_video.py ...
+
+コードからは with FakeVoicevox(latency=0.2) as fake: ... fake.url で使う。
+"""
+import argparse
+import io
+import json
+import math
+import struct
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+SAMPLE_RATE = 24000
+
+
+def sine_wav(seconds: float, freq: float = 440.0) -> bytes:
+    n = max(1, int(seconds * SAMPLE_RATE))
+    frames = b"".join(
+        struct.pack("<h", int(8000 * math.sin(2 * math.pi * freq * i / SAMPLE_RATE))) for i in range(n)
+    )
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(frames)
+    return buf.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.handled = 0
+        with self.server.lock:
+            self.server.stats["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+            self.server.stats[url.path] = self.server.stats.get(url.path, 0) + 1
+        time.sleep(self.server.latency)
+
+        if url.path == "/version":
+            self._reply(200, json.dumps(self.server.version).encode(), "application/json")
+        elif url.path == "/audio_query" and self.command == "POST":
+            text = query.get("text", [""])[0]
+            payload = {"text": text, "speaker": int(query.get("speaker", ["1"])[0])}
+            self._reply(200, json.dumps(payload, ensure_ascii=False).encode(), "application/json")
+        elif url.path == "/synthesis" and self.command == "POST":
+            payload = json.loads(body or b"{}")
+            seconds = 0.5 + 0.1 * len(payload.get("text", ""))
+            self._reply(200, sine_wav(seconds, 300 + 20 * payload.get("speaker", 1)), "audio/wav")
+        else:
+            self._reply(404, b"not found", "text/plain")
+
+        self.handled += 1
+        limit = self.server.requests_per_connection
+        if limit is not None and self.handled >= limit:
+            # Connection: close を付けずに切る（クライアントは次の送信で切断に気づく）
+            self.close_connection = True
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class FakeVoicevox:
+    """スレッドで動く偽 VOICEVOX エンジン。with で起動・停止する。"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, version: str = "0.0.0-fake",
+                 requests_per_connection: Optional[int] = None):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.version = version
+        self.server.requests_per_connection = requests_per_connection
+        self.server.lock = threading.Lock()
+        self.server.stats = {"requests": 0, "connections": 0}
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> dict:
+        return dict(self.server.stats)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    p = argparse.ArgumentParser(description="VOICEVOX エンジンの偽サーバー")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=50021)
+    p.add_argument("--latency", type=float, default=0.0, help="1リクエストあたりの待ち時間（秒）")
+    p.add_argument("--version", default="0.0.0-fake", help="/version が返すエンジンのバージョン")
+    args = p.parse_args()
+    with FakeVoicevox(args.host, args.port, args.latency, args.version) as fake:
+        print(f"[fake_voicevox] {fake.url} (latency={args.latency}s)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print(f"[fake_voicevox] stats={fake.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""背景ループ（MediaRegistry.looping_video）が1本のデコーダーで1回だけデコードすることのテスト。"""
+import subprocess
+
+import numpy as np
+import pytest
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io import ffmpeg_reader
+
+import common_render
+from common_render import MediaRegistry
+
+W, H, FPS, SECONDS = 1920, 1080, 30, 6
+
+
+@pytest.fixture(scope="module")
+def full_hd_background(tmp_path_factory):
+    path = tmp_path_factory.mktemp("bg") / "S1.mp4"
+    subprocess.run([
+        FFMPEG_BINARY, "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=s={W}x{H}:r={FPS}:d={SECONDS}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", str(path),
+    ], check=True)
+    return path
+
+
+@pytest.fixture
+def decoder_starts(monkeypatch):
+    """ffmpeg のデコードプロセスを起動した回数（初回と、先頭へ戻るシークのたびに増える）。"""
+    calls = []
+    original = ffmpeg_reader.FFMPEG_VideoReader.initialize
+
+    def initialize(self, start_time=0):
+        calls.append(start_time)
+        return original(self, start_time)
+
+    monkeypatch.setattr(ffmpeg_reader.FFMPEG_VideoReader, "initialize", initialize)
+    return calls
+
+
+@pytest.mark.parametrize("ring_max_mb", [0, 4096])
+def test_full_hd_loop_decodes_once(full_hd_background, decoder_starts, monkeypatch, ring_max_mb):
+    # 0: 6秒の 1080p30（約 1.1 GB）が一時ファイルのリングに入る / 4096: メモリに収まる
+    monkeypatch.setattr(common_render, "BG_RING_MAX_BYTES", ring_max_mb * 1024 * 1024)
+    with MediaRegistry() as media:
+        loop = media.looping_video(full_hd_background, SECONDS * 2 + 1, (W, H))
+        ring = next(iter(media._rings.values()))
+        assert (ring.spill is None) == (ring_max_mb > 0)
+
+        # 2周と少しを先頭から順に読む（レンダーと同じアクセス）
+        frames = [loop.get_frame(i / FPS) for i in range(SECONDS * 2 * FPS + FPS)]
+        first = [frames[i] for i in (0, 90, 179)]
+        again = [frames[i + SECONDS * FPS] for i in (0, 90, 179)]
+
+        assert decoder_starts == [0]
+        assert ring.filled.all()
+        for a, b in zip(first, again):
+            np.testing.assert_array_equal(a, b)
+        spill = ring.spill
+    # close() で一時ファイルも消える
+    assert spill is None or not spill.exists()
@@ -0,0 +1,56 @@
+"""probe_media / ProbeStore の尺がレンダラー（VideoFileClip / AudioFileClip）と一致することのテスト。"""
+import subprocess
+
+import pytest
+from moviepy import AudioFileClip, VideoFileClip
+from moviepy.config import FFMPEG_BINARY
+
+from common_render import probe_media
+from timeline_planner import ProbeStore
+
+
+@pytest.fixture(scope="module")
+def assets(tmp_path_factory):
+    """映像1秒・音声2秒の mp4 と、音声だけの mp3。"""
+    path = tmp_path_factory.mktemp("assets")
+    subprocess.run([
+        FFMPEG_BINARY, "-v", "error", "-y",
+        "-f", "lavfi", "-i", "testsrc2=s=320x180:r=30:d=1",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=2",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-c:a", "aac",
+        str(path / "question1.mp4"),
+    ], check=True)
+    subprocess.run([
+        FFMPEG_BINARY, "-v", "error", "-y",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=1.5",
+        str(path / "answer.mp3"),
+    ], check=True)
+    return path
+
+
+def test_video_duration_matches_reader(assets):
+    path = assets / "question1.mp4"
+    clip = VideoFileClip(str(path))
+    try:
+        assert probe_media(path)["duration"] == clip.duration
+    finally:
+        clip.close()
+
+
+def test_audio_duration_is_container(assets):
+    path = assets / "answer.mp3"
+    clip = AudioFileClip(str(path))
+    try:
+        assert probe_media(path)["duration"] == clip.duration
+    finally:
+        clip.close()
+
+
+def test_probe_store_matches_renderer(assets):
+    store = ProbeStore(assets)
+    clip = VideoFileClip(str(assets / "question1.mp4"))
+    try:
+        assert store.duration(assets / "question1.mp4", 3.0) == clip.duration
+    finally:
+        clip.close()
+    assert store.duration(assets / "missing.mp4", 3.0) == 3.0
@@ -0,0 +1,118 @@
+"""s3_sink を moto の S3 に向けて、実際の ffmpeg エンコードを FIFO 経由で流すテスト。"""
+import os
+import struct
+import subprocess
+
+import pytest
+
+moto = pytest.importorskip("moto")
+boto3 = pytest.importorskip("boto3")
+from moviepy.config import FFMPEG_BINARY  # noqa: E402
+
+import s3_sink  # noqa: E402
+
+BUCKET = "render-out"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def encode_into(target, seconds: float = 1.0):
+    """
+    乱数ノイズ（ほぼ圧縮できない）を fragmented MP4 で target に書く。
+    640x480・30fps のロスレスなので 1 秒でも 5 MiB のパートが複数できる。
+    """
+    cmd = [
+        FFMPEG_BINARY, "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"nullsrc=s=640x480:r=30:d={seconds},geq=random(1)*255:128:128",
+        "-c:v", "libx264", "-preset", "ultrafast", "-qp", "0",
+        "-movflags", s3_sink.FRAGMENTED_MOVFLAGS, "-f", "mp4", str(target),
+    ]
+    return subprocess.run(cmd, capture_output=True).returncode
+
+
+def top_level_boxes(data: bytes):
+    boxes = []
+    pos = 0
+    while pos + 8 <= len(data):
+        size, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        if size == 1:
+            size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+        assert size >= 8, f"broken box at {pos}"
+        boxes.append(kind.decode("ascii"))
+        pos += size
+    assert pos == len(data)
+    return boxes
+
+
+def test_stream_uploads_fragmented_mp4(s3, tmp_path):
+    local = tmp_path / "out.mp4"
+    with s3_sink.stream_to_s3(f"s3://{BUCKET}/videos/out.mp4", local_copy=local, client=s3,
+                              part_size=s3_sink.MIN_PART_SIZE) as target:
+        assert encode_into(target) == 0
+
+    body = s3.get_object(Bucket=BUCKET, Key="videos/out.mp4")["Body"].read()
+    assert body == local.read_bytes()
+    assert len(body) > 2 * s3_sink.MIN_PART_SIZE  # 複数パートに分かれている
+
+    boxes = top_level_boxes(body)
+    assert boxes[0] == "ftyp"
+    assert boxes.index("moov") < boxes.index("moof") < boxes.index("mdat")
+    assert boxes.count("moof") >= 1
+
+    decoded = subprocess.run([FFMPEG_BINARY, "-v", "error", "-i", str(local), "-f", "null", "-"],
+                             capture_output=True)
+    assert decoded.returncode == 0, decoded.stderr.decode()
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+
+
+class FailingPartClient:
+    """fail_part 番目の upload_part だけ失敗させる S3 クライアント。"""
+
+    def __init__(self, client, fail_part: int):
+        self._client = client
+        self.fail_part = fail_part
+        self.aborted = []
+
+    def upload_part(self, **kwargs):
+        if kwargs["PartNumber"] == self.fail_part:
+            raise ConnectionError("simulated part failure")
+        return self._client.upload_part(**kwargs)
+
+    def abort_multipart_upload(self, **kwargs):
+        self.aborted.append(kwargs["UploadId"])
+        return self._client.abort_multipart_upload(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def test_failed_part_aborts_upload(s3, tmp_path):
+    client = FailingPartClient(s3, fail_part=2)
+    with pytest.raises(ConnectionError):
+        with s3_sink.stream_to_s3(f"s3://{BUCKET}/videos/broken.mp4", local_copy=tmp_path / "out.mp4",
+                                  client=client, part_size=s3_sink.MIN_PART_SIZE) as target:
+            # 読み出し側が止まるとエンコーダは EPIPE で失敗する
+            encode_into(target)
+
+    assert len(client.aborted) == 1
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    with pytest.raises(s3.exceptions.ClientError):
+        s3.head_object(Bucket=BUCKET, Key="videos/broken.mp4")
+
+
+def test_encoder_failure_aborts_upload(s3, tmp_path):
+    with pytest.raises(RuntimeError):
+        with s3_sink.stream_to_s3(f"s3://{BUCKET}/videos/never.mp4", client=s3) as target:
+            assert os.path.exists(target)
+            raise RuntimeError("encoder failed before opening the output")
+
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
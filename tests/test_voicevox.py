@@ -0,0 +1,123 @@
+"""VoiceCache / VoicevoxClient を偽 VOICEVOX サーバー（fake_voicevox.py）に向けたテスト。"""
+import os
+import socket
+import threading
+
+import pytest
+
+from fake_voicevox import FakeVoicevox
+from voicevox import VoiceCache, VoicevoxClient, text_key
+
+
+def make_cache(tmp_path, url, **kwargs) -> VoiceCache:
+    return VoiceCache(tmp_path / "voice_cache", VoicevoxClient(url), **kwargs)
+
+
+def synth_count(fake: FakeVoicevox) -> int:
+    return fake.stats.get("/synthesis", 0)
+
+
+def closed_port_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def test_cache_hit_keyed_on_text_speaker_and_version(tmp_path):
+    with FakeVoicevox(version="1.0.0") as fake:
+        cache = make_cache(tmp_path, fake.url)
+        first = cache.submit("答えは山です").result()
+        cache.close()
+        assert first is not None and first.exists()
+        assert synth_count(fake) == 1
+
+        # 同じ文・話者・バージョンなら別の VoiceCache（別ジョブ）でも合成しない
+        cache = make_cache(tmp_path, fake.url)
+        assert cache.submit("答えは山です").result() == first
+        cache.close()
+        assert synth_count(fake) == 1
+
+        # 話者が変われば別のファイル
+        cache = make_cache(tmp_path, fake.url, speaker=3)
+        other_speaker = cache.submit("答えは山です").result()
+        cache.close()
+        assert other_speaker != first
+        assert synth_count(fake) == 2
+
+    # エンジンのバージョンが変われば作り直す
+    with FakeVoicevox(version="1.1.0") as fake:
+        cache = make_cache(tmp_path, fake.url)
+        upgraded = cache.submit("答えは山です").result()
+        cache.close()
+        assert upgraded != first
+        assert synth_count(fake) == 1
+        assert upgraded.name.startswith(text_key("答えは山です", cache.speaker))
+
+
+def test_concurrent_identical_texts_synthesize_once(tmp_path):
+    with FakeVoicevox(latency=0.2) as fake:
+        cache = make_cache(tmp_path, fake.url, workers=4)
+        futures = []
+        barrier = threading.Barrier(8)
+
+        def submit():
+            barrier.wait()
+            futures.append(cache.submit("同じ文"))
+
+        threads = [threading.Thread(target=submit) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        paths = {f.result() for f in futures}
+        cache.close()
+    assert len(paths) == 1 and None not in paths
+    assert len({id(f) for f in futures}) == 1
+    assert synth_count(fake) == 1
+
+
+def test_offline_falls_back_to_newest_cached_wav(tmp_path):
+    produced = []
+    for version in ("1.0.0", "2.0.0"):
+        with FakeVoicevox(version=version) as fake:
+            cache = make_cache(tmp_path, fake.url)
+            produced.append(cache.submit("オフライン").result())
+            cache.close()
+    old, new = produced
+    os.utime(old, (1_000_000, 1_000_000))
+    os.utime(new, (2_000_000, 2_000_000))
+
+    cache = make_cache(tmp_path, closed_port_url())
+    assert cache.engine_version is None
+    assert cache.submit("オフライン").result() == new
+    # キャッシュにない文は合成せずに None（呼び出し側でサイレントにする）
+    assert cache.submit("まだない文").result() is None
+    cache.close()
+
+    os.utime(old, (3_000_000, 3_000_000))
+    cache = make_cache(tmp_path, closed_port_url())
+    assert cache.submit("オフライン").result() == old
+    cache.close()
+
+
+def test_keep_alive_reuses_one_connection_per_thread(tmp_path):
+    with FakeVoicevox() as fake:
+        cache = make_cache(tmp_path, fake.url, workers=1)
+        for i in range(3):
+            assert cache.submit(f"文{i}").result() is not None
+        cache.close()
+        # /version（メインスレッド）と合成用スレッドの2本だけ
+        assert fake.stats["connections"] == 2
+        assert fake.stats["requests"] == 1 + 3 * 2
+
+
+@pytest.mark.parametrize("requests_per_connection", [1, 2])
+def test_reconnects_after_server_side_disconnect(tmp_path, requests_per_connection):
+    with FakeVoicevox(requests_per_connection=requests_per_connection) as fake:
+        cache = make_cache(tmp_path, fake.url, workers=1)
+        paths = [cache.submit(f"切断{i}").result() for i in range(3)]
+        cache.close()
+        assert None not in paths
+        assert synth_count(fake) == 3
+        # 切られた接続は張り直して使い続ける
+        assert fake.stats["connections"] > 2